@@ -0,0 +1,67 @@
+"""
+Micro-benchmark for the DSA815 peak table parser
+
+Compares the original str.split() and list comprehension parsing of a :TRAC:MATH:PEAK:DATA? response
+against parse_peak_table() on synthetic peak tables of 1k to 100k points.
+
+Run from the repository root:
+    python -m benchmarks.bench_peak_parser
+"""
+import argparse
+import timeit
+import numpy as np
+from radiotest.drivers.instruments.vxi.dsa815 import parse_peak_table
+
+
+def make_response(points, seed=0):
+    """ Build a synthetic peak table response with the formatting used by the DSA815
+    Parameters:
+        points(int): Number of frequency, amplitude pairs
+        seed(int): Random seed
+    Returns:
+        The response string
+    """
+    rng = np.random.default_rng(seed)
+    freqs = np.sort(rng.uniform(9E3, 1.5E9, points))
+    amplitudes = rng.uniform(-90.0, 20.0, points)
+    return ",".join("{:.6e},{:.2f}".format(f, a) for f, a in zip(freqs, amplitudes)) + "\n"
+
+
+def parse_legacy(response):
+    """ The parsing previously done in TestSupport.sa_make_measurement"""
+    raw_points = response.split(",")
+    raw_points = [float(x) for x in raw_points]
+    freqs = raw_points[0::][::2]
+    amplitudes = raw_points[1::][::2]
+    return freqs, amplitudes
+
+
+def bench(function, response, repeat):
+    """ Return the best time in seconds of one call to function"""
+    return min(timeit.repeat(lambda: function(response), number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DSA815 peak table parser benchmark")
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Peak table sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of timed runs per size")
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>12} {:>14} {:>8}".format("Points", "Legacy(ms)", "NumPy(ms)", "NumPy(Mpts/s)", "Speedup"))
+    for points in args.points:
+        response = make_response(points)
+        # Both parsers must agree before their timings mean anything
+        legacy_freqs, legacy_amplitudes = parse_legacy(response)
+        freqs, amplitudes = parse_peak_table(response)
+        assert np.array_equal(freqs, legacy_freqs) and np.array_equal(amplitudes, legacy_amplitudes)
+
+        legacy_time = bench(parse_legacy, response, args.repeat)
+        numpy_time = bench(parse_peak_table, response, args.repeat)
+        print("{:>8} {:>12.3f} {:>12.3f} {:>14.2f} {:>7.1f}x".format(points, legacy_time * 1E3, numpy_time * 1E3,
+                                                                      points / numpy_time / 1E6,
+                                                                      legacy_time / numpy_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+End to end benchmark of the test flows
+
+Runs TestHarmSpur, TestImd and TestTRXLO against the simulated instruments with a modelled bus latency and sweep
+time, and reports for each run the wall time, the number of SCPI round trips, the bytes transferred, the time spent
+sleeping and the time spent in each SCPI command. The results can be written as JSON to track regressions.
+With --benches the IMD test is also run on several simulated benches at once, to check the throughput scales with
+the number of benches.
+
+Run from the repository root:
+    python -m benchmarks.bench_test_flows --latency 0.002 --sweep-time 0.05 --json results.json
+    python -m benchmarks.bench_test_flows --cases imd --benches 1 2 4 8
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+import radiotest.config.configdata as configdata
+import radiotest.drivers.loader as loader
+from radiotest.drivers.instruments.sim.bench import get_bench
+from radiotest.tests.headless import HeadlessGui, instrument_entry
+import radiotest.tests.harmspur as harmspur_test
+import radiotest.tests.imd as imd_test
+import radiotest.tests.trxlo as trxlo_test
+import radiotest.tests.orchestrator as orchestrator
+
+SCHEMA_VERSION = 1
+
+
+class SleepCounter:
+    """ Stands in for the time module of a test module, to account for the time the test spends sleeping"""
+
+    def __init__(self):
+        self.sleep_time = 0.0
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        self.sleep_time += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def make_loader():
+    """ Return a loader with every instrument simulated"""
+    config_data = configdata.ConfigData("benchmark")
+    config_data.set_simulated(True)
+    the_loader = loader.Loader()
+    for instrument in config_data.get_instrument_list():
+        the_loader.add_instrument(instrument["name"], instrument["instrument"])
+    return the_loader
+
+
+def harmspur_case(the_loader, gui, single_sweep=False, fundamentals=None):
+    harmspur_test.TestHarmSpur(gui)
+    instruments = {"sa": instrument_entry(the_loader, "SA1", "Spectrum Analyzer"),
+                   "awg": instrument_entry(the_loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Harmonics and Spurs", "project_name": "benchmark", "test_id": "1", "ref_offset": 0,
+                  "display_line": -90, "fundamental": 7.2, "highest_harmonic": 7, "use_awg": True,
+                  "tone_level": -10, "harm_screenshot": True, "single_sweep": single_sweep}
+    if fundamentals is not None:
+        parameters["fundamentals"] = fundamentals
+    return parameters, instruments
+
+
+def imd_case(the_loader, gui, trace_peaks=False, sweep=False):
+    imd_test.TestImd(gui)
+    instruments = {"sa": instrument_entry(the_loader, "SA1", "Spectrum Analyzer"),
+                   "awg": instrument_entry(the_loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "benchmark", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 7, "imd_screenshot": True, "trace_peaks": trace_peaks, "sweep": sweep,
+                  "sweep_levels": [-16, -12, -8, -4], "sweep_spacings": [1.1, 5, 20]}
+    return parameters, instruments
+
+
+def trxlo_case(the_loader, gui):
+    trxlo_test.TestTRXLO(gui)
+    instruments = {"awg": instrument_entry(the_loader, "AWG1", "Arbitrary Waveform Generator"),
+                   "av": the_loader.load("AV")}
+    parameters = {"if_carr_freq": 12.288, "lo_level": 10, "operating_freq": 7.2, "usb": True, "lo_swap": False,
+                  "ptt": True, "tune": False}
+    return parameters, instruments
+
+
+CASES = {
+    "harmspur": lambda l, g: harmspur_case(l, g),
+    "harmspur_single_sweep": lambda l, g: harmspur_case(l, g, single_sweep=True),
+    "harmspur_batch": lambda l, g: harmspur_case(l, g, fundamentals=[1.9, 3.6, 7.1, 10.1, 14.1, 18.1]),
+    "imd": lambda l, g: imd_case(l, g),
+    "imd_trace": lambda l, g: imd_case(l, g, trace_peaks=True),
+    "imd_sweep": lambda l, g: imd_case(l, g, sweep=True),
+    "trxlo": lambda l, g: trxlo_case(l, g),
+}
+
+
+def run_case(name):
+    """ Run one test flow against freshly connected simulated instruments
+    Returns:
+        A dict of the metrics of the run
+    """
+    get_bench().reset()
+    the_loader = make_loader()
+    gui = HeadlessGui()
+    parameters, instruments = CASES[name](the_loader, gui)
+    drivers = [entry["driver_inst"] for key, entry in instruments.items() if key != "av"]
+    # Only count what the test does, not the connection and reset done by the loader
+    for driver in drivers:
+        driver.s.stats = {key: 0 for key in driver.s.stats}
+        driver.s.commands = dict()
+        driver.sleep_time = 0.0
+    test_sleep = SleepCounter()
+    # The test modules which sleep themselves
+    test_modules = [module for module in [harmspur_test, imd_test, trxlo_test] if hasattr(module, "time")]
+    saved = [module.time for module in test_modules]
+    for module in test_modules:
+        module.time = test_sleep
+    try:
+        start = time.perf_counter()
+        processed_data = gui.run_test(parameters, instruments)
+        wall_time = time.perf_counter() - start
+    finally:
+        for module, saved_time in zip(test_modules, saved):
+            module.time = saved_time
+
+    metrics = {"wall_time": wall_time, "round_trips": 0, "bytes_written": 0, "bytes_read": 0,
+               "sleep_time": test_sleep.sleep_time, "errors": len(gui.errors), "commands": dict()}
+    for driver in drivers:
+        stats = driver.s.stats
+        metrics["round_trips"] += stats["writes"] + stats["reads"]
+        metrics["bytes_written"] += stats["bytes_written"]
+        metrics["bytes_read"] += stats["bytes_read"]
+        metrics["sleep_time"] += driver.sleep_time
+        for header, entry in driver.s.commands.items():
+            key = "{}:{}".format(driver.model, header)
+            metrics["commands"][key] = {"count": entry["count"], "time": entry["time"]}
+    the_loader.close_all()
+    # TRX LO returns no data, so a run is complete if the test reported no errors
+    metrics["completed"] = len(gui.errors) == 0
+    return metrics
+
+
+def run_benches(count):
+    """ Run the IMD test on count simulated benches at the same time
+    Returns:
+        A dict of the metrics of the run
+    """
+    get_bench().reset()
+    config_data = configdata.ConfigData("benchmark")
+    config_data.set_simulated(True)
+    for i in range(2, count + 1):
+        bench = "bench{}".format(i)
+        config_data.add_bench(bench, {"AWG1": "SDG-1032X-{}".format(i), "SA1": "DSA-815-{}".format(i)})
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "benchmark", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 7, "imd_screenshot": True, "trace_peaks": False}
+    start = time.perf_counter()
+    results = orchestrator.run_on_benches(config_data, "imd", parameters)
+    wall_time = time.perf_counter() - start
+    return {"benches": count, "wall_time": wall_time, "tests_per_second": count / wall_time,
+            "completed": all(len(result["errors"]) == 0 for result in results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RadioTest end to end test flow benchmark")
+    parser.add_argument("--cases", nargs="+", default=list(CASES.keys()), choices=list(CASES.keys()),
+                        help="Test flows to run")
+    parser.add_argument("--latency", type=float, default=0.002, help="Bus latency per transaction in seconds")
+    parser.add_argument("--sweep-time", type=float, default=0.05, help="Spectrum analyzer sweep time in seconds")
+    parser.add_argument("--settle-time", type=float, default=0.0, help="Instrument settle time in seconds")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs per case. The fastest is reported")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest commands to list per case")
+    parser.add_argument("--benches", type=int, nargs="+", default=list(),
+                        help="Also run the IMD test on this many benches at once, e.g. 1 2 4")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    bench = get_bench()
+    bench.latency = args.latency
+    bench.sweep_time = args.sweep_time
+    bench.settle_time = args.settle_time
+
+    results = {"schema_version": SCHEMA_VERSION, "timestamp": datetime.now().isoformat(),
+               "python": platform.python_version(), "platform": platform.platform(),
+               "latency": args.latency, "sweep_time": args.sweep_time, "settle_time": args.settle_time,
+               "cases": dict()}
+    print("{:<24} {:>10} {:>12} {:>12} {:>12} {:>10}".format("Case", "Wall(s)", "Round trips", "Bytes out",
+                                                             "Bytes in", "Sleep(s)"))
+    for name in args.cases:
+        runs = [run_case(name) for _ in range(args.repeat)]
+        metrics = min(runs, key=lambda run: run["wall_time"])
+        results["cases"][name] = metrics
+        print("{:<24} {:>10.3f} {:>12} {:>12} {:>12} {:>10.3f}".format(name, metrics["wall_time"],
+                                                                        metrics["round_trips"],
+                                                                        metrics["bytes_written"],
+                                                                        metrics["bytes_read"],
+                                                                        metrics["sleep_time"]))
+        slowest = sorted(metrics["commands"].items(), key=lambda item: item[1]["time"], reverse=True)
+        for header, entry in slowest[:args.top]:
+            print("    {:<36} {:>6} x {:>10.2f} ms".format(header, entry["count"], entry["time"] * 1E3))
+
+    if len(args.benches) > 0:
+        results["benches"] = list()
+        print("{:<24} {:>10} {:>12}".format("Benches", "Wall(s)", "Tests/s"))
+        for count in args.benches:
+            metrics = run_benches(count)
+            results["benches"].append(metrics)
+            print("{:<24} {:>10.3f} {:>12.2f}".format(count, metrics["wall_time"], metrics["tests_per_second"]))
+
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    runs = list(results["cases"].values()) + results.get("benches", list())
+    return 0 if all(run["completed"] for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
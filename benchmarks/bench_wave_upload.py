@@ -0,0 +1,139 @@
+"""
+Micro-benchmark for the SDG1032X arbitrary waveform upload and download
+
+Upload: compares the original per-sample struct.pack_into() loop, followed by joining the command header and the samples,
+against Sdg1032x.wave_set() building the command for 16k point two-tone and multi-tone waveforms. The waveforms are
+passed as a list, an int16 NumPy array, an int64 NumPy array and an array('h'). The command is captured instead of
+being sent, so only the time spent building it is measured.
+
+Download: compares the original per-sample struct.unpack() loop of Sdg1032x.wave_get() against Sdg1032x.wave_parse()
+decoding the same WVDT? response.
+
+Run from the repository root:
+    python -m benchmarks.bench_wave_upload
+"""
+import argparse
+import array
+import struct
+import timeit
+import numpy as np
+from radiotest.drivers.instruments.vxi.sdg1032x import Sdg1032x
+
+
+def make_wave(points, tones, seed=0):
+    """ Build a waveform of equal amplitude tones with random phases, scaled to the full range of a short
+    Parameters:
+        points(int): Number of samples
+        tones(int): Number of tones. Tone n completes n + 1 cycles over the waveform
+        seed(int): Random seed for the phases
+    Returns:
+        An int16 numpy array
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(points) / points
+    wave = np.zeros(points)
+    for n in range(tones):
+        wave += np.sin(2 * np.pi * (n + 1) * t + rng.uniform(0, 2 * np.pi))
+    return np.round(wave / np.abs(wave).max() * 32767).astype(np.int16)
+
+
+def wave_set_legacy(setup, channel=1):
+    """ The command building previously done in Sdg1032x.wave_set"""
+    wavedata = setup['WAVEDATA']
+    wdlen = len(wavedata)
+    block = bytearray(wdlen*2)
+    for i in range(wdlen):
+        struct.pack_into('<h', block, i*2, wavedata[i])
+    length = int(len(setup['WAVEDATA'])*2)
+    wsstr = 'C{ch}:WVDT WVNM,{name},TYPE,{type},LENGTH,{length}B,FREQ,{freq},WAVEDATA,'.\
+        format(ch=channel, name=setup['NAME'], type=setup['TYPE'], length=length, freq=setup['FREQ'])
+    bwsstr = bytearray(wsstr.encode('utf-8'))
+    return bwsstr + block
+
+
+def wave_get_legacy(res):
+    """ The response decoding previously done in Sdg1032x.wave_get"""
+    binary_data_index = res.find(b'WAVEDATA')
+    attributes = res[5:binary_data_index - 2].decode('utf-8')
+    attributes = attributes.replace(' ','')
+    alist = attributes.split(',')
+    adict = dict(zip(alist[::2], alist[1::2]))
+    binary_data = res[binary_data_index + 9:]
+    binary_data = binary_data[:-1]
+    short_count = int(len(binary_data)/2)
+    if(len(adict)):
+        if 'LENGTH' in adict:
+            adict['LENGTH'] = short_count
+        if 'TYPE' in adict:
+            adict['TYPE'] = int(adict['TYPE'])
+        if 'WVNM' in adict:
+            name = adict['WVNM']
+            adict.pop('POS', None)
+            adict.pop('WVNM', None)
+            adict['NAME']=name
+        wavedata = []
+        for i in range(short_count):
+            short_index = int(i*2)
+            word = binary_data[short_index:short_index+2]
+            wavedata.append(struct.unpack('<h', word)[0])
+        adict['WAVEDATA'] = wavedata
+    return adict
+
+
+def make_response(wave):
+    """ Return the WVDT? response of the generator for a waveform"""
+    attributes = "WVNM,bench,TYPE,5,LENGTH,{}B,FREQ,1000,POS,M50".format(wave.size * 2)
+    return b"WVDT " + attributes.encode("utf-8") + b", WAVEDATA," + wave.astype("<i2").tobytes() + b"\n"
+
+
+def capturing_driver():
+    """ Return an Sdg1032x which keeps the commands it would send, and the list they are kept in"""
+    sent = list()
+    # Not connected to a generator: only wave_set() is used
+    driver = Sdg1032x.__new__(Sdg1032x)
+    driver._write_raw = sent.append
+    return driver, sent
+
+
+def bench(function, repeat):
+    """ Return the best time in seconds of one call to function"""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SDG1032X waveform upload benchmark")
+    parser.add_argument("--points", type=int, default=16384, help="Samples per waveform")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of timed runs per case")
+    args = parser.parse_args()
+
+    driver, sent = capturing_driver()
+    print("{:<12} {:<12} {:>12} {:>12} {:>8}".format("Waveform", "Input", "Legacy(ms)", "NumPy(ms)", "Speedup"))
+    for wave_name, tones in [("two-tone", 2), ("multi-tone", 16)]:
+        wave = make_wave(args.points, tones)
+        inputs = [("list", wave.tolist()), ("int16", wave), ("int64", wave.astype(np.int64)),
+                  ("array('h')", array.array("h", wave.tobytes()))]
+        for input_name, wavedata in inputs:
+            setup = {"NAME": "bench", "TYPE": 5, "FREQ": 1000, "WAVEDATA": wavedata}
+            # Both must build the same command before their timings mean anything
+            driver.wave_set(setup)
+            assert bytes(sent.pop()) == bytes(wave_set_legacy(setup))
+
+            legacy_time = bench(lambda: wave_set_legacy(setup), args.repeat)
+            numpy_time = bench(lambda: driver.wave_set(setup), args.repeat)
+            sent.clear()
+            print("{:<12} {:<12} {:>12.3f} {:>12.3f} {:>7.1f}x".format(wave_name, input_name, legacy_time * 1E3,
+                                                                      numpy_time * 1E3, legacy_time / numpy_time))
+
+    print()
+    print("{:<12} {:>12} {:>12} {:>8}".format("Download", "Legacy(ms)", "NumPy(ms)", "Speedup"))
+    for wave_name, tones in [("two-tone", 2), ("multi-tone", 16)]:
+        res = make_response(make_wave(args.points, tones))
+        assert wave_get_legacy(res)["WAVEDATA"] == Sdg1032x.wave_parse(res)["WAVEDATA"].tolist()
+        legacy_time = bench(lambda: wave_get_legacy(res), args.repeat)
+        numpy_time = bench(lambda: Sdg1032x.wave_parse(res), args.repeat)
+        print("{:<12} {:>12.3f} {:>12.3f} {:>7.1f}x".format(wave_name, legacy_time * 1E3, numpy_time * 1E3,
+                                                           legacy_time / numpy_time))
+
+
+if __name__ == "__main__":
+    main()
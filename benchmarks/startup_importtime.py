@@ -0,0 +1,73 @@
+"""
+Startup import time report
+
+Runs python -X importtime in a fresh interpreter for the modules imported before the main window of
+radiotest.py is shown, and reports the total import time and the slowest imports. The heavy dependencies
+(numpy, PIL, vxi11, aardvark_py) should not appear in the report; they are imported on first use.
+
+Run from the repository root:
+    python -m benchmarks.startup_importtime
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# The modules radiotest.py imports before calling mainloop()
+STARTUP_MODULES = ["tkinter", "tkinter.ttk", "radiotest.config.config", "radiotest.config.configdata",
+                   "radiotest.drivers.loader", "radiotest.gui.top"]
+
+# Modules which must not be imported at startup
+DEFERRED_MODULES = ["numpy", "PIL", "vxi11", "aardvark_py"]
+
+
+def import_times(modules):
+    """ Import modules in a fresh interpreter and collect the -X importtime report
+    Parameters:
+        modules(list): Names of the modules to import
+    Returns:
+        A list of dicts {"module", "self_us", "cumulative_us", "depth"}, in import order
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "; ".join("import {}".format(module) for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    entries = list()
+    for line in proc.stderr.splitlines():
+        # Lines look like: "import time:       123 |        456 |   package.module"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                        "depth": (len(name) - len(name.lstrip())) // 2})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RadioTest startup import time report")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--modules", nargs="+", default=STARTUP_MODULES, help="Modules to import")
+    args = parser.parse_args()
+
+    entries = import_times(args.modules)
+    # Only top level imports contribute their cumulative time to the total, nested ones are included in them
+    total_us = sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0)
+    print("Total import time: {:.1f} ms ({} modules)".format(total_us / 1E3, len(entries)))
+    print()
+    print("{:>12} {:>12}  {}".format("Self(ms)", "Cumul.(ms)", "Module"))
+    for entry in sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:args.top]:
+        print("{:>12.1f} {:>12.1f}  {}".format(entry["self_us"] / 1E3, entry["cumulative_us"] / 1E3, entry["module"]))
+
+    imported = set(entry["module"].split(".")[0] for entry in entries)
+    eager = [module for module in DEFERRED_MODULES if module in imported]
+    print()
+    if len(eager) > 0:
+        print("Imported at startup but should be deferred: {}".format(", ".join(eager)))
+        sys.exit(1)
+    print("No deferred modules were imported at startup")
+
+
+if __name__ == "__main__":
+    main()
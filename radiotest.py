@@ -1,15 +1,13 @@
-
 import os
 import sys
+import threading
+import importlib
 import tkinter as tk
 import tkinter.ttk as ttk
 import radiotest.config.config as config
 import radiotest.config.configdata as configdata
 import radiotest.drivers.loader as loader
 import radiotest.gui.top as gui
-import radiotest.tests.harmspur as harmspur_test
-import radiotest.tests.imd as imd_test
-import radiotest.tests.trxlo as trxlo_test
 
 # Loader initialization
 
@@ -18,6 +16,9 @@ config.Loader_obj = loader.Loader()
 # Config initialization
 
 config.Config_obj = configdata.ConfigData("test")
+# Run against the simulated instruments if requested
+if "--simulate" in sys.argv[1:]:
+    config.Config_obj.set_simulated(True)
 # Populate instrument list in loader
 for instrument in config.Config_obj.get_instrument_list():
     config.Loader_obj.add_instrument(instrument["name"], instrument["instrument"])
@@ -29,12 +30,54 @@ config.Root_obj.title("RadioTest")
 config.App_obj = gui.FullScreenApp(config.Root_obj)
 config.App_obj.grid()
 
-# Test initialization
 
-config.HarmSpur_test_obj = harmspur_test.TestHarmSpur()
-config.IMD_test_obj = imd_test.TestImd()
-config.TRXLO_test_obj = trxlo_test.TestTRXLO()
+def init_tests():
+    """ Import and create the tests. This is deferred until the window is showing, because the test
+    modules pull in numpy."""
+    harmspur_test = importlib.import_module("radiotest.tests.harmspur")
+    imd_test = importlib.import_module("radiotest.tests.imd")
+    trxlo_test = importlib.import_module("radiotest.tests.trxlo")
+    config.HarmSpur_test_obj = harmspur_test.TestHarmSpur()
+    config.IMD_test_obj = imd_test.TestImd()
+    config.TRXLO_test_obj = trxlo_test.TestTRXLO()
+    # Every completed test is written to the results database
+    if config.Results_db_path is not None:
+        store = importlib.import_module("radiotest.results.store")
+        config.Store_obj = store.open_store()
+
+
+# Instrument discovery. All the instruments are probed at the same time in the background, and the ones which
+# respond are connected to, so they are ready when a test is run. The driver modules are imported by the
+# discovery thread, not at startup.
+
+discovery_thread = threading.Thread(target=config.Loader_obj.discover, kwargs={"timeout": config.Discovery_timeout},
+                                    name="radiotest-discovery", daemon=True)
+
+
+def check_discovery():
+    """ Show the instrument availability once discovery is complete"""
+    if discovery_thread.is_alive():
+        config.Root_obj.after(100, check_discovery)
+        return
+    for tab in config.App_obj.tabs.tab_frames.values():
+        tab.show_availability()
+
+
+def start_background_init():
+    """ Called once the main loop is running"""
+    discovery_thread.start()
+    init_tests()
+    config.Root_obj.after(100, check_discovery)
+
+
+config.Root_obj.after_idle(start_background_init)
 
 # Forever loop
 
 config.Root_obj.mainloop()
+
+# Shutdown
+
+config.Loader_obj.close_all()
+if config.Store_obj is not None:
+    config.Store_obj.close()
@@ -0,0 +1,4 @@
+import sys
+from radiotest.cli import main
+
+sys.exit(main())
@@ -0,0 +1,372 @@
+import sys
+import json
+import time
+import pathlib
+import sqlite3
+import argparse
+import radiotest.config.config as config
+import radiotest.config.configdata as configdata
+import radiotest.drivers.loader as loader
+import radiotest.error_handling.exceptions as rte
+import radiotest.results.columnar as columnar
+import radiotest.results.store as store
+import radiotest.tests.report as report
+import radiotest.tests.headless as headless
+import radiotest.tests.orchestrator as orchestrator
+from radiotest.tests.headless import HeadlessGui
+from radiotest.drivers.instruments.vxi.instrument import InstrumentError
+
+#
+# Command line test runner
+#
+# Runs a test without the GUI, e.g. from a script or cron on a bench PC:
+#
+#   python -m radiotest run harmspur --params harmspur.toml --output-dir results
+#   python -m radiotest run imd --set f1=7.2 --set f2=7.2011 --simulate
+#   python -m radiotest run imd --all-benches --output-dir results
+#   python -m radiotest list
+#
+# The parameters file is TOML (or JSON if it ends in .json). Parameters go at the top level or in a [parameters]
+# table, and an optional [instruments] table selects the instrument used for each role, e.g. sa = "SA1".
+# Parameters which aren't given default to the GUI defaults in config.py.
+#
+# Completed runs are also written to the results database, config.Results_db_path unless --db is given.
+#
+# --bench and --all-benches run the test on the benches in config.Benches at the same time, see orchestrator.py.
+#
+
+# Exit codes
+EXIT_OK = 0
+EXIT_TEST_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INSTRUMENT = 3
+
+# The tests and instrument roles are shared with the bench orchestrator
+TESTS = headless.TESTS
+ROLES = headless.ROLES
+required_roles = headless.required_roles
+
+
+def default_parameters(test):
+    """ Return the default parameters of a test, the same as the GUI starts with
+    Parameters:
+        test(str): One of the keys of TESTS
+    Returns:
+        A dict of parameters
+    """
+    parameters = {"test_name": TESTS[test]["test_name"], "project_name": "TestProject",
+                  "test_id": str(int(time.time()))}
+    if test == "harmspur":
+        defaults = config.Harm_spurs_defaults
+        parameters.update({"fundamental": defaults["fundamental"], "tone_level": defaults["awg_tone_level"],
+                           "ref_offset": defaults["ref_offset"], "highest_harmonic": defaults["highest_harmonic"],
+                           "display_line": defaults["display_line"], "single_sweep": defaults["single_sweep"] == 1,
+                           "use_awg": True, "harm_screenshot": False})
+    elif test == "imd":
+        defaults = config.IMD_defaults
+        parameters.update({"ref_offset": defaults["ref_offset"], "tone_level": defaults["tone_level"],
+                           "display_line": defaults["display_line"], "f1": defaults["f1"], "f2": defaults["f2"],
+                           "max_order": defaults["max_order"], "trace_peaks": defaults["trace_peaks"] == 1,
+                           "sweep": defaults["sweep"] == 1, "imd_screenshot": False})
+    elif test == "trxlo":
+        defaults = config.TRXLO_defaults
+        parameters = {"if_carr_freq": defaults["if_carr_freq"], "lo_level": defaults["lo_level"],
+                      "operating_freq": defaults["operating_freq"], "lo_swap": defaults["lo_swap"] == 1,
+                      "usb": defaults["usb"] == 1, "ptt": defaults["ptt"] == 1, "tune": defaults["tune"] == 1,
+                      "aardvark": defaults["aardvark"] == 1}
+    return parameters
+
+
+def read_params_file(path):
+    """ Read a parameters file
+    Parameters:
+        path(str): Path of a TOML or JSON file
+    Returns:
+        A tuple (parameters dict, instruments dict)
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as params_file:
+            contents = json.load(params_file)
+    else:
+        # tomllib is part of the standard library from Python 3.11
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("Reading TOML files needs Python 3.11 or later, use a .json parameters file instead")
+        with open(path, "rb") as params_file:
+            contents = tomllib.load(params_file)
+    instruments = contents.pop("instruments", dict())
+    parameters = contents.pop("parameters", dict())
+    # Parameters at the top level are used too, the [parameters] table takes precedence
+    return dict(contents, **parameters), instruments
+
+
+def parse_assignments(assignments):
+    """ Convert a list of "name=value" strings into a dict. Values are read as JSON if possible, so numbers,
+    true/false and lists work, and as plain strings otherwise."""
+    values = dict()
+    for assignment in assignments:
+        name, sep, value = assignment.partition("=")
+        if sep == "" or name.strip() == "":
+            raise ValueError("Expected name=value, got: {}".format(assignment))
+        try:
+            values[name.strip()] = json.loads(value)
+        except ValueError:
+            values[name.strip()] = value
+    return values
+
+
+def make_loader(config_data):
+    """ Return a loader holding every instrument of the configuration"""
+    the_loader = loader.Loader()
+    for instrument in config_data.get_instrument_list():
+        the_loader.add_instrument(instrument["name"], instrument["instrument"])
+    return the_loader
+
+
+def save_results(processed_data, output_dir, test_id, columnar_format=None):
+    """ Write the results as CSV and JSON, and the screen dumps as image files
+    Parameters:
+        processed_data(dict): The test results
+        output_dir(Path): Directory to write to
+        test_id(str): The files are named after the test ID
+        columnar_format(str): (optional) Also write the results in this columnar format, "npz" or "parquet"
+    Returns:
+        A list of the files written
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    files = list()
+    screen_dump_files = list()
+    for i, dump in enumerate(processed_data.get("screen_dumps", list())):
+        path = output_dir / "{}_screen_{}.{}".format(test_id, i + 1, dump.get("format", "bmp"))
+        with open(path, "wb") as image_file:
+            image_file.write(dump["data"])
+        screen_dump_files.append(path.name)
+        files.append(path)
+    csv_path = output_dir / "{}.csv".format(test_id)
+    report.write_results_csv(csv_path, processed_data)
+    json_path = output_dir / "{}.json".format(test_id)
+    report.write_results_json(json_path, processed_data, screen_dump_files)
+    files = [csv_path, json_path] + files
+    if columnar_format == columnar.FORMAT_NPZ:
+        npz_path = output_dir / "{}.npz".format(test_id)
+        columnar.write_npz(npz_path, processed_data)
+        files.append(npz_path)
+    elif columnar_format == columnar.FORMAT_PARQUET:
+        files = files + columnar.write_parquet(output_dir / "{}_parquet".format(test_id), processed_data)
+    return files
+
+
+def print_results(processed_data):
+    """ Print the results tables"""
+    for result in processed_data["results"]:
+        title = list(result.keys())[0]
+        print(title)
+        for row in result[title]:
+            print("    " + ", ".join("{}: {}".format(key, value) for key, value in row.items()))
+
+
+class ProgressPrinter(list):
+    """ Progress message list which also prints the messages"""
+
+    def append(self, message):
+        print(message, file=sys.stderr)
+        list.append(self, message)
+
+
+def run_command(args):
+    """ Run a test. Returns the exit code"""
+    config_data = configdata.ConfigData("test")
+    try:
+        hosts = parse_assignments(args.host)
+        instruments = parse_assignments(args.instrument)
+        parameters = default_parameters(args.test)
+        if args.params is not None:
+            file_parameters, file_instruments = read_params_file(args.params)
+            parameters.update(file_parameters)
+            instruments = dict(file_instruments, **instruments)
+        parameters.update(parse_assignments(args.set))
+    except (OSError, ValueError) as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.columnar == columnar.FORMAT_PARQUET and not columnar.have_arrow():
+        print("Error: writing Parquet files needs pyarrow, install it or use --columnar npz", file=sys.stderr)
+        return EXIT_USAGE
+
+    names = [instrument["name"] for instrument in config_data.get_instrument_list()]
+    for name, host in hosts.items():
+        if name not in names:
+            print("Error: unknown instrument {}".format(name), file=sys.stderr)
+            return EXIT_USAGE
+    for instrument in config_data.get_instrument_list():
+        if instrument["name"] in hosts:
+            instrument["instrument"]["hostname"] = str(hosts[instrument["name"]])
+    if args.simulate is True:
+        config_data.set_simulated(True)
+    config.Config_obj = config_data
+
+    if len(args.bench) > 0 or args.all_benches is True:
+        return run_benches_command(args, config_data, parameters, instruments)
+    config.Loader_obj = make_loader(config_data)
+
+    gui = HeadlessGui()
+    headless.make_test(args.test, gui)
+    if args.verbose is True:
+        gui.progress = ProgressPrinter()
+
+    try:
+        try:
+            test_instruments = headless.load_test_instruments(config.Loader_obj, config_data, args.test, parameters,
+                                                              instruments)
+        except ValueError as e:
+            print("Error: {}".format(e), file=sys.stderr)
+            return EXIT_USAGE
+        except rte.LoaderError as e:
+            print("Error: {}".format(e.value), file=sys.stderr)
+            return EXIT_INSTRUMENT
+
+        # Run the test on this thread
+        processed_data = gui.run_test(parameters, test_instruments)
+    except rte.TestCancelledError:
+        print("Test cancelled", file=sys.stderr)
+        return EXIT_TEST_FAILED
+    except InstrumentError as e:
+        print("Error: {}".format(e.value), file=sys.stderr)
+        return EXIT_INSTRUMENT
+    except OSError as e:
+        # The connection to an instrument was lost
+        print("Error: {}".format(e), file=sys.stderr)
+        return EXIT_INSTRUMENT
+    finally:
+        config.Loader_obj.close_all()
+
+    for error in gui.errors:
+        print("Error: {}: {}".format(error["title"], error["message"]), file=sys.stderr)
+    if len(gui.errors) > 0:
+        return EXIT_TEST_FAILED
+    if processed_data is None:
+        # The test has no results to report, e.g. the TRX LO setup
+        print("{}: done".format(args.test))
+        return EXIT_OK
+
+    if args.quiet is False:
+        print_results(processed_data)
+    for path in save_results(processed_data, results_dir(args, parameters), parameters["test_id"],
+                             args.columnar):
+        print("Wrote {}".format(path))
+    store_results(args, [(processed_data, None)])
+    return EXIT_OK
+
+
+def store_results(args, runs):
+    """ Write runs to the results database
+    Parameters:
+        args: The command line arguments
+        runs(list): A list of (processed data, bench name) tuples
+    Returns:
+        Nothing
+    """
+    path = args.db if args.db is not None else config.Results_db_path
+    if args.no_db is True or path is None or len(runs) == 0:
+        return
+    try:
+        with store.open_store(path) as results_store:
+            for processed_data, bench in runs:
+                run_id = results_store.add_run(processed_data, bench)
+                print("Stored run {} in {}".format(run_id, results_store.path))
+    except (OSError, sqlite3.Error) as e:
+        # The results files are written already
+        print("Error: results database {}: {}".format(path, e), file=sys.stderr)
+
+
+def results_dir(args, parameters):
+    """ Return the directory the results are written to"""
+    if args.output_dir is not None:
+        return pathlib.Path(args.output_dir)
+    # The same place the results window saves to
+    return pathlib.Path(config.Default_test_results_path).expanduser() / \
+        str(parameters["project_name"]) / str(parameters["test_name"])
+
+
+def run_benches_command(args, config_data, parameters, instruments):
+    """ Run a test on several benches at once. Returns the exit code"""
+    try:
+        # The benches are copies of the default bench, simulated if it is
+        config_data.add_benches(config.Benches)
+        benches = None if args.all_benches is True else args.bench
+        results = orchestrator.run_on_benches(config_data, args.test, parameters, benches, instruments)
+    except ValueError as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return EXIT_USAGE
+
+    rc = EXIT_OK
+    runs = list()
+    for result in results:
+        bench = result["bench"]
+        for error in result["errors"]:
+            print("Error: {}: {}: {}".format(bench, error["title"], error["message"]), file=sys.stderr)
+        if len(result["errors"]) > 0:
+            rc = EXIT_TEST_FAILED
+            continue
+        print("{}: done in {:.2f}s".format(bench, result["wall_time"]))
+        processed_data = result["processed_data"]
+        if processed_data is None:
+            continue
+        if args.quiet is False:
+            print_results(processed_data)
+        # Each bench writes to its own directory
+        for path in save_results(processed_data, results_dir(args, parameters) / bench, parameters["test_id"],
+                                 args.columnar):
+            print("Wrote {}".format(path))
+        runs.append((processed_data, bench))
+    store_results(args, runs)
+    return rc
+
+
+def list_command(args):
+    """ List the tests and the configured instruments. Returns the exit code"""
+    config_data = configdata.ConfigData("test")
+    print("Tests:")
+    for name, info in TESTS.items():
+        print("    {:<10} {}".format(name, info["test_name"]))
+    print("Instruments:")
+    config_data.add_benches(config.Benches)
+    for instrument in config_data.get_instrument_list():
+        info = instrument["instrument"]
+        print("    {:<16} {:<30} {}".format(instrument["name"], info["i_type"], info.get("hostname", "")))
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="radiotest", description="Run RadioTest tests without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run a test")
+    run_parser.add_argument("test", choices=list(TESTS.keys()), help="The test to run")
+    run_parser.add_argument("--params", help="TOML or JSON file of test parameters")
+    run_parser.add_argument("--set", action="append", default=list(), metavar="NAME=VALUE",
+                            help="Set a test parameter. Overrides the parameters file")
+    run_parser.add_argument("--instrument", action="append", default=list(), metavar="ROLE=NAME",
+                            help="Instrument to use for a role (sa, awg, av)")
+    run_parser.add_argument("--host", action="append", default=list(), metavar="NAME=HOST",
+                            help="Host name of an instrument, e.g. to run on another bench")
+    run_parser.add_argument("--simulate", action="store_true", help="Use the simulated instruments")
+    run_parser.add_argument("--bench", action="append", default=list(),
+                            help="Run on this bench. Repeat to run on several benches at once")
+    run_parser.add_argument("--all-benches", action="store_true", help="Run on every bench at once")
+    run_parser.add_argument("--output-dir", help="Directory the results are written to")
+    run_parser.add_argument("--columnar", choices=[columnar.FORMAT_NPZ, columnar.FORMAT_PARQUET],
+                            help="Also write the results and the raw peaks and traces in a columnar format. "
+                                 "parquet needs pyarrow")
+    run_parser.add_argument("--db", help="Results database to write the run to")
+    run_parser.add_argument("--no-db", action="store_true", help="Don't write the run to the results database")
+    run_parser.add_argument("--quiet", action="store_true", help="Don't print the results")
+    run_parser.add_argument("--verbose", action="store_true", help="Print progress messages")
+    run_parser.set_defaults(function=run_command)
+
+    list_parser = subparsers.add_parser("list", help="List the tests and the configured instruments")
+    list_parser.set_defaults(function=list_command)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
@@ -3,17 +3,32 @@
 # Default Path where test results are saved
 Default_test_results_path = "~/projects/test_results"
 
+# Database every completed test run is written to. None to not keep a database
+Results_db_path = "~/projects/test_results/results.db"
+
 # Harmonics and spurs defaults
 
-Harm_spurs_defaults = {"fundamental": 7.2, "awg_tone_level": -40,"ref_offset": 40, "highest_harmonic": 7, "display_line": -10}
+Harm_spurs_defaults = {"fundamental": 7.2, "awg_tone_level": -40,"ref_offset": 40, "highest_harmonic": 7, "display_line": -10,
+                       "single_sweep": 0, "batch": 0, "batch_fundamentals": "1.9, 3.6, 7.1, 10.1, 14.1, 18.1",
+                       "batch_tone_levels": ""}
 
 # IMD Defaults
-IMD_defaults = {"ref_offset": 40, "tone_level": -4, "display_line": -10, "f1": 7.2, "f2": 7.2011, "max_order": 7}
+IMD_defaults = {"ref_offset": 40, "tone_level": -4, "display_line": -10, "f1": 7.2, "f2": 7.2011, "max_order": 7,
+                "trace_peaks": 0, "sweep": 0, "sweep_levels": "-16, -12, -8, -4", "sweep_spacings": "1.1, 5, 20"}
 
 # TRX LO Defaults
 TRXLO_defaults = {"if_carr_freq": 12.288, "lo_level": 10,
                   "operating_freq": 7.2, "lo_swap": 1, "usb": 0, "ptt": 0, "aardvark": 0, "tune": 0}
 
+# Time in seconds to wait for instruments to respond during discovery at startup
+Discovery_timeout = 3.0
+
+# Extra test benches, each a set of instruments the same as the default bench but at other host names.
+# Every networked instrument must be given its own host name. The Aardvark is only used on the default bench.
+# The command line runner can run a test on every bench at once, e.g.
+#   Benches = {"bench2": {"AWG1": "SDG-1032X-2", "SA1": "DSA-815-2"}}
+Benches = {}
+
 # *** Global objects ***
 # These are initialized in radiotest.py
 
@@ -26,6 +41,14 @@ Config_obj = None
 
 Loader_obj = None
 
+# Instrumentation recorder. Created when the instrument statistics window is first opened
+
+Recorder_obj = None
+
+# Results database. Opened when the tests are created
+
+Store_obj = None
+
 # GUI
 Root_obj = None  # Root Tk obj used by mainloop in radiotest.py
 App_obj = None  # Use this to gain access to the GUI methods
@@ -4,17 +4,23 @@ CD_FILT_AWG = "AWG"
 CD_FILT_SA = "SA"
 CD_FILT_AV = "AV"
 
+# Name of the bench the configured instruments are on
+DEFAULT_BENCH = "bench1"
+
 class ConfigData():
     def __init__(self, config_file):
         self.config_file = config_file
         self.instruments = [
             {"name": "AWG1","cd_filter": CD_FILT_AWG, "instrument": {"i_type": "Arbitrary Waveform Generator", "driver": "sdg1032x",
-             "class_name":"Sdg1032x", "interface": "vxi", "hostname": "SDG-1032X"}},
+             "class_name":"Sdg1032x", "interface": "vxi", "hostname": "SDG-1032X", "simulated": False}},
             {"name": "SA1", "cd_filter": CD_FILT_SA, "instrument": {"i_type": "Spectrum Analyzer", "driver": "dsa815",
-             "class_name": "Dsa815", "interface": "vxi", "hostname": "DSA-815"}},
+             "class_name": "Dsa815", "interface": "vxi", "hostname": "DSA-815", "simulated": False}},
             {"name": "AV", "cd_filter": CD_FILT_AV, "instrument": {"i_type": "Totalphase Aardvark", "driver": "aardvark",
-             "class_name": "Aardvark", "interface": "unspecified"}}
+             "class_name": "Aardvark", "interface": "unspecified", "simulated": False}}
         ]
+        for instrument in self.instruments:
+            instrument["bench"] = DEFAULT_BENCH
+            instrument["base_name"] = instrument["name"]
 
     def get_instruments_of_type(self, cd_filter):
         """ Return a dictionary of instruments which match the filter specified"""
@@ -37,8 +43,61 @@ class ConfigData():
         return res
 
 
+    def set_simulated(self, state=True, names=None):
+        """ Select simulated instruments in place of the real ones
+        Parameters:
+            state(bool): True to simulate the instruments, False to use the real ones
+            names(list): (optional) Names of the instruments to change. Defaults to all the instruments
+        Returns:
+            Nothing
+        """
+        for instrument in self.instruments:
+            if names is None or instrument["name"] in names:
+                instrument["instrument"]["simulated"] = state
+
     def get_instrument_list(self):
         """ Return the complete list of instruments"""
         return self.instruments
 
+    def add_bench(self, bench, hostnames):
+        """ Add a bench with the same instruments as the default bench. The instruments are named
+        "<bench>/<name>", e.g. "bench2/SA1". Instruments without a host name, such as the Aardvark, can't be told
+        apart from the default bench's, so they are left off the bench rather than shared with it.
+        Parameters:
+            bench(str): Name of the bench
+            hostnames(dict): Host name of each instrument by its default bench name, e.g. {"SA1": "10.0.0.8"}.
+                             Every instrument with a host name must be given its own
+        Returns:
+            Nothing
+        """
+        if bench in self.get_bench_names():
+            raise ValueError("Bench {} already exists".format(bench))
+        instruments = [instrument for instrument in self.get_bench_instruments(DEFAULT_BENCH)
+                       if "hostname" in instrument["instrument"]]
+        # Two benches driving the same instrument at once would both get garbage
+        missing = [instrument["name"] for instrument in instruments if instrument["name"] not in hostnames]
+        if len(missing) > 0:
+            raise ValueError("Bench {} has no host name for {}".format(bench, ", ".join(missing)))
+        for instrument in instruments:
+            info = dict(instrument["instrument"])
+            info["hostname"] = str(hostnames[instrument["name"]])
+            self.instruments.append({"name": "{}/{}".format(bench, instrument["name"]),
+                                     "cd_filter": instrument["cd_filter"], "instrument": info,
+                                     "bench": bench, "base_name": instrument["name"]})
+
+    def add_benches(self, benches):
+        """ Add benches from a dict of bench name: hostnames dict, as config.Benches"""
+        for bench, hostnames in benches.items():
+            self.add_bench(bench, hostnames)
+
+    def get_bench_names(self):
+        """ Return the bench names, the default bench first"""
+        res = []
+        for instrument in self.instruments:
+            if instrument["bench"] not in res:
+                res.append(instrument["bench"])
+        return res
 
+    def get_bench_instruments(self, bench):
+        """ Return the list of instruments on a bench"""
+        return [instrument for instrument in self.instruments if instrument["bench"] == bench]
@@ -0,0 +1,112 @@
+import time
+import radiotest.error_handling.exceptions as rte
+from .bench import get_bench
+
+
+class Aardvark:
+    """ Simulated Total Phase Aardvark adapter with the same interface as the real driver.
+    The GPIO pin states are written to the bench."""
+
+    SERIAL = 2237000001
+
+    def __init__(self, bench=None):
+        self.bench = get_bench() if bench is None else bench
+        self.device_list = list()
+        self.direction = ["INPUT", "OUTPUT"]
+        self.modes = ["GPIO_ONLY", "SPI_GPIO", "GPIO_I2C", "SPI_I2C"]
+        self.pins = ["SCL", "SDA", "MISO", "SCLK", "MOSI", "SS"]
+        self.next_handle = 1
+
+    def _transaction(self):
+        """ Account for the USB latency of one call"""
+        if self.bench.latency > 0:
+            time.sleep(self.bench.latency)
+
+    def _handle_check(self, device_info):
+        if device_info["handle"] is None:
+            raise rte.DriverError("No aardvark handle for device, was the device opened?")
+        return device_info['handle']
+
+    def _pin_check(self, pin):
+        if pin not in self.pins:
+            raise rte.DriverError("Invalid pin name specified")
+        return 1 << self.pins.index(pin)
+
+    def _boolean_check(self, var):
+        if var is True or var is False:
+            return var
+        raise rte.DriverError("Variable should be set to True or False")
+
+    def _direction_check(self, direction):
+        if direction not in self.direction:
+            raise rte.DriverError("Invalid direction specified")
+        return self.direction.index(direction)
+
+    def _update_bench(self, device_info):
+        """ Publish the state of the output pins"""
+        with self.bench.lock:
+            for pin in self.pins:
+                mask = 1 << self.pins.index(pin)
+                if device_info["pin_direction"] & mask:
+                    self.bench.gpio[pin] = bool(device_info["pin_state"] & mask)
+                else:
+                    self.bench.gpio.pop(pin, None)
+
+    def get_available_devices(self):
+        """
+        :return:  Return a list of available devices as one dict per device
+        """
+        self._transaction()
+        if len(self.device_list) == 0:
+            self.device_list = [{"device": 0, "serial": self.SERIAL, "handle": None}]
+        return self.device_list
+
+    def open(self, device_info):
+        if device_info["handle"] is not None:
+            raise rte.DriverError("Aardvark device {} is already open".format(device_info["device"]))
+        self._transaction()
+        device_info["device_mode"] = 0
+        device_info["pin_direction"] = 0
+        device_info["pin_state"] = 0
+        device_info["handle"] = self.next_handle
+        self.next_handle += 1
+
+    def close(self, device_info):
+        if device_info["handle"] is not None:
+            self._transaction()
+            device_info["handle"] = None
+
+    def close_all(self):
+        for device_info in self.device_list:
+            self.close(device_info)
+
+    def configure(self, device_info, device_mode="GPIO_ONLY"):
+        self._handle_check(device_info)
+        if device_mode not in self.modes:
+            raise rte.DriverError("Incorrect Mode: {} specified".format(device_mode))
+        if device_mode != "GPIO_ONLY":
+            raise rte.DriverError("Feature not implemented")
+        self._transaction()
+        device_info["device_mode"] = self.modes.index(device_mode)
+        self._update_bench(device_info)
+
+    def gpio_set_direction(self, device_info, pin, direction):
+        self._handle_check(device_info)
+        pin_mask = self._pin_check(pin)
+        if self._direction_check(direction):
+            device_info["pin_direction"] |= pin_mask
+        else:
+            device_info["pin_direction"] &= ~pin_mask
+        self._transaction()
+        self._update_bench(device_info)
+
+    def gpio_set_output(self, device_info, pin, state=False):
+        self._boolean_check(state)
+        self._handle_check(device_info)
+        pin_mask = self._pin_check(pin)
+        if not state:
+            device_info["pin_state"] &= ~pin_mask
+        else:
+            device_info["pin_state"] |= pin_mask
+        self._transaction()
+        self._update_bench(device_info)
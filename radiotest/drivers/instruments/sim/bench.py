@@ -0,0 +1,213 @@
+import math
+import threading
+import numpy as np
+
+#
+# The simulated test bench
+#
+# The simulated instruments share one bench. The AWG writes the tones it generates to the bench, and the
+# spectrum analyzer reads the spectrum back from it. Between the two sits a simple DUT model which adds harmonics,
+# spurs and intermodulation products, so the tests find something to measure.
+#
+
+
+def dbm_to_vpp(dbm, r=50):
+    """ Convert a power in dBm into a peak to peak voltage across r"""
+    return 2 * math.sqrt(2) * math.sqrt(r * math.pow(10, dbm / 10) / 1000)
+
+
+def vpp_to_dbm(vpp, r=50):
+    """ Convert a peak to peak voltage across r into a power in dBm"""
+    if vpp <= 0:
+        return -math.inf
+    vrms = vpp / (2 * math.sqrt(2))
+    return 10 * math.log10((vrms * vrms / r) * 1000)
+
+
+class SimBench:
+    """ Shared state and signal model for the simulated instruments"""
+
+    def __init__(self, seed=0):
+        """
+        Parameters:
+            seed(int): Seed for the analyzer noise, so simulated runs are repeatable
+        """
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # Timing
+        self.latency = 0.0  # Seconds added to every bus transaction
+        self.sweep_time = 0.0  # Seconds a spectrum analyzer sweep takes to complete
+        self.settle_time = 0.0  # Seconds an instrument takes to finish any other command
+        # Spectrum analyzer model
+        self.noise_floor = -110.0  # dBm
+        self.noise_ripple = 2.0  # Peak to peak noise in dB
+        self.path_loss = 0.0  # dB between the sources and the spectrum analyzer input
+        # DUT model
+        self.harmonics_dbc = [-45.0, -52.0, -60.0, -64.0, -70.0, -73.0]  # 2nd harmonic onwards
+        self.spurs_dbc = [(125E3, -62.0)]  # (offset from each tone in Hz, level in dBc)
+        self.iip3 = 15.0  # Intercept point in dBm used for the odd order intermodulation products. None disables them
+        self.max_imd_order = 9
+        # Signals present at the spectrum analyzer input which don't come from the AWG, e.g. a transmitter
+        self.signals = list()
+        # Instrument state written by the simulated instruments
+        self.awg_channels = dict()
+        self.awg_combine = False
+        self.gpio = dict()
+        self.supplies = dict()
+        self.supply_load = 100.0  # Ohms across each power supply output
+
+    def reset(self):
+        """ Return the bench to its power on state, keeping the timing and DUT model"""
+        with self.lock:
+            self.rng = np.random.default_rng(self.seed)
+            self.awg_channels = dict()
+            self.awg_combine = False
+            self.gpio = dict()
+            self.supplies = dict()
+
+    def add_signal(self, freq, level):
+        """ Add a signal at the spectrum analyzer input
+        Parameters:
+            freq(float): Frequency in Hz
+            level(float): Level in dBm
+        Returns:
+            Nothing
+        """
+        self.signals.append({"freq": float(freq), "level": float(level)})
+
+    def awg_tones(self):
+        """ Return the tones routed from the AWG to the analyzer as a list of (frequency, dBm)
+        Channel 1 is cabled to the analyzer. Channel 2 only reaches it when it is combined onto channel 1.
+        """
+        tones = list()
+        with self.lock:
+            for channel, state in self.awg_channels.items():
+                if state.get("output") != "ON" or state.get("wave_type") != "SINE":
+                    continue
+                if channel != 1 and not self.awg_combine:
+                    continue
+                tones.append((state["freq"], vpp_to_dbm(state["amplitude"])))
+        return tones
+
+    def spectrum_lines(self):
+        """ Return every spectral line at the analyzer input
+        Returns:
+            A tuple of numpy arrays (frequencies in Hz, levels in dBm)
+        """
+        freqs = list()
+        levels = list()
+        tones = self.awg_tones()
+        for freq, level in tones:
+            level -= self.path_loss
+            freqs.append(freq)
+            levels.append(level)
+            # Harmonics
+            for i, dbc in enumerate(self.harmonics_dbc):
+                freqs.append(freq * (i + 2))
+                levels.append(level + dbc)
+            # Spurs either side of the tone
+            for offset, dbc in self.spurs_dbc:
+                freqs += [freq - offset, freq + offset]
+                levels += [level + dbc, level + dbc]
+        # Odd order two tone intermodulation products
+        if len(tones) >= 2 and self.iip3 is not None:
+            (f1, p1), (f2, p2) = tones[0:2]
+            p = min(p1, p2) - self.path_loss
+            for order in range(3, self.max_imd_order + 1, 2):
+                k = (order - 1) // 2
+                level = order * p - (order - 1) * self.iip3
+                freqs += [(k + 1) * f1 - k * f2, (k + 1) * f2 - k * f1]
+                levels += [level, level]
+        for signal in self.signals:
+            freqs.append(signal["freq"])
+            levels.append(signal["level"])
+        return np.array(freqs, dtype=np.float64), np.array(levels, dtype=np.float64)
+
+    def sweep(self, start, stop, points, rbw):
+        """ Simulate a positive peak detector sweep
+        Parameters:
+            start(float): Start frequency in Hz
+            stop(float): Stop frequency in Hz
+            points(int): Number of trace points
+            rbw(float): Resolution bandwidth in Hz
+        Returns:
+            A numpy array of trace amplitudes in dBm
+        """
+        bin_freqs = np.linspace(start, stop, points)
+        with self.lock:
+            noise = self.noise_floor + self.noise_ripple * (self.rng.random(points) - 0.5)
+        power = np.power(10.0, noise / 10)
+        line_freqs, line_levels = self.spectrum_lines()
+        inside = (line_freqs >= start) & (line_freqs <= stop)
+        line_freqs = line_freqs[inside]
+        line_levels = line_levels[inside]
+        if len(line_freqs) > 0:
+            # Each line is spread over the resolution bandwidth filter
+            sigma = max(float(rbw), 1.0)
+            offsets = (bin_freqs[:, np.newaxis] - line_freqs[np.newaxis, :]) / sigma
+            power += np.sum(np.power(10.0, line_levels / 10) * np.exp(-0.5 * offsets * offsets), axis=1)
+            # The peak detector catches a line in the bin it falls in, even if the bins are wider than the filter
+            bin_width = (stop - start) / (points - 1) if points > 1 else 1.0
+            index = np.clip(np.rint((line_freqs - start) / bin_width).astype(int), 0, points - 1)
+            np.maximum.at(power, index, np.power(10.0, line_levels / 10))
+        return 10 * np.log10(power)
+
+    def peak_list(self, start, stop, threshold):
+        """ Return the lines between start and stop above a threshold, as the analyzer's peak table would
+        Parameters:
+            start(float): Start frequency in Hz
+            stop(float): Stop frequency in Hz
+            threshold(float): Peak threshold in dBm
+        Returns:
+            A tuple of numpy arrays (frequencies in Hz, levels in dBm), sorted by frequency
+        """
+        freqs, levels = self.spectrum_lines()
+        keep = (freqs >= start) & (freqs <= stop) & (levels > threshold)
+        freqs = freqs[keep]
+        levels = levels[keep]
+        order = np.argsort(freqs, kind="stable")
+        return freqs[order], levels[order]
+
+
+# The bench shared by all the simulated instruments, unless their host is assigned to another bench
+Default_bench = SimBench()
+
+# Further benches by name, and the bench name each assigned host is on. Used to simulate several benches at once.
+Benches = dict()
+Host_benches = dict()
+_benches_lock = threading.Lock()
+
+
+def get_bench(host=None):
+    """ Return the bench a simulated instrument is on
+    Parameters:
+        host(str): (optional) Host name of the instrument. Hosts not assigned to a bench are on the default bench
+    Returns:
+        A SimBench
+    """
+    with _benches_lock:
+        name = Host_benches.get(host)
+        if name is None:
+            return Default_bench
+        bench = Benches.get(name)
+        if bench is None:
+            # A new bench starts with the timing of the default bench, so benchmarks behave the same on every bench
+            bench = SimBench(Default_bench.seed)
+            bench.latency = Default_bench.latency
+            bench.sweep_time = Default_bench.sweep_time
+            bench.settle_time = Default_bench.settle_time
+            Benches[name] = bench
+        return bench
+
+
+def assign_host(host, name):
+    """ Put the simulated instrument at host on the named bench. Takes effect when the instrument connects
+    Parameters:
+        host(str): Host name of the instrument
+        name(str): Name of the bench
+    Returns:
+        Nothing
+    """
+    with _benches_lock:
+        Host_benches[host] = name
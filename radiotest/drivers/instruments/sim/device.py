@@ -0,0 +1,171 @@
+import time
+from .bench import get_bench
+
+#
+# In process stand in for a vxi11.Instrument connection
+#
+# The simulated drivers are subclasses of the real drivers which connect to a SimDevice instead of a VXI-11 host,
+# so everything above the transport, including the command formatting and response parsing, is the real code.
+#
+
+
+class SimDevice:
+    """ Base class of the simulated instruments. Implements the vxi11.Instrument methods used by the drivers,
+    and the IEEE 488.2 common commands"""
+
+    # Response to *IDN?
+    IDN = "Simulated,Instrument,0,0"
+
+    def __init__(self, host, bench=None):
+        """
+        Parameters:
+            host(str): Host name the driver connected to
+            bench(SimBench): (optional) The simulated bench. Defaults to the bench the host is on
+        """
+        self.host = host
+        self.bench = get_bench(host) if bench is None else bench
+        self.state = dict()  # Last argument written to each command header
+        self.response = b""
+        self.busy_until = 0.0
+        self.opc_pending = False
+        self.closed = False
+        self.stats = {"writes": 0, "reads": 0, "bytes_written": 0, "bytes_read": 0}
+        # Time and count of each command header, from the write to the read of the response for queries
+        self.commands = dict()
+        self.pending = None
+
+    def _transaction(self):
+        """ Account for the bus latency of one transaction"""
+        if self.closed:
+            raise OSError("Simulated connection to {} is closed".format(self.host))
+        if self.bench.latency > 0:
+            time.sleep(self.bench.latency)
+
+    def _busy(self, seconds):
+        """ Mark the instrument busy for a while, e.g. for a sweep"""
+        self.busy_until = max(self.busy_until, time.monotonic() + seconds)
+
+    def write(self, message):
+        """ Send a command"""
+        self.write_raw(message.encode("utf-8"))
+
+    def _record(self, header, start):
+        """ Account for the time taken by a command"""
+        entry = self.commands.setdefault(header, {"count": 0, "time": 0.0})
+        entry["count"] += 1
+        entry["time"] += time.monotonic() - start
+
+    def write_raw(self, data):
+        """ Send a command as bytes"""
+        start = time.monotonic()
+        self._transaction()
+        self.stats["writes"] += 1
+        self.stats["bytes_written"] += len(data)
+        self.response = b""
+        self.handle_raw(bytes(data))
+        header = bytes(data[:40]).split(b" ", 1)[0].split(b",", 1)[0].decode("utf-8", "replace").strip().upper()
+        if len(self.response) > 0:
+            # A query. It is complete when the response has been read.
+            self.pending = (header, start)
+        else:
+            self._record(header, start)
+
+    def read_raw(self, num=-1):
+        """ Read the response to the last query"""
+        self._transaction()
+        response = self.response
+        self.response = b""
+        if num > 0:
+            response, self.response = response[:num], response[num:]
+        self.stats["reads"] += 1
+        self.stats["bytes_read"] += len(response)
+        if self.pending is not None and len(self.response) == 0:
+            self._record(*self.pending)
+            self.pending = None
+        return response
+
+    def read(self, num=-1):
+        """ Read the response to the last query as a string"""
+        return self.read_raw(num).decode("utf-8").rstrip("\r\n")
+
+    def ask(self, message):
+        """ Send a query and return the response"""
+        self.write(message)
+        return self.read()
+
+    def close(self):
+        """ Close the connection"""
+        self.closed = True
+
+    def handle_raw(self, data):
+        """ Handle a command sent as bytes. Instruments accepting binary data override this"""
+        self.handle(data.decode("utf-8").strip())
+
+    def handle(self, message):
+        """ Split a command into its header and arguments, and dispatch it"""
+        header, _, args = message.partition(" ")
+        header = header.upper()
+        args = args.strip()
+        if header.endswith("?"):
+            response = self.query(header[:-1], args)
+            if isinstance(response, str):
+                response = (response + "\n").encode("utf-8")
+            self.response = response
+        else:
+            self.command(header, args)
+
+    def command(self, header, args):
+        """ Handle a command. Subclasses handle their own commands and call this for the rest"""
+        if header == "*RST":
+            self.state = dict()
+            self._busy(self.bench.settle_time)
+        elif header == "*OPC":
+            self.opc_pending = True
+        elif header in ["*WAI", "*CLS"]:
+            pass
+        else:
+            # Remember the setting, so a query of the same header reads it back
+            self.state[header.lstrip(":")] = args
+            self._busy(self.bench.settle_time)
+
+    def query(self, header, args):
+        """ Handle a query. Subclasses handle their own queries and call this for the rest
+        Returns:
+            The response as a string or bytes
+        """
+        if header == "*IDN":
+            return self.IDN
+        if header == "*ESR":
+            # The operation complete bit is set once every pending operation has finished
+            if self.opc_pending and time.monotonic() >= self.busy_until:
+                self.opc_pending = False
+                return "1"
+            return "0"
+        if header == "*STB":
+            return "0"
+        if header == "*OPC":
+            # The query form blocks until the pending operations are complete
+            remaining = self.busy_until - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            return "1"
+        return self.state.get(header.lstrip(":"), "0")
+
+
+def ieee_block(data):
+    """ Wrap bytes in an IEEE 488.2 definite length block with a 9 digit length, as the Rigol instruments do"""
+    return "#9{:09d}".format(len(data)).encode("ascii") + data
+
+
+def bitmap(width=8, height=8, color=(0, 0, 255)):
+    """ Return a small single color 24 bit BMP image, used as the screen dump of the simulated instruments"""
+    row = bytes(color[::-1]) * width
+    row += b"\x00" * ((4 - len(row) % 4) % 4)
+    pixels = row * height
+    header_size = 14 + 40
+    file_header = b"BM" + (header_size + len(pixels)).to_bytes(4, "little") + b"\x00\x00\x00\x00" + \
+        header_size.to_bytes(4, "little")
+    info_header = (40).to_bytes(4, "little") + width.to_bytes(4, "little") + height.to_bytes(4, "little") + \
+        (1).to_bytes(2, "little") + (24).to_bytes(2, "little") + bytes(4) + len(pixels).to_bytes(4, "little") + \
+        bytes(16)
+    return file_header + info_header + pixels
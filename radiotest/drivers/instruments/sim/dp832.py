@@ -0,0 +1,70 @@
+from radiotest.drivers.instruments.vxi import dp832
+from .device import SimDevice
+
+
+class SimDp832Device(SimDevice):
+    """ Simulated Rigol DP832 power supply. Each output drives the resistive load set on the bench"""
+
+    IDN = "RIGOL TECHNOLOGIES,DP832,DP8CSIM0001,00.01.14"
+
+    def __init__(self, host, bench=None):
+        SimDevice.__init__(self, host, bench)
+        self.selected = 1
+        self.preset()
+
+    def preset(self):
+        """ Power on settings"""
+        with self.bench.lock:
+            self.bench.supplies = {channel: {"output": False, "voltage": 0.0, "current": 0.0}
+                                   for channel in [1, 2, 3]}
+
+    def supply(self):
+        """ Return the state of the selected output"""
+        return self.bench.supplies.setdefault(self.selected, {"output": False, "voltage": 0.0, "current": 0.0})
+
+    def command(self, header, args):
+        if header == "*RST":
+            self.preset()
+        elif header == ":INST":
+            self.selected = int(args.upper().replace("CH", ""))
+            return
+        elif header == ":VOLT":
+            with self.bench.lock:
+                self.supply()["voltage"] = float(args)
+        elif header == ":CURR":
+            with self.bench.lock:
+                self.supply()["current"] = float(args)
+        elif header == ":OUTP":
+            channel, _, state = args.upper().partition(",")
+            with self.bench.lock:
+                supply = self.bench.supplies.setdefault(int(channel.replace("CH", "")),
+                                                        {"output": False, "voltage": 0.0, "current": 0.0})
+                # The driver turns all the channels off without a state
+                supply["output"] = state.strip() == "ON"
+            return
+        SimDevice.command(self, header, args)
+
+    def measure(self):
+        """ Return the voltage and current of the selected output"""
+        supply = self.supply()
+        if not supply["output"]:
+            return 0.0, 0.0
+        # Constant voltage until the current limit is reached, then constant current
+        current = supply["voltage"] / self.bench.supply_load
+        if current > supply["current"]:
+            return supply["current"] * self.bench.supply_load, supply["current"]
+        return supply["voltage"], current
+
+    def query(self, header, args):
+        if header in [":MEAS:VOLT", ":MEAS:CURR", ":MEAS:POWE"]:
+            voltage, current = self.measure()
+            value = {":MEAS:VOLT": voltage, ":MEAS:CURR": current, ":MEAS:POWE": voltage * current}[header]
+            return "{:.4f}".format(value)
+        return SimDevice.query(self, header, args)
+
+
+class Dp832(dp832.Dp832):
+    """ Rigol DP832 driver connected to a simulated power supply"""
+
+    def _connect(self):
+        return SimDp832Device(self.resourcehost)
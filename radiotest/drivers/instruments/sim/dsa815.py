@@ -0,0 +1,102 @@
+from radiotest.drivers.instruments.vxi import dsa815
+from .device import SimDevice, ieee_block, bitmap
+
+
+class SimDsa815Device(SimDevice):
+    """ Simulated Rigol DSA815 spectrum analyzer. The spectrum comes from the bench"""
+
+    IDN = "Rigol Technologies,DSA815,DSA8SIM0001,00.01.19.00.02"
+    POINTS = 601
+
+    def __init__(self, host, bench=None):
+        SimDevice.__init__(self, host, bench)
+        self.preset()
+
+    def preset(self):
+        """ Power on settings"""
+        self.center = 750E6
+        self.span = 1.5E9
+        self.rbw = 1E6
+        self.ref_offset = 0.0
+        self.display_line = -10.0
+        self.continuous = True
+        self.trace_format = "ASC"
+        self.trace = None
+
+    def start_stop(self):
+        """ Return the start and stop frequencies of the current span"""
+        return self.center - self.span / 2, self.center + self.span / 2
+
+    def command(self, header, args):
+        if header == "*RST":
+            self.preset()
+        elif header in [":SENS:FREQ:CENT", ":SENS:FREQ:SPAN"]:
+            if header.endswith("CENT"):
+                self.center = float(args)
+            else:
+                self.span = float(args)
+            self.trace = None
+        elif header in [":SENS:FREQ:START", ":SENS:FREQ:STOP"]:
+            start, stop = self.start_stop()
+            if header.endswith("START"):
+                start = float(args)
+            else:
+                stop = float(args)
+            self.center = (start + stop) / 2
+            self.span = stop - start
+            self.trace = None
+        elif header == ":SENS:BAND:RES":
+            self.rbw = float(args)
+        elif header == ":DISP:WIN:TRAC:Y:SCAL:RLEV:OFFS":
+            self.ref_offset = float(args)
+        elif header == ":DISP:WIN:TRAC:Y:DLIN":
+            self.display_line = float(args)
+        elif header == ":INIT:CONT":
+            self.continuous = args.upper() in ["ON", "1"]
+        elif header == ":FORM:TRAC:DATA":
+            self.trace_format = "REAL" if args.upper().startswith("REAL") else "ASC"
+        elif header == ":INIT:IMM":
+            # Sweep now. The result is read back with the trace and peak table queries.
+            start, stop = self.start_stop()
+            self.trace = self.bench.sweep(start, stop, self.POINTS, self.rbw) + self.ref_offset
+            self._busy(self.bench.sweep_time)
+            return
+        SimDevice.command(self, header, args)
+
+    def peaks(self):
+        """ Peaks above the display line, in displayed units"""
+        start, stop = self.start_stop()
+        freqs, levels = self.bench.peak_list(start, stop, self.display_line - self.ref_offset)
+        return freqs, levels + self.ref_offset
+
+    def query(self, header, args):
+        if header == ":SENS:FREQ:STAR":
+            return repr(self.start_stop()[0])
+        if header == ":SENS:FREQ:STOP":
+            return repr(self.start_stop()[1])
+        if header == ":INIT:CONT":
+            return "1" if self.continuous else "0"
+        if header == ":TRAC:MATH:PEAK:POIN":
+            return str(len(self.peaks()[0]))
+        if header == ":TRAC:MATH:PEAK:DATA":
+            freqs, levels = self.peaks()
+            return ",".join("{:.6e},{:.2f}".format(f, a) for f, a in zip(freqs, levels))
+        if header == ":TRAC:DATA":
+            if self.trace is None:
+                start, stop = self.start_stop()
+                self.trace = self.bench.sweep(start, stop, self.POINTS, self.rbw) + self.ref_offset
+            if self.trace_format == "REAL":
+                data = self.trace.astype("<f4").tobytes()
+            else:
+                data = ", ".join("{:.6e}".format(a) for a in self.trace).encode("ascii")
+            return ieee_block(data) + b"\n"
+        if header == ":PRIV:SNAP":
+            return ieee_block(bitmap(color=(255, 255, 0))) + b"\n"
+        return SimDevice.query(self, header, args)
+
+
+class Dsa815(dsa815.Dsa815):
+    """ Rigol DSA815 driver connected to a simulated analyzer"""
+
+    def _connect(self):
+        return SimDsa815Device(self.resourcehost)
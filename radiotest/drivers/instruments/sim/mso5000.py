@@ -0,0 +1,29 @@
+from radiotest.drivers.instruments.vxi import mso5000
+from .device import SimDevice, ieee_block, bitmap
+
+
+class SimMso5000Device(SimDevice):
+    """ Simulated Rigol MSO5000 oscilloscope. Settings are accepted and read back"""
+
+    IDN = "RIGOL TECHNOLOGIES,MSO5074,MS5ASIM0001,00.01.02.03.02"
+
+    def query(self, header, args):
+        if header == ":DISP:DATA":
+            return ieee_block(bitmap(color=(0, 255, 255))) + b"\n"
+        if header == ":TRIG:STAT":
+            return "STOP"
+        return SimDevice.query(self, header, args)
+
+    def command(self, header, args):
+        # The driver queries the trigger status without a question mark
+        if header == ":TRIG:STAT":
+            self.response = b"STOP\n"
+            return
+        SimDevice.command(self, header, args)
+
+
+class Mso5000(mso5000.Mso5000):
+    """ Rigol MSO5000 driver connected to a simulated oscilloscope"""
+
+    def _connect(self):
+        return SimMso5000Device(self.resourcehost)
@@ -0,0 +1,92 @@
+from radiotest.drivers.instruments.vxi import sdg1032x
+from .device import SimDevice
+
+
+class SimSdg1032xDevice(SimDevice):
+    """ Simulated Siglent SDG1032X arbitrary waveform generator. The channel outputs are written to the bench"""
+
+    IDN = "Siglent Technologies,SDG1032X,SDG1XSIM0001,1.01.01.33R1"
+    BUILTIN = ["SINE", "NOISE", "STAIRUP", "STAIRDN", "STAIRUD", "PPULSE", "NPULSE", "TRAPEZIA", "UPRAMP", "DNRAMP"]
+
+    def __init__(self, host, bench=None):
+        SimDevice.__init__(self, host, bench)
+        self.waves = dict()
+        self.preset()
+
+    def preset(self):
+        """ Power on settings"""
+        with self.bench.lock:
+            self.bench.awg_channels = {channel: {"output": "OFF", "load": "HZ", "wave_type": "SINE", "freq": 1000.0,
+                                                 "amplitude": 4.0, "offset": 0.0}
+                                       for channel in [1, 2]}
+            self.bench.awg_combine = False
+
+    @staticmethod
+    def pairs(args):
+        """ Split a comma separated argument list of names and values into a dict"""
+        items = [item.strip() for item in args.split(",")]
+        return dict(zip(items[0::2], items[1::2]))
+
+    def command(self, header, args):
+        if header == "*RST":
+            self.preset()
+            SimDevice.command(self, header, args)
+            return
+        channel, _, subsystem = header.partition(":")
+        if channel.startswith("C") and channel[1:].isdigit():
+            channel = int(channel[1:])
+            with self.bench.lock:
+                state = self.bench.awg_channels.setdefault(channel, {"output": "OFF"})
+                if subsystem == "OUTP":
+                    items = [item.strip().upper() for item in args.split(",")]
+                    if items[0] in ["ON", "OFF"]:
+                        state["output"] = items[0]
+                        items = items[1:]
+                    for name, value in zip(items[0::2], items[1::2]):
+                        if name == "LOAD":
+                            state["load"] = value
+                elif subsystem == "BSWV":
+                    values = self.pairs(args)
+                    if "WVTP" in values:
+                        state["wave_type"] = values["WVTP"].upper()
+                    if "FRQ" in values:
+                        state["freq"] = float(values["FRQ"].upper().replace("HZ", ""))
+                    if "AMP" in values:
+                        state["amplitude"] = float(values["AMP"].upper().replace("V", ""))
+                    if "OFST" in values:
+                        state["offset"] = float(values["OFST"].upper().replace("V", ""))
+                elif subsystem == "COMBINE":
+                    self.bench.awg_combine = args.strip().upper() == "ON"
+                elif subsystem == "ARWV":
+                    state["wave_type"] = "ARB"
+            return
+        SimDevice.command(self, header, args)
+
+    def handle_raw(self, data):
+        # Waveform uploads carry binary data after the WAVEDATA field
+        marker = data.find(b"WAVEDATA,")
+        if marker < 0:
+            SimDevice.handle_raw(self, data)
+            return
+        values = self.pairs(data[:marker].decode("utf-8").partition(" ")[2])
+        self.waves[values["WVNM"]] = {"values": values, "data": data[marker + len("WAVEDATA,"):]}
+
+    def query(self, header, args):
+        if header == "STL":
+            return "STL " + ", ".join("M{}, {}".format(i, name) for i, name in enumerate(self.BUILTIN))
+        if header == "WVDT":
+            name = args.split(",")[-1].strip()
+            if name not in self.waves:
+                return "WVDT "
+            wave = self.waves[name]
+            attributes = "WVNM,{},TYPE,{},LENGTH,{}B,FREQ,{},POS,M50".format(
+                name, wave["values"].get("TYPE", 5), len(wave["data"]), wave["values"].get("FREQ", 1000))
+            return b"WVDT " + attributes.encode("utf-8") + b", WAVEDATA," + wave["data"] + b"\n"
+        return SimDevice.query(self, header, args)
+
+
+class Sdg1032x(sdg1032x.Sdg1032x):
+    """ Siglent SDG1032X driver connected to a simulated generator"""
+
+    def _connect(self):
+        return SimSdg1032xDevice(self.resourcehost)
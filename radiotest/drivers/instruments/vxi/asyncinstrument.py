@@ -0,0 +1,102 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+#
+# asyncio interface to the instrument drivers
+#
+# vxi11 calls block, so each wrapped instrument gets its own worker thread and the driver methods are run on it.
+# The commands sent to one instrument stay in order, while commands sent to different instruments overlap,
+# so the network latency and settling time of one instrument is hidden behind the other.
+#
+
+
+class AsyncInstrument:
+    """ Wraps a synchronous driver. Every method of the driver is available as a coroutine, e.g.
+
+        async with AsyncInstrument(awg) as a_awg, AsyncInstrument(sa) as a_sa:
+            await asyncio.gather(a_awg.output_on(1), a_sa.set_center_freq(7.2E6))
+
+    Only use the driver through the wrapper while the wrapper is open, the drivers are not thread safe.
+    """
+
+    def __init__(self, driver):
+        """
+        Parameters:
+            driver(Instrument): The driver to wrap
+        """
+        self.driver = driver
+        name = getattr(driver, "model", driver.__class__.__name__)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="radiotest-{}".format(name))
+
+    async def run(self, function, *args, **kwargs):
+        """ Run a function on the instrument's worker thread
+        Parameters:
+            function(callable): Called with args and kwargs. Usually a sequence of driver calls
+        Returns:
+            The value returned by the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.driver, name)
+        if not callable(attribute):
+            return attribute
+
+        async def method(*args, **kwargs):
+            return await self.run(attribute, *args, **kwargs)
+        method.__name__ = name
+        method.__doc__ = attribute.__doc__
+        return method
+
+    def close(self):
+        """ Stop the worker thread once the queued calls are done. The driver itself stays open"""
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+async def gather_jobs(jobs):
+    """ Run jobs on their instruments at the same time
+    Parameters:
+        jobs(list): A list of (AsyncInstrument, function) tuples
+    Returns:
+        A list of the values returned by the functions, in the order of the jobs.
+        Every job runs to completion before the first exception raised, if any, is re-raised.
+    """
+    results = await asyncio.gather(*[instrument.run(function) for instrument, function in jobs],
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def run_concurrently(jobs):
+    """ Run jobs, each on its own instrument, at the same time. For use from synchronous code such as the test
+    worker thread, which has no event loop.
+    Parameters:
+        jobs(list): A list of (driver, function) tuples. No two jobs may use the same driver
+    Returns:
+        A list of the values returned by the functions, in the order of the jobs
+    """
+    drivers = [driver for driver, function in jobs]
+    if len(set(map(id, drivers))) != len(drivers):
+        raise ValueError("Each job must use a different instrument")
+    wrapped = [(AsyncInstrument(driver), function) for driver, function in jobs]
+    try:
+        return asyncio.run(gather_jobs(wrapped))
+    finally:
+        for instrument, function in wrapped:
+            instrument.close()
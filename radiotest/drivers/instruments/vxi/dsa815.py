@@ -1,15 +1,40 @@
 from .instrument import Instrument, InstrumentError
 import time
+import numpy as np
+
+
+def parse_peak_table(response):
+    """ Convert a peak table response into arrays in one pass
+    Parameters:
+        response(str): The response to :TRAC:MATH:PEAK:DATA?, a comma separated list of frequency, amplitude pairs
+    Returns:
+        A tuple of numpy float arrays (frequencies in Hz, amplitudes)
+    """
+    # fromstring() parses the whole response in C, without building a list of Python strings
+    try:
+        values = np.fromstring(response, dtype=np.float64, sep=",")
+    except ValueError:
+        raise InstrumentError("Malformed peak table data")
+    # Older versions of numpy stop quietly at the first value they can't parse, so check every value was converted
+    if len(values) != response.count(",") + 1 or len(values) % 2 != 0:
+        raise InstrumentError("Malformed peak table data")
+    # The values are interleaved frequency, amplitude pairs. The reshape is a view, not a copy.
+    pairs = values.reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
 
 class Dsa815(Instrument):
     """This class controls a Rigol DSA815 spectrum analyzer"""
 
     def rst(self):
         self.reset()
+        # A reset puts every setting back to its default, so forget what was applied before
+        self.invalidate_settings()
         self.set_display_line_state("OFF")
 
     def __init__(self, resourcehost):
         Instrument.__init__(self, resourcehost)
+        self.settings = dict()
         self.iid = self.identify()
         if(self.iid[0:25] != 'Rigol Technologies,DSA815'):
             raise InstrumentError('Instrument Manufacturer/Model Number Mismatch, '+self.iid)
@@ -22,6 +47,28 @@ class Dsa815(Instrument):
         super().write(message)
         self.wait()
 
+    def invalidate_settings(self, *keys):
+        """ Forget the last applied value of the settings specified, or all of them if none are specified"""
+        if len(keys) == 0:
+            self.settings = dict()
+            return
+        for key in keys:
+            self.settings.pop(key, None)
+
+    def _write_setting(self, key, value, message):
+        """ Write a setting command only if the value differs from the one last applied
+        Parameters:
+            key(str): Name of the setting in the settings cache
+            value(obj): Value of the setting
+            message(str): The command which applies the setting
+        Returns:
+            Nothing
+        """
+        if key in self.settings and self.settings[key] == value:
+            return
+        self.write(message)
+        self.settings[key] = value
+
 
     def console(self):
         """Debugging console"""
@@ -34,10 +81,10 @@ class Dsa815(Instrument):
         self.write(":SYST:PRES:TYP: {type}".format(type=type))
 
     def set_single_sweep(self):
-        self.write(':INIT:CONT OFF')
+        self._write_setting("continuous", False, ':INIT:CONT OFF')
 
     def set_continuous_sweep(self):
-        self.write(':INIT:CONT ON')
+        self._write_setting("continuous", True, ':INIT:CONT ON')
 
     def sweep_restart(self):
         self.write('INIT:REST')
@@ -49,116 +96,177 @@ class Dsa815(Instrument):
         """Set the sweep accuracy"""
         if accuracy not in ["NORM", "ACC"]:
             raise InstrumentError("Invalid sweep accuracy")
-        self.write(":SENS:SWE:TIME:AUTO:RUL:"+accuracy)
+        self._write_setting("sweep_accuracy", accuracy, ":SENS:SWE:TIME:AUTO:RUL:"+accuracy)
 
     def set_span(self, span):
         """Set the frequency span"""
-        self.write(':SENS:FREQ:SPAN '+str(span))
+        # Span, center, start and stop are coupled, so a change to one invalidates the others
+        if self.settings.get("span") != span:
+            self.invalidate_settings("start", "stop")
+        self._write_setting("span", span, ':SENS:FREQ:SPAN '+str(span))
 
     def set_start_freq(self, start):
-        self.write(':SENS:FREQ:START ' + str(start))
+        if self.settings.get("start") != start:
+            self.invalidate_settings("center", "span")
+        self._write_setting("start", start, ':SENS:FREQ:START ' + str(start))
 
     def set_stop_freq(self, stop):
-        self.write(':SENS:FREQ:STOP ' + str(stop))
+        if self.settings.get("stop") != stop:
+            self.invalidate_settings("center", "span")
+        self._write_setting("stop", stop, ':SENS:FREQ:STOP ' + str(stop))
 
     def set_center_freq(self, center):
         """Set the center frequency"""
-        self.write(':SENS:FREQ:CENT '+str(center))
+        if self.settings.get("center") != center:
+            self.invalidate_settings("start", "stop")
+        self._write_setting("center", center, ':SENS:FREQ:CENT '+str(center))
 
     def set_atten(self, atten):
         """Set the input attenuator"""
         if(atten == "auto"):
-            self.write(':SENS:POW:RF:ATT:AUTO ON')
+            self._write_setting("atten", atten, ':SENS:POW:RF:ATT:AUTO ON')
         else:
-            self.write(':SENS:POW:RF:ATT '+str(atten))
+            self._write_setting("atten", atten, ':SENS:POW:RF:ATT '+str(atten))
 
     def set_ref_level(self, ref_level):
         """ Set the reference level"""
-        self.write(':DISP:WIN:TRAC:Y:SCAL:RLEV {ref_level}'.format(ref_level=ref_level))
+        self._write_setting("ref_level", ref_level,
+                            ':DISP:WIN:TRAC:Y:SCAL:RLEV {ref_level}'.format(ref_level=ref_level))
 
     def set_ref_offset(self, ref_offset):
         """ Set the reference offset"""
-        self.write(':DISP:WIN:TRAC:Y:SCAL:RLEV:OFFS {ref_offset}'.format(ref_offset=ref_offset))
+        self._write_setting("ref_offset", ref_offset,
+                            ':DISP:WIN:TRAC:Y:SCAL:RLEV:OFFS {ref_offset}'.format(ref_offset=ref_offset))
 
 
     def set_rbw(self, bw):
         """Set Resolution Bandwidth"""
-        self.write(":SENS:BAND:RES {bw}".format(bw=bw))
+        self._write_setting("rbw", bw, ":SENS:BAND:RES {bw}".format(bw=bw))
 
     def set_vbw(self, bw):
         """Set Video Bandwidth"""
-        self.write(":SENS:BAND:VID {bw}".format(bw=bw))
-        pass
+        self._write_setting("vbw", bw, ":SENS:BAND:VID {bw}".format(bw=bw))
 
     def get_peak_data(self):
         """Get the peak data from the peak table"""
         return self.ask(":TRAC:MATH:PEAK:DATA?")
 
+    def get_peak_table(self):
+        """ Get the peak table
+        Returns:
+            A tuple of numpy float arrays (frequencies in Hz, amplitudes)
+        """
+        return parse_peak_table(self.get_peak_data())
+
     def get_peak_points(self):
         """ Get the number of points in the peak table"""
         return self.ask(":TRAC:MATH:PEAK:POIN?")
 
+    def set_trace_format(self, fmt="ASC"):
+        """ Set the trace data transfer format: ASC for ASCII, REAL for little endian 32 bit floats"""
+        if fmt not in ["ASC", "REAL"]:
+            raise InstrumentError("Invalid trace format")
+        if fmt == "REAL":
+            self._write_setting("byte_order", "SWAP", ":FORM:BORD SWAP")
+            self._write_setting("trace_format", fmt, ":FORM:TRAC:DATA REAL,32")
+        else:
+            self._write_setting("trace_format", fmt, ":FORM:TRAC:DATA ASC")
+
+    def get_trace_data(self, trace=1):
+        """ Get the amplitudes of all the points of a trace in one block transfer
+        Parameters:
+            trace(int): Trace number (1-3)
+        Returns:
+            A numpy float array of amplitudes in display units
+        """
+        fmt = self.settings.get("trace_format", "ASC")
+        # The response is an IEEE 488.2 definite length block: #<n><n length digits><data>
+        payload = self._ask_read_block(":TRAC:DATA? TRACE{}".format(int(trace)))
+        if fmt == "REAL":
+            return np.frombuffer(payload, dtype="<f4").astype(np.float64)
+        return np.fromstring(bytes(payload).decode("ascii"), sep=",")
+
+    def get_trace_freqs(self, points):
+        """ Get the frequency of every point of a trace
+        Parameters:
+            points(int): Number of points in the trace
+        Returns:
+            A numpy float array of frequencies in Hz
+        """
+        if "center" in self.settings and "span" in self.settings:
+            start = self.settings["center"] - self.settings["span"] / 2
+            stop = self.settings["center"] + self.settings["span"] / 2
+        elif "start" in self.settings and "stop" in self.settings:
+            start = self.settings["start"]
+            stop = self.settings["stop"]
+        else:
+            start = float(self.ask(":SENS:FREQ:STAR?"))
+            stop = float(self.ask(":SENS:FREQ:STOP?"))
+        return np.linspace(start, stop, points)
+
+    def get_trace(self, trace=1):
+        """ Get a complete trace
+        Parameters:
+            trace(int): Trace number (1-3)
+        Returns:
+            A tuple of numpy arrays (frequencies in Hz, amplitudes)
+        """
+        amplitudes = self.get_trace_data(trace)
+        return self.get_trace_freqs(len(amplitudes)), amplitudes
+
     def set_peak_table_state(self, state):
         """ Enable or disable the peak tablt state"""
         st = "ON" if state is True else "OFF"
-        self.write(":TRAC:MATH:PEAK:TABL:STAT {st}".format(st=st))
+        self._write_setting("peak_table_state", st, ":TRAC:MATH:PEAK:TABL:STAT {st}".format(st=st))
 
     def set_peak_table_threshold(self, method="NORM"):
         """ Set the peak table sorting method"""
-        self.write(":TRAC:MATH:PEAK:THR {method}".format(method=method))
+        self._write_setting("peak_table_threshold", method, ":TRAC:MATH:PEAK:THR {method}".format(method=method))
 
     def set_peak_table_sort(self, method="FREQ"):
         """ Set the peak table sorting method"""
-        self.write(":TRAC:MATH:PEAK:TABL:SORT {method}".format(method=method))
+        self._write_setting("peak_table_sort", method, ":TRAC:MATH:PEAK:TABL:SORT {method}".format(method=method))
 
     def set_display_line(self, level=0):
         """ Set the display line"""
-        self.write(":DISP:WIN:TRAC:Y:DLIN {level}".format(level=level))
+        self._write_setting("display_line", level, ":DISP:WIN:TRAC:Y:DLIN {level}".format(level=level))
 
     def set_display_line_state(self, state):
         dls = "ON" if state is True else "OFF"
-        self.write("DISP:WIN:TRAC:Y:DLIN:STAT {}".format(dls))
+        self._write_setting("display_line_state", dls, "DISP:WIN:TRAC:Y:DLIN:STAT {}".format(dls))
 
     def set_preamp_off(self):
         """Disable the built in preamp"""
-        self.write(':SENS:POW:RF:GAIN OFF')
+        self._write_setting("preamp", False, ':SENS:POW:RF:GAIN OFF')
 
     def set_preamp_on(self):
         """Enable the built in preamp"""
-        self.write(':SENS:POW:RF:GAIN ON')
+        self._write_setting("preamp", True, ':SENS:POW:RF:GAIN ON')
 
     def get_screendump(self):
-        """ Retrieve screen dump bmp bits """
-        # Get cont mode
-        contmode = self.ask(':INIT:CONT?')
+        """ Retrieve screen dump bmp bits
+        Returns:
+            A tuple (size, data). data is a bytearray holding the BMP file, read from the instrument straight into
+            a buffer of its size
+        """
         # Set cont mode off
-        self.write(':INIT:CONT 0')
-        # Retrieve the header and data for the snapshot
-        res = self._ask_read_raw(':PRIV:SNAP?')
-
-        # Split the header and data into separate arrays
-        header = res[0:11]
-        data = res[11:]
-        # Get size from header
-        size = int(header[2:])
-        data = data[0:size]
-        return (size, data)
+        self._write_setting("continuous", False, ':INIT:CONT 0')
+        # Retrieve the snapshot. The size comes from the block header
+        data = self._ask_read_block(':PRIV:SNAP?')
+        return (len(data), data)
 
 
     def save_screendump(self, file):
         """Save a .bmp screenshot to a file"""
+        contmode = self.ask(':INIT:CONT?')
         size, data = self.get_screendump()
 
-        # Open the file to write the bitmap info into
-        f = open(file, "wb")
-        # Write the bitmap info into the file
-        f.write(data)
-        # Set the file size to what was sent in the header
-        f.truncate(size)
-        # Close the file
-        f.close()
+        # Write the bitmap into the file
+        with open(file, "wb") as f:
+            f.write(data)
         # Restore the previous cont mode state
         self._write(':INIT:CONT {contmode}'.format(contmode=contmode))
+        self.invalidate_settings("continuous")
         # Set local mode
         self._write(':SYST:COMM:BRMT 0')
         return
@@ -1,6 +1,9 @@
+import bisect
+import csv
+import json
+import threading
 import time
-import vxi11
-import vxiinstrclasses.__version__ as pkgvers
+from collections import deque
 
 #
 # This is an error class used by all of the instrument modules to throw an exception
@@ -13,6 +16,181 @@ class InstrumentError(Exception):
     def __str__(self):
         return repr(self.value)
 
+#
+# Command completion synchronization modes
+#
+# SYNC_SLEEP: Send *WAI and sleep for a fixed time (legacy behaviour)
+# SYNC_OPC: Send *OPC and poll the event status register until the operation complete bit is set
+#
+
+SYNC_SLEEP = "sleep"
+SYNC_OPC = "opc"
+
+# Operation complete bit in the standard event status register
+ESR_OPC = 0x01
+
+# Size of the pieces a binary block response is read in. Each piece is copied straight into the block's buffer
+BLOCK_CHUNK_SIZE = 65536
+
+#
+# Instrumentation
+#
+# Every command sent to an instrument, and every response read, is passed to the registered hooks as an event dict:
+#   {"instrument", "command", "kind", "timestamp", "elapsed", "bytes_out", "bytes_in", "error"}
+# "command" is the SCPI header of the message (e.g. ":SENS:FREQ:CENT"), "kind" the Instrument method used
+# (write, write_raw, ask, ask_read_raw, ask_read_block, read_raw) and "error" the text of the exception raised, or None.
+# Hooks are called on the thread which talks to the instrument. With no hooks registered nothing is timed.
+#
+
+_hooks = list()
+
+# Upper edges in seconds of the latency histogram buckets. The last bucket holds everything slower
+HISTOGRAM_EDGES = [0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0]
+
+
+def add_hook(hook):
+    """Register an instrumentation hook
+    Parameters:
+        hook(callable): Called with the event dict of every instrument transaction
+    Returns:
+        Nothing
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister an instrumentation hook"""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def command_header(message):
+    """Return the SCPI header of a message, e.g. ":TRAC:DATA?" for ":TRAC:DATA? TRACE1"
+    Parameters:
+        message(str or bytes): The message sent to the instrument
+    Returns:
+        The header as an upper case string
+    """
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        # Binary messages carry a block of data after the header, only the start is decoded
+        message = bytes(message[:40]).decode("utf-8", "replace")
+    return message.strip().split(" ", 1)[0].split(",", 1)[0].upper()
+
+
+def _payload_size(data):
+    """Return the size of a message or response in bytes"""
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    return len(data)
+
+
+class Recorder:
+    """Instrumentation hook which keeps per instrument, per command statistics: the count, the errors, the
+    bytes written and read, the total, minimum and maximum latency and a latency histogram.
+    The most recent events are also kept as a trace, which can be exported to CSV or JSON."""
+
+    TRACE_FIELDS = ["timestamp", "instrument", "command", "kind", "elapsed", "bytes_out", "bytes_in", "error"]
+
+    def __init__(self, max_trace=100000):
+        """
+        Parameters:
+            max_trace(int): Maximum number of events kept in the trace. The oldest are dropped first
+        """
+        self.lock = threading.Lock()
+        self.max_trace = max_trace
+        self.stats = dict()
+        self.trace = deque(maxlen=max_trace)
+
+    def __call__(self, event):
+        """Record an event"""
+        with self.lock:
+            commands = self.stats.setdefault(event["instrument"], dict())
+            entry = commands.get(event["command"])
+            if entry is None:
+                entry = {"count": 0, "errors": 0, "bytes_out": 0, "bytes_in": 0, "total_time": 0.0,
+                         "min_time": None, "max_time": 0.0, "histogram": [0] * (len(HISTOGRAM_EDGES) + 1)}
+                commands[event["command"]] = entry
+            elapsed = event["elapsed"]
+            entry["count"] += 1
+            entry["bytes_out"] += event["bytes_out"]
+            entry["bytes_in"] += event["bytes_in"]
+            entry["total_time"] += elapsed
+            entry["min_time"] = elapsed if entry["min_time"] is None else min(entry["min_time"], elapsed)
+            entry["max_time"] = max(entry["max_time"], elapsed)
+            entry["histogram"][bisect.bisect_left(HISTOGRAM_EDGES, elapsed)] += 1
+            if event["error"] is not None:
+                entry["errors"] += 1
+            self.trace.append(event)
+
+    def start(self):
+        """Start recording"""
+        add_hook(self)
+
+    def stop(self):
+        """Stop recording. The statistics are kept"""
+        remove_hook(self)
+
+    def is_recording(self):
+        """Return True if the recorder is registered as a hook"""
+        return self in _hooks
+
+    def reset(self):
+        """Clear the statistics and the trace"""
+        with self.lock:
+            self.stats = dict()
+            self.trace.clear()
+
+    def get_stats(self):
+        """Return a copy of the statistics
+        Returns:
+            A dict of instruments, each a dict of command headers, each a dict {"count", "errors", "bytes_out",
+            "bytes_in", "total_time", "min_time", "max_time", "histogram"}
+        """
+        with self.lock:
+            return {instrument: {command: dict(entry, histogram=list(entry["histogram"]))
+                                 for command, entry in commands.items()}
+                    for instrument, commands in self.stats.items()}
+
+    def summary(self, top=None):
+        """Return the commands ordered by the total time spent in them, slowest first
+        Parameters:
+            top(int): (optional) Maximum number of commands returned
+        Returns:
+            A list of dicts {"instrument", "command", "count", "errors", "total_time", "mean_time", "max_time",
+            "bytes_out", "bytes_in"}
+        """
+        rows = list()
+        for instrument, commands in self.get_stats().items():
+            for command, entry in commands.items():
+                rows.append({"instrument": instrument, "command": command, "count": entry["count"],
+                             "errors": entry["errors"], "total_time": entry["total_time"],
+                             "mean_time": entry["total_time"] / entry["count"], "max_time": entry["max_time"],
+                             "bytes_out": entry["bytes_out"], "bytes_in": entry["bytes_in"]})
+        rows.sort(key=lambda row: row["total_time"], reverse=True)
+        return rows if top is None else rows[:top]
+
+    def export_csv(self, path):
+        """Write the trace to a CSV file, one row per event"""
+        with self.lock:
+            trace = list(self.trace)
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=self.TRACE_FIELDS)
+            writer.writeheader()
+            for event in trace:
+                writer.writerow(event)
+
+    def export_json(self, path):
+        """Write the statistics and the trace to a JSON file"""
+        with self.lock:
+            trace = list(self.trace)
+        with open(path, "w") as json_file:
+            json.dump({"histogram_edges": HISTOGRAM_EDGES, "stats": self.get_stats(), "trace": trace},
+                      json_file, indent=2)
+
+
 #
 # This is a base class to be used by all of the specific instrument classes
 #
@@ -20,8 +198,92 @@ class InstrumentError(Exception):
 
 class Instrument:
     def __init__(self, resourcehost):
-        self.s = vxi11.Instrument(resourcehost)
+        self.resourcehost = resourcehost
+        self.s = self._connect()
         self._debug_flag=False
+        self.sync_mode = SYNC_OPC
+        self.sync_sleep = 0.2  # Fixed delay used in SYNC_SLEEP mode
+        self.opc_timeout = 10.0  # Maximum time to wait for operation complete
+        self.opc_poll_interval = 0.002  # First delay between status polls
+        self.opc_poll_max = 0.1  # Upper limit of the delay between status polls
+        self.opc_backoff = 2.0  # Multiplier applied to the delay after every poll
+        self.sleep_time = 0.0  # Total time spent sleeping while waiting for the instrument
+
+    def _connect(self):
+        """Open a connection to the instrument"""
+        # vxi11 is imported on first use so the application starts without loading it
+        import vxi11
+        return vxi11.Instrument(self.resourcehost)
+
+    def _call(self, method, *args):
+        """Call a method of the connection. If the connection was lost, reconnect and try once more
+        Parameters:
+            method(str): Name of the vxi11.Instrument method
+            args: Arguments passed to the method
+        Returns:
+            The value returned by the method
+        """
+        try:
+            return getattr(self.s, method)(*args)
+        except OSError:
+            self.reconnect()
+            return getattr(self.s, method)(*args)
+
+    def reconnect(self):
+        """Close the connection to the instrument and open a new one"""
+        try:
+            self.s.close()
+        except Exception:
+            pass  # The old connection is already unusable
+        self.s = self._connect()
+
+    def is_alive(self):
+        """Cheap liveness probe
+        Returns:
+            True if the instrument answers a status byte query, False otherwise
+        """
+        try:
+            self.s.ask("*STB?")
+        except Exception:
+            # Any failure, whether a socket or an RPC error, means the connection can't be used
+            return False
+        return True
+
+    def _instrumented(self, kind, message, function, *args):
+        """Call function and pass the event to the instrumentation hooks
+        Parameters:
+            kind(str): Name of the transaction, e.g. "write"
+            message(str or bytes): The message sent, or None if nothing was sent
+            function(callable): Performs the transaction
+            args: Arguments passed to function
+        Returns:
+            The value returned by function
+        """
+        if len(_hooks) == 0:
+            return function(*args)
+        timestamp = time.time()
+        start = time.perf_counter()
+        result = None
+        error = None
+        try:
+            result = function(*args)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            event = {"instrument": "{}@{}".format(self.__class__.__name__, self.resourcehost),
+                     "command": command_header(message) if message is not None else "",
+                     "kind": kind, "timestamp": timestamp, "elapsed": time.perf_counter() - start,
+                     "bytes_out": _payload_size(message), "bytes_in": _payload_size(result),
+                     "error": None if error is None else str(error)}
+            for hook in list(_hooks):
+                hook(event)
+
+    def _sleep(self, seconds):
+        """Sleep while waiting for the instrument, and account for the time spent"""
+        time.sleep(seconds)
+        self.sleep_time += seconds
 
     def debug(self, state):
         """Print debug messages to console"""
@@ -36,7 +298,7 @@ class Instrument:
         """Send a message to an instrument"""
         if self._debug_flag:
             self._debug_print(message, 'Writing:')
-        self.s.write(message)
+        self._instrumented("write", message, self._call, "write", message)
 
     def write(self, message):
         """Send a message to an instrument"""
@@ -46,17 +308,17 @@ class Instrument:
         """Send a binary message to an instrument"""
         if self._debug_flag:
             self._debug_print(message, 'Writing raw:')
-        self.s.write_raw(message)
+        self._instrumented("write_raw", message, self._call, "write_raw", message)
 
     def _read_raw(self, num=-1):
         """Read a binary response from an instrument"""
-        return self.s.read_raw(num)
+        return self._instrumented("read_raw", None, self.s.read_raw, num)
 
     def _ask(self, message):
         """Send a command and wait for a response"""
         if self._debug_flag:
             self._debug_print(message, 'Asking:')
-        res = self.s.ask(message)
+        res = self._instrumented("ask", message, self._call, "ask", message)
         if self._debug_flag:
             self._debug_print(res, 'Ask return:')
         return res
@@ -67,16 +329,82 @@ class Instrument:
 
     def _ask_read_raw(self, message, length=-1):
         """Send a command and wait for a binary response"""
-        self._write(message)
-        res = self.s.read_raw(length)
+        if self._debug_flag:
+            self._debug_print(message, 'Writing:')
+        res = self._instrumented("ask_read_raw", message, self._write_read_raw, message, length)
         if self._debug_flag:
             self._debug_print(res, 'Ask read raw return:')
         return res
 
+    def _write_read_raw(self, message, length):
+        """Send a command and read the binary response, reconnecting once if the connection was lost"""
+        try:
+            self.s.write(message)
+            return self.s.read_raw(length)
+        except OSError:
+            # The command and its response have to be repeated together
+            self.reconnect()
+            self.s.write(message)
+            return self.s.read_raw(length)
+
     def ask_read_raw(self, message, length=-1):
         """Send a command and wait for a binary response"""
         return self._ask_read_raw(message, length)
 
+    def _ask_read_block(self, message, chunk_size=BLOCK_CHUNK_SIZE):
+        """Send a command and read its IEEE 488.2 definite length block response (#<n><n length digits><data>).
+        The response is read in pieces into a buffer of the block's size, so a large block such as a screen dump
+        is not copied again after it is read.
+        Parameters:
+            message(str): The command
+            chunk_size(int): Size of the pieces the response is read in
+        Returns:
+            A bytearray holding the data of the block, without the header
+        """
+        if self._debug_flag:
+            self._debug_print(message, 'Writing:')
+        res = self._instrumented("ask_read_block", message, self._write_read_block, message, chunk_size)
+        if self._debug_flag:
+            self._debug_print("{} bytes".format(len(res)), 'Ask read block return:')
+        return res
+
+    def _write_read_block(self, message, chunk_size):
+        """Send a command and read the block response, reconnecting once if the connection was lost"""
+        try:
+            self.s.write(message)
+            return self._read_block(chunk_size)
+        except OSError:
+            # The command and its response have to be repeated together
+            self.reconnect()
+            self.s.write(message)
+            return self._read_block(chunk_size)
+
+    def _read_block(self, chunk_size):
+        """Read a definite length block response. See _ask_read_block()"""
+        first = memoryview(self.s.read_raw(chunk_size))
+        if bytes(first[0:1]) != b"#" or bytes(first[1:2]) in [b"", b"0"]:
+            raise InstrumentError("Invalid block header")
+        start = 2 + int(bytes(first[1:2]))
+        length = int(bytes(first[2:start]))
+        block = bytearray(length)
+        view = memoryview(block)
+        filled = min(length, len(first) - start)
+        view[0:filled] = first[start:start + filled]
+        if filled == length and len(first) == start + length and len(first) == chunk_size:
+            # The first piece stopped at the end of the block, before the terminator. Read it so it isn't left
+            # in the instrument's output queue
+            self.s.read_raw(-1)
+        while filled < length:
+            remaining = length - filled
+            # The last piece is read to the end of the response, so the terminator after the block is read too
+            data = self.s.read_raw(chunk_size if remaining > chunk_size else -1)
+            if len(data) == 0:
+                raise InstrumentError("Block response ended early")
+            count = min(len(data), remaining)
+            view[filled:filled + count] = memoryview(data)[0:count]
+            filled += count
+        return block
+
     def _console(self, ident):
         """Debugging aid: opens a console to send commands. See the commands in the user manual"""
         cmd = ''
@@ -90,19 +418,72 @@ class Instrument:
         else:
             print('Exiting the '+ident+' console')
 
+    def set_sync_mode(self, mode, timeout=None, poll_interval=None, poll_max=None, backoff=None):
+        """Select how wait() and reset() synchronize with the instrument
+        Parameters:
+            mode(str): SYNC_OPC to poll for operation complete, or SYNC_SLEEP for the legacy fixed delay
+            timeout(float): (optional) Maximum time in seconds to wait for operation complete
+            poll_interval(float): (optional) First delay in seconds between status polls
+            poll_max(float): (optional) Upper limit in seconds of the delay between status polls
+            backoff(float): (optional) Multiplier applied to the delay after every poll
+        Returns:
+            Nothing
+        """
+        if mode not in [SYNC_SLEEP, SYNC_OPC]:
+            raise InstrumentError("Invalid synchronization mode")
+        self.sync_mode = mode
+        if timeout is not None:
+            self.opc_timeout = timeout
+        if poll_interval is not None:
+            self.opc_poll_interval = poll_interval
+        if poll_max is not None:
+            self.opc_poll_max = poll_max
+        if backoff is not None:
+            self.opc_backoff = backoff
+
+    def wait_opc(self, timeout=None):
+        """Wait until all pending operations are complete
+        *OPC sets the operation complete bit in the event status register once every pending
+        operation has finished. The register is polled with an increasing delay between polls,
+        so fast commands return after a single poll and slow ones (e.g. sweeps) do not flood the bus.
+        Parameters:
+            timeout(float): (optional) Maximum time in seconds to wait. Defaults to opc_timeout
+        Returns:
+            Nothing
+        """
+        timeout = self.opc_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        interval = self.opc_poll_interval
+        self._write("*OPC")
+        while True:
+            # Reading the event status register also clears it
+            esr = int(self._ask("*ESR?"))
+            if esr & ESR_OPC:
+                return
+            if time.monotonic() >= deadline:
+                raise InstrumentError("Timed out waiting for operation complete")
+            self._sleep(interval)
+            interval = min(interval * self.opc_backoff, self.opc_poll_max)
+
     def reset(self):
         """resets the instrument, registers,buffers"""
         self._write("*RST")
-        time.sleep(0.2)
+        if self.sync_mode == SYNC_OPC:
+            self.wait_opc()
+        else:
+            self._sleep(self.sync_sleep)
 
     def wait(self):
         """waits for the previous command to complete"""
+        if self.sync_mode == SYNC_OPC:
+            self.wait_opc()
+            return
         self._write("*WAI")
-        time.sleep(0.2)
+        self._sleep(self.sync_sleep)
 
     def identify(self):
         """Return instrument identity information"""
-        return self.s.ask("*IDN?")
+        return self._ask("*IDN?")
 
     def close(self):
         """Close the connection to the instrument"""
@@ -121,21 +121,11 @@ class Mso5000(Instrument):
 
     def save_screendump(self, filename):
         """Save a screendump to a file. Screendump file is in .bmp format"""
-        f = open(filename, "wb")
-        res = self._ask_read_raw(':DISP:DATA?')
-        # Split the header and data into separate arrays
-        header = res[0:11]
-        data = res[11:]
-        # Get size from header
-        size = int(header[2:])
-        # Open the file to write the bitmap info into
-        f = open(filename, "wb")
+        # The size comes from the block header, the data is read straight into a buffer of that size
+        data = self._ask_read_block(':DISP:DATA?')
         # Write the bitmap info into the file
-        f.write(data)
-        # Set the file size to what was sent in the header
-        f.truncate(size)
-        # Close the file
-        f.close()
+        with open(filename, "wb") as f:
+            f.write(data)
 
     def console(self):
         self._console("RIGOL MSO5000")
@@ -1,6 +1,6 @@
 import time
 import math
-import struct
+import numpy as np
 from .instrument import Instrument, InstrumentError
 
 
@@ -24,6 +24,19 @@ class Sdg1032x(Instrument):
 
         self.rst()
 
+    def wait_settled(self, settle_time=0.0):
+        """Wait until the generator has applied every setting sent so far
+        Parameters:
+            settle_time(float): (optional) Extra time in seconds to allow the outputs to settle
+        Returns:
+            Nothing
+        """
+        # *OPC? is answered once all the pending commands have been executed
+        if self._ask("*OPC?").strip() != "1":
+            raise InstrumentError("AWG did not report operation complete")
+        if settle_time > 0:
+            self._sleep(settle_time)
+
     def console(self):
         """Enter debugging console"""
         self._console("Siglent SDG1032X")
@@ -133,7 +146,8 @@ class Sdg1032x(Instrument):
         """Send a waveform setup to the arbitrary waveform generator
         Pass in a dict with the following items
         NAME: Name of user waveform e.g. 'test' (mandatory)
-        WAVEDATA: List of signed short integers (mandatory)
+        WAVEDATA: Signed short integers: a list, a NumPy integer array, an array('h') or any other object
+                  supporting the buffer protocol. Raw bytes are taken as little endian shorts (mandatory)
         FREQ: frequency in hz (optional, default = 1000)
         TYPE: waveform type (optional, default = 5)"""
 
@@ -149,73 +163,72 @@ class Sdg1032x(Instrument):
         if 'FREQ' not in setup:
             setup['FREQ'] = 1000
 
-        #Convert wave data to bytearray
+        # View the wave data as an array. NumPy arrays and buffers are used in place, not copied
         wavedata = setup['WAVEDATA']
-        wdlen = len(wavedata)
-        block = bytearray(wdlen*2)
-        for i in range(wdlen):
-            struct.pack_into('<h', block, i*2, wavedata[i])
-
-        # assemble the block to send to the generator
-        length=int(len(setup['WAVEDATA'])*2)
-        #print(channel)
+        if isinstance(wavedata, (bytes, bytearray, memoryview)) and memoryview(wavedata).format in 'Bbc':
+            if memoryview(wavedata).nbytes % 2 != 0:
+                raise InstrumentError('Wave data must be a whole number of signed shorts')
+            samples = np.frombuffer(wavedata, dtype='<i2')
+        else:
+            samples = np.asarray(wavedata).reshape(-1)
+        if samples.size > 0 and samples.dtype != np.int16:
+            if not np.issubdtype(samples.dtype, np.integer):
+                raise InstrumentError('Wave data must be integers')
+            if samples.min() < -32768 or samples.max() > 32767:
+                raise InstrumentError('Wave data out of range for signed short integers')
+
+        # Assemble the block to send to the generator: the command header followed by the samples. The buffer is
+        # allocated once, and the samples are converted to little endian shorts straight into it
+        length = samples.size * 2
         wsstr = 'C{ch}:WVDT WVNM,{name},TYPE,{type},LENGTH,{length}B,FREQ,{freq},WAVEDATA,'.\
             format(ch=channel, name=setup['NAME'], type=setup['TYPE'], length=length, freq=setup['FREQ'])
-        bwsstr = bytearray(wsstr.encode('utf-8'))
-        block = bwsstr + block
-        #print(bwsstr)
+        header = wsstr.encode('utf-8')
+        block = bytearray(len(header) + length)
+        block[0:len(header)] = header
+        np.copyto(np.frombuffer(block, dtype='<i2', offset=len(header)), samples, casting='unsafe')
         # Send the command
         self._write_raw(block)
 
     def wave_get(self, memory_id='M2'):
-        """Retrieve a waveform setup from the arbitrary waveform generator"""
+        """Retrieve a waveform setup from the arbitrary waveform generator
+        Returns a dict with NAME, TYPE, LENGTH (in samples), FREQ and the other attributes reported, or an
+        empty dict if nothing was returned. WAVEDATA is a read only NumPy int16 array viewing the response
+        in place. Use WAVEDATA.copy() to modify it, or WAVEDATA.tolist() for a list of integers"""
         #Send the command
         wgstr = 'WVDT? '+ memory_id
         # Get the response
         res = self._ask_read_raw(wgstr)
-        #print(res)
+        return self.wave_parse(res)
+
+    @staticmethod
+    def wave_parse(res):
+        """Parse a WVDT? response into a waveform setup dict, see wave_get()"""
         # Find the binary data demarcation
-        binary_data_index = res.find(b'WAVEDATA')
-        # Extract the attributes and convert to utf-8
-        attributes = res[5:binary_data_index - 2].decode('utf-8')
-        # Strip all spaces
-        attributes = attributes.replace(' ','')
-        # Put the attributes in a list
+        binary_data_index = res.find(b'WAVEDATA,')
+        if binary_data_index < 0:
+            return dict()
+        # Extract the attributes, stripping all spaces, and put them in a dictionary
+        attributes = bytes(res[5:binary_data_index]).decode('utf-8').replace(' ', '').strip(',')
         alist = attributes.split(',')
-        # Convert the list to a dictionary
         adict = dict(zip(alist[::2], alist[1::2]))
-        # Separate the returned binary data
-        binary_data = res[binary_data_index + 9:]
-        # Get rid of the newline on the end of the returned data
-        binary_data = binary_data[:-1]
-        # Calculate the number of short ints to unpack
-        short_count = int(len(binary_data)/2)
-        # if something was returned, convert the return from bytes to short integers
-        if(len(adict)):
-            # Convert returned length to short integer length
-            if 'LENGTH' in adict:
-                adict['LENGTH'] = short_count
-            # Convert type from string to int
-            if 'TYPE' in adict:
-                adict['TYPE'] = int(adict['TYPE'])
-            if 'WVNM' in adict: # Rename WVNM to name, and delete POS
-                name = adict['WVNM']
-                adict.pop('POS', None)
-                adict.pop('WVNM', None)
-                adict['NAME']=name
-
-            wavedata = []
-            #Unpack the short integers
-            for i in range(short_count):
-                #Generate index
-                short_index = int(i*2)
-                # Retrive the short integer
-                word = binary_data[short_index:short_index+2]
-                # Append it to the short integer array
-                wavedata.append(struct.unpack('<h', word)[0])
-            #print(wavedata)
-            # Add the array of short integers to the return dictionary
-            adict['WAVEDATA'] = wavedata
+        if len(adict) == 0:
+            return adict
+        # The binary data runs from after the demarcation to the newline on the end
+        offset = binary_data_index + 9
+        short_count = (len(res) - 1 - offset) // 2
+        # Convert returned length to short integer length
+        if 'LENGTH' in adict:
+            adict['LENGTH'] = short_count
+        # Convert type from string to int
+        if 'TYPE' in adict:
+            adict['TYPE'] = int(adict['TYPE'])
+        if 'WVNM' in adict: # Rename WVNM to name, and delete POS
+            name = adict['WVNM']
+            adict.pop('POS', None)
+            adict.pop('WVNM', None)
+            adict['NAME'] = name
+        # View the short integers in place rather than unpacking them
+        adict['WAVEDATA'] = np.frombuffer(res, dtype='<i2', count=short_count, offset=offset)
         return adict
 
     def channel_combine(self, ena_dis=True, channel=1):
@@ -1,47 +1,113 @@
+import queue
+import socket
 import importlib
-import subprocess
+import threading
+import concurrent.futures
 import radiotest.error_handling.exceptions as rte
 
+# Instrument availability determined by discovery
+AVAIL_ONLINE = "online"
+AVAIL_OFFLINE = "offline"
+AVAIL_TIMEOUT = "timeout"
+
+# A VXI-11 connection starts at the portmapper. Reaching it shows the host is up before the slower RPC connect
+VXI11_PORTMAPPER_PORT = 111
+# Time in seconds an instrument has to accept a connection before it is reported offline
+CONNECT_TIMEOUT = 1.0
+
 
 class Loader:
+    """ Loads instrument drivers and keeps a pool of open instrument connections
+
+    Each instrument is connected to once. Later loads of the same instrument return the pooled
+    connection after a cheap liveness probe, and reconnect it if the probe fails. The tests reset the
+    instruments they use, so the pool does not.
+    """
     def __init__(self):
         self.instrument_table = {}
         self.info_cache = {}
+        self.availability = {}
+        # One lock per instrument, so an instrument being loaded by discovery isn't connected to twice
+        self.load_locks = {}
+        self.lock = threading.Lock()
+        self.connect_timeout = CONNECT_TIMEOUT
+        # Incremented by close_all(), so a load still running when the pool was closed isn't added back to it
+        self.generation = 0
 
-    def _ping(self, host):
-        """ Private ping function """
-        response = subprocess.call(["ping", "-c1", "-W1", host],
-                                   stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-        return True if response == 0 else False
+    def _check_reachable(self, info):
+        """ Make sure a vxi instrument's host accepts connections, so an offline host fails within
+        connect_timeout rather than however long the RPC connect takes to give up. Simulated instruments
+        have no host to reach."""
+        if info.get("simulated", False) is True:
+            return
+        try:
+            connection = socket.create_connection((info["hostname"], VXI11_PORTMAPPER_PORT),
+                                                  timeout=self.connect_timeout)
+        except OSError:
+            raise rte.LoaderError("Host {} is offline".format(info["hostname"]))
+        connection.close()
+
+    def _check_connection(self, info):
+        """ Make sure a pooled vxi instrument still answers, reconnecting it if necessary """
+        instance = info["instance"]
+        if instance.is_alive():
+            return
+        try:
+            self._check_reachable(info)
+        except rte.LoaderError:
+            with self.lock:
+                del self.info_cache[info["name"]]
+            raise
+        try:
+            instance.reconnect()
+        except OSError:
+            # Drop it from the pool, so the next load starts from scratch
+            with self.lock:
+                del self.info_cache[info["name"]]
+            raise rte.LoaderError("Could not reconnect to host: {}".format(info["hostname"]))
+        if instance.is_alive() is False:
+            with self.lock:
+                del self.info_cache[info["name"]]
+            raise rte.LoaderError("Host {} is not responding".format(info["hostname"]))
 
     def load(self, name):
+        """Load the driver for an instrument. Safe to call from any thread"""
+        with self.lock:
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            return self._load(name)
+
+    def _load(self, name):
         """Load the driver for an instrument"""
-        # If driver used previously return that info. If the interface is vxi, reset it.
+        # If driver used previously return that info. If the interface is vxi, check the connection is alive.
         info = None
         if name in self.info_cache.keys():
             info = self.info_cache[name]
             if info["interface"] == "vxi":
-                info["instance"].rst()
+                self._check_connection(info)
             return info
 
+        with self.lock:
+            generation = self.generation
+
         # Search the instrument table for the requested instrument
         if name in self.instrument_table.keys():
             info = self.instrument_table[name]
         if info is None:
             raise rte.LoaderError("Instrument {} not found in list of instruments".format(name))
 
-        # if the instrument interface  is vxi,  perform a test ping
-        if info["interface"] == "vxi" and self._ping(info["hostname"]) is False:
-            raise rte.LoaderError("Host {} is offline".format(info["hostname"]))
-
-        # Build the dot path to load the driver
-        dot_path = "radiotest.drivers.instruments"+"."+info["interface"]+"."+info["driver"]
+        # Build the dot path to load the driver. Simulated instruments have their drivers in the sim package.
+        package = "sim" if info.get("simulated", False) is True else info["interface"]
+        dot_path = "radiotest.drivers.instruments"+"."+package+"."+info["driver"]
         try:
             module_id = importlib.import_module(dot_path)
         except ImportError:
             raise rte.LoaderError("Driver {} could not be imported".format(info["driver"]))
         driver_class = getattr(module_id, info["class_name"])
 
+        if info["interface"] == "vxi":
+            self._check_reachable(info)
+
         # Instantiate the instrument
         instance = None
         try:
@@ -62,9 +128,108 @@ class Loader:
         info["instance"] = instance
         info["name"] = name
         # To avoid multiple loads of the same device, cache them
-        self.info_cache[name] = info
+        with self.lock:
+            closed = generation != self.generation
+            if closed is False:
+                self.info_cache[name] = info
+        if closed is True:
+            # The pool was closed while the instrument was being connected to
+            self._close_instance(info)
+            raise rte.LoaderError("Instrument {} was loaded after the loader was closed".format(name))
         return info
 
+    def _probe(self, name):
+        """ Load an instrument and check that it is usable
+        Returns:
+            A tuple (availability, message)
+        """
+        try:
+            info = self.load(name)
+            # The Aardvark driver loads without hardware, so look for an attached adapter
+            if info["interface"] == "unspecified" and info["driver"] == "aardvark":
+                info["instance"].get_available_devices()
+        except Exception as e:
+            # Loader and driver errors, and e.g. the wrong instrument at a host name
+            return AVAIL_OFFLINE, str(e)
+        return AVAIL_ONLINE, ""
+
+    def discover(self, names=None, timeout=3.0, max_workers=8):
+        """ Probe instruments concurrently and load the drivers of those which respond
+        Parameters:
+            names(list): (optional) Names of the instruments to probe. Defaults to all the instruments in the table
+            timeout(float): Time in seconds to wait for the instruments to respond
+            max_workers(int): Maximum number of instruments probed at the same time
+        Returns:
+            A dict mapping each instrument name to a dict {"status", "message"}. Status is one of
+            AVAIL_ONLINE, AVAIL_OFFLINE or AVAIL_TIMEOUT
+        """
+        names = list(self.instrument_table.keys()) if names is None else names
+        if len(names) == 0:
+            return {}
+        futures = {concurrent.futures.Future(): name for name in names}
+        work = queue.Queue()
+        for future in futures.keys():
+            work.put(future)
+
+        def prober():
+            while True:
+                try:
+                    future = work.get_nowait()
+                except queue.Empty:
+                    return
+                future.set_result(self._probe(futures[future]))
+
+        # The probes run on daemon threads, so a host which never answers can't hold up the application's exit
+        for i in range(min(max_workers, len(names))):
+            threading.Thread(target=prober, name="radiotest-discover-{}".format(i), daemon=True).start()
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        # Don't wait for hosts which haven't answered. If they do answer later, they are still added to the pool,
+        # unless it has been closed in the meantime.
+        results = dict()
+        for future, name in futures.items():
+            if future in done:
+                status, message = future.result()
+            else:
+                status, message = AVAIL_TIMEOUT, "No response within {} s".format(timeout)
+            results[name] = {"status": status, "message": message}
+        with self.lock:
+            self.availability.update(results)
+        return results
+
+    def get_availability(self, name):
+        """ Return the availability of an instrument found by discovery, or None if it was not probed"""
+        with self.lock:
+            if name in self.availability:
+                return self.availability[name]["status"]
+        return None
+
+    def close(self, name):
+        """ Close the connection to an instrument and remove it from the pool"""
+        with self.lock:
+            if name not in self.info_cache.keys():
+                return
+            info = self.info_cache.pop(name)
+        self._close_instance(info)
+
+    def _close_instance(self, info):
+        """ Close the connection of a loaded instrument"""
+        try:
+            if info["interface"] == "vxi":
+                info["instance"].close()
+            elif info["interface"] == "unspecified" and info["driver"] == "aardvark":
+                info["instance"].close_all()
+        except Exception:
+            pass  # Closing is best effort. The instrument may already be gone.
+
+    def close_all(self):
+        """ Close every pooled instrument connection. Called on shutdown. Instruments still being loaded, e.g. by
+        discovery, are closed when their load completes rather than added to the pool"""
+        with self.lock:
+            self.generation += 1
+            names = list(self.info_cache.keys())
+        for name in names:
+            self.close(name)
+
     def add_instrument(self, name, instrument):
         """ Add an instrument to the instrument table"""
         self.instrument_table[name] = instrument
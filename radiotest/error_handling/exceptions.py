@@ -11,4 +11,12 @@ class DriverError(Exception):
         self.value = value
 
     def __str__(self):
-        return repr(self.value)
\ No newline at end of file
+        return repr(self.value)
+
+
+class TestCancelledError(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
@@ -1,13 +1,18 @@
 import tkinter as tk
 import tkinter.ttk as ttk
+import base64
 import io
-import csv
+import importlib
 import pathlib
-from PIL import Image, ImageTk
+import sqlite3
+import threading
 from tkinter.messagebox import showerror, askyesno
 from tkinter.filedialog import asksaveasfile
 import radiotest.config.config as config
 import radiotest.drivers.loader as loader
+import radiotest.error_handling.exceptions as rte
+import radiotest.tests.report as report
+from radiotest.tests.executor import TestExecutor
 
 
 class GuiCommon(ttk.Frame):
@@ -16,6 +21,10 @@ class GuiCommon(ttk.Frame):
         self.image_top = None
         self.image_top_label = None
         self.python_photo_image = None
+        self.executor = None
+        self.cancel_b = None
+        self.status_label = None
+        self.instr_infos = list()
 
 
         ttk.Frame.__init__(self, parent, **kwargs)
@@ -163,6 +172,8 @@ class GuiCommon(ttk.Frame):
         instr_info["instr_selected"] = "None"
         instr_info["instr_names"] = instr_names
         instr_info["radiobuttons"] = radio_buttons
+        self.instr_infos.append(instr_info)
+        self.show_availability()
 
         # Create the make, model, serial number, and firmware fields
         row += 1
@@ -237,7 +248,7 @@ class GuiCommon(ttk.Frame):
                 if busy_callback is not None:
                     busy_callback(False)
 
-            except loader.LoaderError as e:
+            except rte.LoaderError as e:
                 if busy_callback is not None:
                     busy_callback(False)
                 self.reset_instrument_select(instr_info, test_button_enable_callback, rb_int_var)
@@ -246,6 +257,15 @@ class GuiCommon(ttk.Frame):
         else:
             self.reset_instrument_select(instr_info, test_button_enable_callback, rb_int_var)
 
+    def show_availability(self):
+        """ Grey out the instruments which discovery found to be unavailable.
+        They can still be selected, which retries the connection."""
+        for instr_info in self.instr_infos:
+            for instr_name, radio_button in instr_info["radiobuttons"].items():
+                availability = config.Loader_obj.get_availability(instr_name)
+                if availability is not None and availability != loader.AVAIL_ONLINE:
+                    radio_button.config(fg="grey")
+
     def reset_instrument_select(self, instr_info, test_button_enable_callback, rb_int_var):
         """ Called when it is necessary to reset the selected instruments in a tab
         Parameters:
@@ -362,6 +382,10 @@ class GuiCommon(ttk.Frame):
         res = int(map[index])
         return res
 
+    def parse_number_list(self, text):
+        """ Convert a comma separated list of numbers into a list of floats. Raises ValueError if it is invalid"""
+        return [float(item) for item in text.split(",") if item.strip() != ""]
+
     def save_results_to_csv(self, the_file, processed_data):
         """
         Save the test results to a .csv file
@@ -370,59 +394,28 @@ class GuiCommon(ttk.Frame):
         :return:
         Nothing
         """
-        def write_row(csv_writer, section, info):
-            """
+        report.write_results_csv(the_file, processed_data)
 
-            :param csv_writer: Writer object
-            :param section: Section name
-            :param info: Information to write
-            :return:
-            Nothing
-            """
-            fields = list()
-            for key, value in info.items():
-                fields.append(key)
-                fields.append(str(value))
-            row = [section] + fields
-            csv_writer.writerow(row)
-
-        def write_row_results(csv_writer, section, results):
-            """
-            Write multiple rows for each test result
-            :param csv_writer:  Writer object
-            :param section:  Section name
-            :param results:  Results information
-            :return:
+    def save_results_to_npz(self, the_file, processed_data):
+        """ Save the test results to a columnar .npz file, see results/columnar.py
+        Parameters:
+            the_file(str): The path and file to save the results to
+            processed_data(dict): The test results
+        Returns:
             Nothing
-            """
-            description = list(results.keys())[0]
-
-            results_info = results[description]
-            for res in results_info:
-                fields = list()
-                fields.append(section)
-                fields.append(description)
-                for key, value in res.items():
-                    fields.append(key)
-                    fields.append(str(value))
-                csv_writer.writerow(fields)
-
-        # Create the file
-        with open(the_file, "w", newline='') as csv_file:
-            writer = csv.writer(csv_file, delimiter=",")
-
-            # Write test metrics
-            for metric in processed_data["test_metrics"]:
-                write_row(writer, "Test Metrics", metric)
-            # Write the test equipment
-            for instrument in processed_data["test_equipment"]:
-                write_row(writer, "Test Equipment", instrument)
-            # Test parameters
-            for parameter in processed_data["test_parameters"]:
-                write_row(writer, "Test Parameters", parameter)
-            # Test results
-            for result in processed_data["results"]:
-                write_row_results(writer, "Test Results", result)
+        """
+        # Imported here, so numpy is not loaded before the window is showing
+        columnar = importlib.import_module("radiotest.results.columnar")
+        columnar.write_npz(the_file, processed_data)
+
+    def store_results(self, processed_data):
+        """ Write the test results to the results database, if there is one"""
+        if config.Store_obj is None:
+            return
+        try:
+            config.Store_obj.add_run(processed_data)
+        except sqlite3.Error as e:
+            self.show_error(title="Results Database Error", message="Could not save the results: {}".format(e))
 
     def show_error(self, title=None, message=None):
         """ Display an error popup. This gets called by the test code
@@ -435,9 +428,64 @@ class GuiCommon(ttk.Frame):
 
         if title is None or message is None:
             return
+        # Tests run on a worker thread. Tk may only be used from the main thread, so hand the popup over to it.
+        if threading.current_thread() is not threading.main_thread() and self.executor is not None:
+            self.executor.post_error(title, message)
+            return
         tk.messagebox.showerror(title=title, message=message)
         return
 
+    def run_controls_create(self, row):
+        """ Create the cancel button and the test status label next to the run test button
+        Parameters:
+            row(int): The row the run test button is on
+        Returns:
+            Nothing
+        """
+        self.executor = TestExecutor(self)
+        self.cancel_b = tk.Button(self, text="Cancel Test", command=self.cancel_test, state=tk.DISABLED)
+        self.cancel_b.grid(row=row, column=1)
+        self.status_label = ttk.Label(self, width=60, anchor=tk.W, text="Idle")
+        self.status_label.grid(row=row, column=2, columnspan=6, sticky=tk.W)
+
+    def start_test(self, test_setup, results_title=None):
+        """ Run the registered test function on the worker thread
+        Parameters:
+            test_setup(dict): The test setup to pass to the test's run function
+            results_title(str): Title of the results window. If None, no results window is shown
+        Returns:
+            Nothing
+        """
+        if self.test_function is None or self.executor.is_running():
+            return
+        test_b_state = self.test_b["state"]
+
+        def progress(message):
+            self.status_label.config(text=message)
+
+        def done(status, processed_data):
+            self.test_b["state"] = test_b_state
+            self.cancel_b["state"] = tk.DISABLED
+            status_text = {"done": "Test complete", "cancelled": "Test cancelled", "failed": "Test failed"}
+            self.status_label.config(text=status_text[status])
+            if processed_data is None:
+                return
+            self.store_results(processed_data)
+            if results_title is None:
+                return
+            self.show_results(processed_data, results_title)
+
+        self.test_b["state"] = tk.DISABLED
+        self.cancel_b["state"] = tk.NORMAL
+        self.status_label.config(text="Running")
+        self.executor.start(self.test_function, test_setup, done, progress, self.show_error)
+
+    def cancel_test(self):
+        """ Called when the user presses the cancel test button"""
+        if self.executor is not None and self.executor.is_running():
+            self.status_label.config(text="Cancelling...")
+            self.executor.cancel()
+
     def test_parameter_search(self, key, test_parameters):
         """
 
@@ -641,9 +689,11 @@ class GuiCommon(ttk.Frame):
 
 
         # Save to CSV callback
-        def save_to_csv():
+        def save_to_file(extension, save_function):
             """
-            Saves the test data to acsv file
+            Saves the test data to a file
+            :param extension: The default file extension, e.g. ".csv"
+            :param save_function: Called with the file path and the test data to write the file
             :return:
             Nothing
             """
@@ -676,12 +726,13 @@ class GuiCommon(ttk.Frame):
                                  title="Save Test Results",
                                  initialdir=directory,
                                  initialfile=file,
-                                 defaultextension=".csv")
+                                 defaultextension=extension)
 
             #
-            # Save to CSV file
+            # Save to the file, unless the user cancelled
             #
-            self.save_results_to_csv(filepath, processed_data)
+            if filepath:
+                save_function(filepath, processed_data)
 
         def present_image(image_data):
             """
@@ -717,19 +768,27 @@ class GuiCommon(ttk.Frame):
                                                            title="Save Test Results",
                                                            initialdir=directory,
                                                            initialfile=file,
-                                                           defaultextension=".bmp")
+                                                           defaultextension="." + image_data.get("format", "bmp"))
 
                 #
                 # Save the image to a file
                 #
-                with open(filepath, "wb") as image_file:
-                    image_file.write(dump["data"])
-
+                if filepath:
+                    with open(filepath, "wb") as image_file:
+                        image_file.write(image_data["data"])
 
-            pil_image = Image.open(io.BytesIO(dump["data"]))
             self.image_top = tk.Toplevel(config.Root_obj)
-            self.image_top.title(dump["name"])
-            self.python_photo_image = ImageTk.PhotoImage(pil_image)
+            self.image_top.title(image_data["name"])
+            if image_data.get("format") == "png":
+                # Tk shows PNG images itself
+                self.python_photo_image = tk.PhotoImage(master=self.image_top,
+                                                        data=base64.b64encode(image_data["data"]))
+            else:
+                # PIL is only needed to show BMP screen dumps, so it is imported on first use to speed up startup
+                from PIL import Image, ImageTk
+
+                pil_image = Image.open(io.BytesIO(image_data["data"]))
+                self.python_photo_image = ImageTk.PhotoImage(pil_image)
             self.image_top_label = tk.Label(self.image_top, image=self.python_photo_image)
             self.image_top_label.grid(columnspan=3, column=0, row=0)
             tk.Button(self.image_top, command=pressed, text="Save Image").grid(column=0, row=1)
@@ -759,6 +818,11 @@ class GuiCommon(ttk.Frame):
         for result in processed_data["results"]:
             row = show_results_info(row, result)
 
+        # Show a summary of the sweeps made
+
+        if "measurements" in processed_data:
+            row = show_results_info(row, {"Measurements": [m.summary() for m in processed_data["measurements"]]})
+
         # Show results separator
 
         row += 1
@@ -774,15 +838,23 @@ class GuiCommon(ttk.Frame):
         # Show Save Data to csv button
         row += 1
         column = 0
-        save_data_b = tk.Button(self.results_top, text="Save Data to .csv", command=save_to_csv)
+        save_data_b = tk.Button(self.results_top, text="Save Data to .csv",
+                                command=lambda: save_to_file(".csv", self.save_results_to_csv))
         save_data_b.grid(row=row, column=column, sticky="NSEW")
 
+        # Show Save Data to npz button. The columnar file keeps the numbers and the raw peaks and traces
+        column += 1
+        save_npz_b = tk.Button(self.results_top, text="Save Data to .npz",
+                               command=lambda: save_to_file(".npz", self.save_results_to_npz))
+        save_npz_b.grid(row=row, column=column, sticky="NSEW")
+
         # Show Screen dump buttons if screen dumps were taken
         column += 1
         for dump in processed_data["screen_dumps"]:
 
-            button = tk.Button(self.results_top,text=dump["name"], command=lambda: present_image(dump))
+            button = tk.Button(self.results_top,text=dump["name"], command=lambda dump=dump: present_image(dump))
             button.grid(row=row, column=column, sticky="NSEW")
+            column += 1
 
         # Present window
 
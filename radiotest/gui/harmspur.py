@@ -118,6 +118,38 @@ class Tab_Harm_Spur(gc.GuiCommon):
                                               offvalue=0, height=2, width=30)
         self.harm_ss_inst.grid(row=row, column=1, sticky=tk.W)
 
+        # Single sweep harmonics
+        self.cb_single_sweep_intvar = tk.IntVar(self, config.Harm_spurs_defaults["single_sweep"],
+                                                "harmspur_single_sweep_intvar")
+        row += 1
+        self.single_sweep_inst = tk.Checkbutton(self, text="Measure harmonics in one wide sweep",
+                                                onvalue=1,
+                                                variable=self.cb_single_sweep_intvar,
+                                                offvalue=0, height=2, width=30)
+        self.single_sweep_inst.grid(row=row, column=1, sticky=tk.W)
+
+        # Multi-band batch
+        self.cb_batch_intvar = tk.IntVar(self, config.Harm_spurs_defaults["batch"], "harmspur_batch_intvar")
+        row += 1
+        self.batch_inst = tk.Checkbutton(self, text="Multi-band batch",
+                                         onvalue=1,
+                                         variable=self.cb_batch_intvar,
+                                         offvalue=0, height=2, width=30)
+        self.batch_inst.grid(row=row, column=1, sticky=tk.W)
+
+        self.batch_fundamentals_stringvar = tk.StringVar(self, config.Harm_spurs_defaults["batch_fundamentals"],
+                                                         "harmspur_batch_fundamentals_stringvar")
+        row += 1
+        self.label_entry(row, 0, "Batch Fundamentals:", 30, self.batch_fundamentals_stringvar, self.string_reg,
+                         "MHz")
+
+        # One level per band. Left empty, the AWG tone level is used for every band
+        self.batch_tone_levels_stringvar = tk.StringVar(self, config.Harm_spurs_defaults["batch_tone_levels"],
+                                                        "harmspur_batch_tone_levels_stringvar")
+        row += 1
+        self.label_entry(row, 0, "Batch AWG Tone Levels:", 30, self.batch_tone_levels_stringvar, self.string_reg,
+                         "dBm")
+
 
         # Test separator
         row += 1
@@ -128,6 +160,7 @@ class Tab_Harm_Spur(gc.GuiCommon):
         row += 1
         self.test_b = tk.Button(self, text="Run Test", command=self.run_test, state=tk.DISABLED )
         self.test_b.grid(row=row, column=0)
+        self.run_controls_create(row)
 
     def register_test_function(self, test_function):
         self.test_function = test_function
@@ -163,12 +196,22 @@ class Tab_Harm_Spur(gc.GuiCommon):
         parameters["display_line"] = self.sa_display_line_intvar.get()
         parameters["fundamental"] = self.sa_fundamental_doublevar.get()
         parameters["harm_screenshot"] = True if self.cb_harm_ss_intvar.get() == 1 else False
+        parameters["single_sweep"] = True if self.cb_single_sweep_intvar.get() == 1 else False
+        if self.cb_batch_intvar.get() == 1:
+            try:
+                parameters["fundamentals"] = self.parse_number_list(self.batch_fundamentals_stringvar.get())
+                tone_levels = self.parse_number_list(self.batch_tone_levels_stringvar.get())
+            except ValueError:
+                self.show_error("Entry Error", "Batch fundamentals and tone levels must be comma separated numbers")
+                return
+            if len(parameters["fundamentals"]) == 0:
+                self.show_error("Entry Error", "No batch fundamentals specified")
+                return
+            if parameters["use_awg"] is True and len(tone_levels) > 0:
+                parameters["tone_levels"] = tone_levels
         test_setup["parameters"] = parameters
         test_setup["gui_inst"] = self
-        processed_data = self.test_function(test_setup)
-        if processed_data is None:
-            return
-        self.show_results(processed_data, "Harmonics Test Results")
+        self.start_test(test_setup, "Harmonics Test Results")
 
     def act_on_awg_checkbutton(self):
         """ Enable or disable the AWG instrument select radio buttons"""
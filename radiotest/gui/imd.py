@@ -114,6 +114,34 @@ class Tab_IMD(gc.GuiCommon):
                                           offvalue=0, height=2, width=30)
         self.imd_ss_inst.grid(row=row, column=1, sticky=tk.W)
 
+        # Trace peak detection
+        self.cb_trace_peaks_intvar = tk.IntVar(self, config.IMD_defaults["trace_peaks"], "imd_trace_peaks_intvar")
+        row += 1
+        self.trace_peaks_inst = tk.Checkbutton(self, text="Find peaks in trace data",
+                                               onvalue=1,
+                                               variable=self.cb_trace_peaks_intvar,
+                                               offvalue=0, height=2, width=30)
+        self.trace_peaks_inst.grid(row=row, column=1, sticky=tk.W)
+
+        # Sweep over tone spacings and levels
+        self.cb_sweep_intvar = tk.IntVar(self, config.IMD_defaults["sweep"], "imd_sweep_intvar")
+        row += 1
+        self.sweep_inst = tk.Checkbutton(self, text="Sweep tone spacings and levels",
+                                         onvalue=1,
+                                         variable=self.cb_sweep_intvar,
+                                         offvalue=0, height=2, width=30)
+        self.sweep_inst.grid(row=row, column=1, sticky=tk.W)
+
+        self.sweep_levels_stringvar = tk.StringVar(self, config.IMD_defaults["sweep_levels"],
+                                                   "imd_sweep_levels_stringvar")
+        row += 1
+        self.label_entry(row, 0, "Sweep Tone Levels:", 30, self.sweep_levels_stringvar, self.string_reg, "dBm")
+
+        self.sweep_spacings_stringvar = tk.StringVar(self, config.IMD_defaults["sweep_spacings"],
+                                                     "imd_sweep_spacings_stringvar")
+        row += 1
+        self.label_entry(row, 0, "Sweep Tone Spacings:", 30, self.sweep_spacings_stringvar, self.string_reg, "kHz")
+
         # Test separator
         row += 1
         self.test_sep = ttk.Separator(self, orient=tk.HORIZONTAL)
@@ -123,6 +151,7 @@ class Tab_IMD(gc.GuiCommon):
         row += 1
         self.test_b = tk.Button(self, text="Run Test", command=self.run_test, state=tk.DISABLED)
         self.test_b.grid(row=row, column=0)
+        self.run_controls_create(row)
 
     def register_test_function(self, test_function):
         self.test_function = test_function
@@ -159,13 +188,22 @@ class Tab_IMD(gc.GuiCommon):
         parameters["f1"] = self.awg_f1_doublevar.get()
         parameters["f2"] = self.awg_f2_doublevar.get()
         parameters["imd_screenshot"] = True if self.cb_imd_screenshot_intvar.get() == 1 else False
+        parameters["trace_peaks"] = True if self.cb_trace_peaks_intvar.get() == 1 else False
+        parameters["sweep"] = True if self.cb_sweep_intvar.get() == 1 else False
+        if parameters["sweep"] is True:
+            try:
+                parameters["sweep_levels"] = self.parse_number_list(self.sweep_levels_stringvar.get())
+                parameters["sweep_spacings"] = self.parse_number_list(self.sweep_spacings_stringvar.get())
+            except ValueError:
+                self.show_error("Entry Error", "Sweep tone levels and spacings must be comma separated numbers")
+                return
+            if any(spacing <= 0 for spacing in parameters["sweep_spacings"]):
+                self.show_error("Entry Error", "Sweep tone spacings must be greater than zero")
+                return
         test_setup["parameters"] = parameters
         test_setup["gui_inst"] = self
 
-        processed_data = self.test_function(test_setup)
-        if processed_data is None:
-            return
-        self.show_results(processed_data, "IMD Test Results")
+        self.start_test(test_setup, "IMD Test Results")
 
 
     def sa_clicked_callback(self):
@@ -0,0 +1,93 @@
+import tkinter as tk
+import tkinter.ttk as ttk
+import tkinter.filedialog
+import radiotest.config.config as config
+import radiotest.drivers.instruments.vxi.instrument as instrument
+
+
+class InstrumentStats(tk.Toplevel):
+    """ Window showing the time spent in each SCPI command, as recorded by the instrumentation recorder.
+    Recording is started and stopped from here. The table is refreshed while the window is open."""
+
+    COLUMNS = [("instrument", "Instrument", 200), ("command", "Command", 180), ("count", "Count", 70),
+               ("errors", "Errors", 60), ("total_time", "Total (ms)", 90), ("mean_time", "Mean (ms)", 90),
+               ("max_time", "Max (ms)", 90), ("bytes_out", "Bytes Out", 90), ("bytes_in", "Bytes In", 90)]
+
+    REFRESH_INTERVAL = 1000  # ms
+
+    def __init__(self, parent, *args, **kwargs):
+        tk.Toplevel.__init__(self, parent, *args, **kwargs)
+        self.title("Instrument Statistics")
+        if config.Recorder_obj is None:
+            config.Recorder_obj = instrument.Recorder()
+        self.recorder = config.Recorder_obj
+        self.refresh_id = None
+
+        controls = ttk.Frame(self)
+        controls.pack(side="top", fill="x")
+        self.record_b = tk.Button(controls, command=self.toggle_recording)
+        self.record_b.pack(side="left", padx=2, pady=2)
+        tk.Button(controls, text="Reset", command=self.reset).pack(side="left", padx=2, pady=2)
+        tk.Button(controls, text="Export CSV", command=self.export_csv).pack(side="left", padx=2, pady=2)
+        tk.Button(controls, text="Export JSON", command=self.export_json).pack(side="left", padx=2, pady=2)
+
+        self.table = ttk.Treeview(self, columns=[column[0] for column in self.COLUMNS], show="headings", height=25)
+        for name, heading, width in self.COLUMNS:
+            self.table.heading(name, text=heading)
+            self.table.column(name, width=width, anchor=tk.W if name in ["instrument", "command"] else tk.E)
+        self.table.pack(side="top", fill="both", expand=True)
+
+        self.show_record_state()
+        self.refresh()
+
+    def show_record_state(self):
+        """ Update the record button text to match the recorder"""
+        self.record_b.config(text="Stop Recording" if self.recorder.is_recording() else "Start Recording")
+
+    def toggle_recording(self):
+        """ Called when the user presses the record button"""
+        if self.recorder.is_recording():
+            self.recorder.stop()
+        else:
+            self.recorder.start()
+        self.show_record_state()
+
+    def reset(self):
+        """ Called when the user presses the reset button"""
+        self.recorder.reset()
+        self.refresh(reschedule=False)
+
+    def refresh(self, reschedule=True):
+        """ Fill the table with the commands, slowest first"""
+        self.table.delete(*self.table.get_children())
+        for row in self.recorder.summary():
+            values = list()
+            for name, heading, width in self.COLUMNS:
+                value = row[name]
+                if name.endswith("_time"):
+                    value = "{:.2f}".format(value * 1E3)
+                values.append(value)
+            self.table.insert("", tk.END, values=values)
+        if reschedule:
+            self.refresh_id = self.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def destroy(self):
+        """ Stop the refreshes before the window goes, so none runs against the destroyed table"""
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        tk.Toplevel.destroy(self)
+
+    def export_csv(self):
+        """ Called when the user presses the export CSV button"""
+        filepath = tk.filedialog.asksaveasfilename(parent=self, title="Export Instrument Trace",
+                                                   initialfile="instrument_trace", defaultextension=".csv")
+        if filepath:
+            self.recorder.export_csv(filepath)
+
+    def export_json(self):
+        """ Called when the user presses the export JSON button"""
+        filepath = tk.filedialog.asksaveasfilename(parent=self, title="Export Instrument Statistics",
+                                                   initialfile="instrument_stats", defaultextension=".json")
+        if filepath:
+            self.recorder.export_json(filepath)
@@ -3,6 +3,7 @@ import tkinter.ttk as ttk
 import radiotest.gui.harmspur as harmspur
 import radiotest.gui.imd as imd
 import radiotest.gui.trxlo as trxlo
+import radiotest.gui.instrstats as instrstats
 
 
 
@@ -14,8 +15,15 @@ class Menubar(tk.Frame):
         self.file_menu = tk.Menu(self.menu_top, tearoff=0)
         self.file_menu.add_command(label="Quit", command=parent.quit)
         self.menu_top.add_cascade(label="File", menu=self.file_menu)
+        self.tools_menu = tk.Menu(self.menu_top, tearoff=0)
+        self.tools_menu.add_command(label="Instrument Statistics", command=self.show_instrument_stats)
+        self.menu_top.add_cascade(label="Tools", menu=self.tools_menu)
         self.parent.parent.config(menu=self.menu_top)
 
+    def show_instrument_stats(self):
+        """Open the instrument statistics window"""
+        instrstats.InstrumentStats(self.parent.parent)
+
 
 class Tabs(tk.Frame):
     def __init__(self, parent, *args, **kwargs):
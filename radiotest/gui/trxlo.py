@@ -150,6 +150,7 @@ class Tab_TRX_LO(gc.GuiCommon):
         row += 1
         self.test_b = tk.Button(self, text="Run Test", command=self.run_test, state=tk.DISABLED)
         self.test_b.grid(row=row, column=0)
+        self.run_controls_create(row)
 
     def act_on_aardvark_checkbutton(self):
         """Called when checkbutton is checked or unchecked"""
@@ -204,16 +205,9 @@ class Tab_TRX_LO(gc.GuiCommon):
         parameters["tune"] = True if self.trxlo_tune_intvar.get() == 1 else False
         test_setup["parameters"] = parameters
         test_setup["gui_inst"] = self
-        self.test_function(test_setup)
+        self.start_test(test_setup)
 
 
-    def show_error(self, title=None, message=None):
-        """ Display an error popup. This gets called by the test code"""
-        if title is None or message is None:
-            return
-        tk.messagebox.showerror(title=title, message=message)
-        return
-
     def test_button_enable(self, state):
         """ Called to enable or disable the test button"""
         ena_dis = tk.NORMAL if state is True else tk.DISABLED
@@ -0,0 +1,217 @@
+import pathlib
+import numpy as np
+
+# pyarrow is optional. Without it the results can still be exported as NPZ
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+#
+# Columnar export of test results
+#
+# The results of a run are converted into tables of typed NumPy columns, one table each for the parameters,
+# metrics, equipment, measurements, peaks and traces, and one per results table. Numbers stay numbers and missing
+# values are NaN, so the files load straight into NumPy or pandas without parsing:
+#
+#   tables = read_npz("1234.npz")
+#   tables["results/Harmonics"]["Power"]  # float64 array of the harmonic levels
+#
+# Every row carries the test ID, so the tables of many runs can be concatenated, see load_npz().
+# The peaks and trace points of all the measurements are held in flat arrays, with a "measurement" column giving
+# the index of the measurement in the measurements table each belongs to.
+#
+
+FORMAT_NPZ = "npz"
+FORMAT_PARQUET = "parquet"
+
+
+def have_arrow():
+    """ Return True if pyarrow is installed, so Parquet files can be written"""
+    return pyarrow is not None
+
+
+def _column(values):
+    """ Convert a list of results table values into a NumPy array. Columns of numbers, including numbers held as
+    strings such as "-45.00", become float64 with NaN for the missing values ("-" or None). Any other column
+    becomes a unicode string array."""
+    numbers = list()
+    for value in values:
+        if value is None or value == "-":
+            numbers.append(np.nan)
+            continue
+        try:
+            numbers.append(float(value))
+        except (TypeError, ValueError):
+            return np.array(["" if value is None else str(value) for value in values])
+    return np.array(numbers, dtype=np.float64)
+
+
+def _name_value_table(rows, test_id):
+    """ Convert test parameters or metrics, a list of {name: value, "Unit": unit} dicts, into a table"""
+    names = [list(row.keys())[0] for row in rows]
+    values = [list(row.values())[0] for row in rows]
+    return {"test_id": np.array([test_id] * len(rows), dtype=np.str_), "name": np.array(names, dtype=np.str_),
+            "value": np.array([str(value) for value in values], dtype=np.str_),
+            "number": _column([value if isinstance(value, (int, float)) else None for value in values]),
+            "unit": np.array([row.get("Unit", "") for row in rows], dtype=np.str_)}
+
+
+def _rows_table(rows, test_id, numeric=True):
+    """ Convert a list of row dicts into a table. Rows may have different keys, missing values are empty.
+    If numeric is False every column is kept as strings"""
+    keys = list()
+    for row in rows:
+        for key in row.keys():
+            if key not in keys:
+                keys.append(key)
+    table = {"test_id": np.array([test_id] * len(rows), dtype=np.str_)}
+    for key in keys:
+        values = [row.get(key) for row in rows]
+        table[key] = _column(values) if numeric is True else \
+            np.array(["" if value is None else str(value) for value in values], dtype=np.str_)
+    return table
+
+
+def results_to_tables(processed_data):
+    """ Convert the results of a run into columnar tables
+    Parameters:
+        processed_data(dict): The results returned by the test
+    Returns:
+        A dict of table names, each a dict of column names and NumPy arrays of equal length. The tables are
+        "parameters", "metrics", "equipment", "measurements", "peaks", "traces", and "results/<title>" for
+        each results table
+    """
+    test_id = ""
+    for parameter in processed_data["test_parameters"]:
+        if "Test ID" in parameter:
+            test_id = str(parameter["Test ID"])
+    tables = {"parameters": _name_value_table(processed_data["test_parameters"], test_id),
+              "metrics": _name_value_table(processed_data["test_metrics"], test_id),
+              "equipment": _rows_table(processed_data["test_equipment"], test_id, numeric=False)}
+
+    measurements = processed_data.get("measurements", list())
+    count = len(measurements)
+    tables["measurements"] = {
+        "test_id": np.array([test_id] * count, dtype=np.str_),
+        "center_freq": np.array([m.center_freq for m in measurements], dtype=np.float64),
+        "span": np.array([m.span for m in measurements], dtype=np.float64),
+        "rbw": np.array([m.rbw for m in measurements], dtype=np.int64),
+        "vbw": np.array([m.vbw for m in measurements], dtype=np.int64),
+        "ref_offset": np.array([m.ref_offset for m in measurements], dtype=np.float64),
+        "display_line": np.array([m.display_line for m in measurements], dtype=np.float64),
+        "source": np.array([m.source for m in measurements], dtype=np.str_),
+        "timestamp": np.array([m.timestamp for m in measurements], dtype="datetime64[us]")}
+    # The peaks and traces of all the measurements, one after the other
+    for name, get_freqs, get_amplitudes in [("peaks", lambda m: m.freqs, lambda m: m.amplitudes),
+                                            ("traces", lambda m: m.trace_freqs, lambda m: m.trace_amplitudes)]:
+        freqs = [np.empty(0) if get_freqs(m) is None else get_freqs(m) for m in measurements]
+        amplitudes = [np.empty(0) if get_amplitudes(m) is None else get_amplitudes(m) for m in measurements]
+        lengths = [len(item) for item in freqs]
+        tables[name] = {"test_id": np.array([test_id] * sum(lengths), dtype=np.str_),
+                        "measurement": np.repeat(np.arange(count, dtype=np.int64), lengths),
+                        "freq": np.concatenate(freqs + [np.empty(0)]).astype(np.float64),
+                        "amplitude": np.concatenate(amplitudes + [np.empty(0)]).astype(np.float64)}
+
+    for result in processed_data["results"]:
+        title = list(result.keys())[0]
+        tables["results/{}".format(title)] = _rows_table(result[title], test_id)
+    return tables
+
+
+def write_npz(the_file, processed_data, compressed=True):
+    """ Save the results of a run to a NumPy .npz file. The arrays are named "<table>/<column>"
+    Parameters:
+        the_file(str): The path and file to save the results to
+        processed_data(dict): The test results
+        compressed(bool): Compress the file. The traces compress well
+    Returns:
+        Nothing
+    """
+    arrays = dict()
+    for table_name, table in results_to_tables(processed_data).items():
+        for column_name, column in table.items():
+            arrays["{}/{}".format(table_name, column_name)] = column
+    if compressed is True:
+        np.savez_compressed(the_file, **arrays)
+    else:
+        np.savez(the_file, **arrays)
+
+
+def read_npz(the_file):
+    """ Read a file written by write_npz()
+    Parameters:
+        the_file(str): The file to read
+    Returns:
+        A dict of tables, as results_to_tables()
+    """
+    tables = dict()
+    with np.load(the_file, allow_pickle=False) as npz:
+        for key in npz.files:
+            table_name, sep, column_name = key.rpartition("/")
+            tables.setdefault(table_name, dict())[column_name] = npz[key]
+    return tables
+
+
+def load_npz(files):
+    """ Read the files of many runs and concatenate their tables, e.g. to analyse a month of results
+    Parameters:
+        files(list): The files to read
+    Returns:
+        A dict of tables, as results_to_tables(). A table only found in some of the files holds the rows of
+        those files. Columns missing from some of the files are filled with NaN or empty strings. The "measurement"
+        column of the peaks and traces is renumbered to index the concatenated measurements table.
+    """
+    parts = dict()
+    measurement_base = 0
+    for the_file in files:
+        tables = read_npz(the_file)
+        for name in ["peaks", "traces"]:
+            if name in tables:
+                tables[name]["measurement"] = tables[name]["measurement"] + measurement_base
+        measurement_base += len(tables.get("measurements", dict()).get("test_id", []))
+        for table_name, table in tables.items():
+            parts.setdefault(table_name, list()).append(table)
+
+    combined = dict()
+    for table_name, tables in parts.items():
+        columns = list()
+        for table in tables:
+            for column_name in table.keys():
+                if column_name not in columns:
+                    columns.append(column_name)
+        combined[table_name] = dict()
+        for column_name in columns:
+            pieces = list()
+            for table in tables:
+                length = len(table["test_id"]) if "test_id" in table else 0
+                if column_name in table:
+                    pieces.append(table[column_name])
+                else:
+                    pieces.append(np.full(length, np.nan))
+            if any(piece.dtype.kind == "U" for piece in pieces):
+                pieces = [piece.astype(np.str_) if piece.dtype.kind == "U" else
+                          np.where(np.isnan(piece), "", piece.astype(np.str_)) for piece in pieces]
+            combined[table_name][column_name] = np.concatenate(pieces)
+    return combined
+
+
+def write_parquet(directory, processed_data):
+    """ Save the results of a run as Parquet files, one per table, e.g. peaks.parquet. Needs pyarrow
+    Parameters:
+        directory(str): Directory to write the files to. It is created if it doesn't exist
+        processed_data(dict): The test results
+    Returns:
+        A list of the files written
+    """
+    if pyarrow is None:
+        raise ValueError("Writing Parquet files needs pyarrow, install it or use NPZ")
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    files = list()
+    for table_name, table in results_to_tables(processed_data).items():
+        path = directory / "{}.parquet".format(table_name.replace("/", "_").replace(" ", "_"))
+        pyarrow.parquet.write_table(pyarrow.table(table), str(path))
+        files.append(path)
+    return files
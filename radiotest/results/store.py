@@ -0,0 +1,386 @@
+import json
+import pathlib
+import re
+import sqlite3
+import threading
+from datetime import datetime
+import numpy as np
+import radiotest.config.config as config
+from radiotest.tests.report import json_default
+
+#
+# Test results database
+#
+# Every completed test run is written to an SQLite database. A run keeps its metrics, parameters, equipment and
+# results tables and its screen dumps (as PNG), so it can be shown or exported again later, and the harmonic,
+# spur, IMD and output power levels are also written one per row to the products table, so their history over many
+# runs is a single indexed query:
+#
+#   store = open_store()
+#   history = store.harmonic_history(3, project="Transmitter", serial="DSA8A1234")
+#   history["level"]  # numpy array of the 3rd harmonic level of each run, in dBc, oldest first
+#
+# The points of an IMD sweep are products too, each with the tone spacing and tone level it was measured at, and
+# the intercept point fitted at each spacing is an OIP3 product:
+#
+#   history = store.oip3_history(spacing=1.1, project="Transmitter")
+#
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    project TEXT,
+    test_name TEXT,
+    test_id TEXT,
+    timestamp TEXT,
+    bench TEXT,
+    metrics TEXT,
+    parameters TEXT,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_project ON runs (project, timestamp);
+CREATE INDEX IF NOT EXISTS runs_test_name ON runs (test_name, timestamp);
+CREATE INDEX IF NOT EXISTS runs_test_id ON runs (test_id);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT,
+    make TEXT,
+    model TEXT,
+    serial TEXT,
+    firmware TEXT
+);
+CREATE INDEX IF NOT EXISTS equipment_run ON equipment (run_id);
+CREATE INDEX IF NOT EXISTS equipment_serial ON equipment (serial);
+
+CREATE TABLE IF NOT EXISTS products (
+    run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+    kind TEXT,
+    band REAL,
+    item INTEGER,
+    freq REAL,
+    level REAL,
+    unit TEXT,
+    spacing REAL,
+    tone_level REAL
+);
+CREATE INDEX IF NOT EXISTS products_kind ON products (kind, item, run_id);
+CREATE INDEX IF NOT EXISTS products_run ON products (run_id);
+
+CREATE TABLE IF NOT EXISTS screen_dumps (
+    run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT,
+    format TEXT,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS screen_dumps_run ON screen_dumps (run_id);
+"""
+
+# Columns added to the tables of a database created by an earlier version
+MIGRATIONS = [
+    ("products", "spacing", "REAL"),
+    ("products", "tone_level", "REAL"),
+]
+
+# Product kinds, and the results table, item column, frequency column and level column each comes from
+PRODUCT_KIND_HARMONIC = "harmonic"
+PRODUCT_KIND_SPUR = "spur"
+PRODUCT_KIND_IMD = "imd"
+PRODUCT_KIND_OUTPUT_POWER = "output_power"
+PRODUCT_KIND_OIP3 = "oip3"
+
+PRODUCT_TABLES = {
+    "Harmonics": (PRODUCT_KIND_HARMONIC, "Harmonic", "Freq(MHz)", "Power"),
+    "Spurious Emissions": (PRODUCT_KIND_SPUR, "Spur", "MHz", "Power"),
+    "IMD Products List": (PRODUCT_KIND_IMD, "Order", "Freq(MHz)", "Power"),
+}
+
+# The IMD sweep tables. Each point holds the products of every order as "IMD<order>(dBc)" columns
+IMD_SWEEP_TABLE = "IMD Sweep"
+IMD_INTERCEPT_TABLE = "Third Order Intercept"
+IMD_SWEEP_COLUMN = re.compile(r"IMD(\d+)\(dBc\)")
+
+# Format of the "Time stamp" test metric, see TestSupport.get_timestamp()
+TIMESTAMP_FORMAT = "%a, %B %d, %Y, %H:%M:%S"
+
+
+def _number(value):
+    """ Convert a results table value to a float. Returns None for values such as "-" """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _search(rows, key):
+    """ Return the value of key from a list of {key: value} dicts, as test_parameters, or None"""
+    for row in rows:
+        if key in row:
+            return row[key]
+    return None
+
+
+class ResultStore:
+    """ SQLite database of test runs. Safe to use from several threads"""
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path(str): Path of the database file, created if it doesn't exist. ":memory:" for a temporary database
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection.executescript(SCHEMA)
+            self._migrate()
+            self.connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+    def _migrate(self):
+        """ Add the columns missing from a database created by an earlier version"""
+        for table, column, column_type in MIGRATIONS:
+            columns = [row["name"] for row in self.connection.execute("PRAGMA table_info({})".format(table))]
+            if column not in columns:
+                self.connection.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, column_type))
+
+    def close(self):
+        """ Close the database"""
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_run(self, processed_data, bench=None):
+        """ Write the results of a test run
+        Parameters:
+            processed_data(dict): The results returned by the test
+            bench(str): (optional) Name of the bench the test was run on
+        Returns:
+            The id of the run
+        """
+        parameters = processed_data["test_parameters"]
+        metrics = processed_data["test_metrics"]
+        timestamp = _search(metrics, "Time stamp")
+        try:
+            timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            timestamp = datetime.now()
+        # A single band run has no band column in its results tables, the band is the test frequency
+        band = _number(_search(parameters, "Fundamental Frequency"))
+        if band is None:
+            band = _number(_search(parameters, "F1"))
+
+        products = list()
+        for result in processed_data["results"]:
+            title = list(result.keys())[0]
+            for row in result[title]:
+                row_band = _number(row.get("Band(MHz)", band))
+                if title in PRODUCT_TABLES:
+                    kind, item_key, freq_key, level_key = PRODUCT_TABLES[title]
+                    item = _number(row.get(item_key))
+                    products.append((kind, row_band, None if item is None else int(item), _number(row.get(freq_key)),
+                                     _number(row.get(level_key)), row.get("Unit", "dBc"), None, None))
+                elif title == "Output power" and "Output Power (dBm)" in row:
+                    products.append((PRODUCT_KIND_OUTPUT_POWER, row_band, None, row_band,
+                                     _number(row["Output Power (dBm)"]), "dBm", None, None))
+                elif title == IMD_SWEEP_TABLE:
+                    spacing = _number(row.get("Spacing(kHz)"))
+                    tone_level = _number(row.get("Tone Level(dBm)"))
+                    for key, value in row.items():
+                        match = IMD_SWEEP_COLUMN.fullmatch(key)
+                        if match is not None:
+                            products.append((PRODUCT_KIND_IMD, row_band, int(match.group(1)), None, _number(value),
+                                             "dBc", spacing, tone_level))
+                elif title == IMD_INTERCEPT_TABLE:
+                    products.append((PRODUCT_KIND_OIP3, row_band, 3, None, _number(row.get("OIP3(dBm)")), "dBm",
+                                     _number(row.get("Spacing(kHz)")), None))
+
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (project, test_name, test_id, timestamp, bench, metrics, parameters, results) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_search(parameters, "Project Name"), _search(parameters, "Test Name"),
+                 None if _search(parameters, "Test ID") is None else str(_search(parameters, "Test ID")),
+                 timestamp.isoformat(), bench, json.dumps(metrics, default=json_default),
+                 json.dumps(parameters, default=json_default),
+                 json.dumps(processed_data["results"], default=json_default)))
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO equipment (run_id, name, make, model, serial, firmware) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, instrument.get("Name"), instrument.get("Make"), instrument.get("Model"),
+                  instrument.get("Serial"), instrument.get("Firmware"))
+                 for instrument in processed_data["test_equipment"]])
+            self.connection.executemany(
+                "INSERT INTO products (run_id, kind, band, item, freq, level, unit, spacing, tone_level) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id,) + product for product in products])
+            self.connection.executemany(
+                "INSERT INTO screen_dumps (run_id, name, format, data) VALUES (?, ?, ?, ?)",
+                [(run_id, dump["name"], dump.get("format", "bmp"), dump["data"])
+                 for dump in processed_data.get("screen_dumps", list())])
+        return run_id
+
+    def _run_filter(self, project=None, test_name=None, test_id=None, serial=None, bench=None, since=None,
+                    until=None):
+        """ Return the WHERE clause terms and arguments selecting runs. See find_runs()"""
+        terms = list()
+        args = list()
+        for column, value in [("runs.project", project), ("runs.test_name", test_name), ("runs.test_id", test_id),
+                              ("runs.bench", bench)]:
+            if value is not None:
+                terms.append("{} = ?".format(column))
+                args.append(str(value))
+        if since is not None:
+            terms.append("runs.timestamp >= ?")
+            args.append(since.isoformat())
+        if until is not None:
+            terms.append("runs.timestamp < ?")
+            args.append(until.isoformat())
+        if serial is not None:
+            terms.append("runs.id IN (SELECT run_id FROM equipment WHERE serial = ?)")
+            args.append(serial)
+        return terms, args
+
+    def find_runs(self, project=None, test_name=None, test_id=None, serial=None, bench=None, since=None,
+                  until=None):
+        """ Find runs. Every criterion given must match
+        Parameters:
+            project(str): (optional) Project name
+            test_name(str): (optional) Test name
+            test_id(str): (optional) Test ID
+            serial(str): (optional) Serial number of an instrument used
+            bench(str): (optional) Bench name
+            since(datetime): (optional) Earliest run time
+            until(datetime): (optional) Runs before this time
+        Returns:
+            A list of dicts {"id", "project", "test_name", "test_id", "timestamp", "bench"}, oldest first
+        """
+        terms, args = self._run_filter(project, test_name, test_id, serial, bench, since, until)
+        query = "SELECT id, project, test_name, test_id, timestamp, bench FROM runs"
+        if len(terms) > 0:
+            query += " WHERE " + " AND ".join(terms)
+        query += " ORDER BY timestamp, id"
+        with self.lock:
+            rows = self.connection.execute(query, args).fetchall()
+        runs = list()
+        for row in rows:
+            run = dict(row)
+            run["timestamp"] = datetime.fromisoformat(run["timestamp"])
+            runs.append(run)
+        return runs
+
+    def get_run(self, run_id):
+        """ Return a run as processed data, as the test returned it but without the measurements and
+        screen dumps. Returns None if there is no such run"""
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            equipment = self.connection.execute(
+                "SELECT name, make, model, serial, firmware FROM equipment WHERE run_id = ? ORDER BY rowid",
+                (run_id,)).fetchall()
+        return {"test_metrics": json.loads(row["metrics"]), "test_parameters": json.loads(row["parameters"]),
+                "test_equipment": [{"Name": item["name"], "Make": item["make"], "Model": item["model"],
+                                    "Serial": item["serial"], "Firmware": item["firmware"]} for item in equipment],
+                "results": json.loads(row["results"])}
+
+    def get_screen_dumps(self, run_id):
+        """ Return the screen dumps of a run, as the test returned them: a list of {"name", "size", "data", "format"}
+        dicts"""
+        with self.lock:
+            rows = self.connection.execute("SELECT name, format, data FROM screen_dumps WHERE run_id = ? "
+                                           "ORDER BY rowid", (run_id,)).fetchall()
+        return [{"name": row["name"], "size": len(row["data"]), "data": row["data"], "format": row["format"]}
+                for row in rows]
+
+    def delete_run(self, run_id):
+        """ Delete a run and its products"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def history(self, kind, item=None, band=None, spacing=None, tone_level=None, **criteria):
+        """ Return the history of one kind of product
+        Parameters:
+            kind(str): One of the PRODUCT_KIND_ constants
+            item(int): (optional) Harmonic number, spur number or IMD order
+            band(float): (optional) Band, i.e. the fundamental frequency or F1, in MHz
+            spacing(float): (optional) IMD sweep tone spacing in kHz
+            tone_level(float): (optional) IMD sweep tone level in dBm
+            criteria: (optional) Run selection, see find_runs()
+        Returns:
+            A dict of numpy arrays, one entry per product found, oldest run first: "run_id", "timestamp"
+            (datetime64), "band" (MHz), "item", "freq" (MHz), "level" (dBc, or dBm for output power and OIP3),
+            "spacing" (kHz) and "tone_level" (dBm). Missing values are NaN, e.g. the spacing of a single IMD
+            measurement.
+        """
+        terms, args = self._run_filter(**criteria)
+        terms.insert(0, "products.kind = ?")
+        args.insert(0, kind)
+        if item is not None:
+            terms.append("products.item = ?")
+            args.append(int(item))
+        if band is not None:
+            # Bands are stored as entered, allow for the rounding of float MHz values
+            terms.append("ABS(products.band - ?) < 1E-6")
+            args.append(float(band))
+        for column, value in [("spacing", spacing), ("tone_level", tone_level)]:
+            if value is not None:
+                terms.append("ABS(products.{} - ?) < 1E-6".format(column))
+                args.append(float(value))
+        query = "SELECT products.run_id, runs.timestamp, products.band, products.item, products.freq, " \
+                "products.level, products.spacing, products.tone_level FROM products " \
+                "JOIN runs ON runs.id = products.run_id WHERE " + \
+                " AND ".join(terms) + " ORDER BY runs.timestamp, products.run_id, products.rowid"
+        with self.lock:
+            rows = self.connection.execute(query, args).fetchall()
+        columns = list(zip(*rows)) if len(rows) > 0 else [()] * 8
+
+        def floats(values):
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+        return {"run_id": np.array(columns[0], dtype=np.int64),
+                "timestamp": np.array(columns[1], dtype="datetime64[us]"),
+                "band": floats(columns[2]), "item": floats(columns[3]), "freq": floats(columns[4]),
+                "level": floats(columns[5]), "spacing": floats(columns[6]), "tone_level": floats(columns[7])}
+
+    def harmonic_history(self, harmonic, band=None, **criteria):
+        """ Return the history of a harmonic, e.g. 2 for the second harmonic. See history()"""
+        return self.history(PRODUCT_KIND_HARMONIC, harmonic, band, **criteria)
+
+    def spur_history(self, band=None, **criteria):
+        """ Return the history of every spur found. See history()"""
+        return self.history(PRODUCT_KIND_SPUR, None, band, **criteria)
+
+    def imd_history(self, order, band=None, spacing=None, tone_level=None, **criteria):
+        """ Return the history of the IMD products of an order, e.g. 3, including the points of IMD sweeps.
+        See history()"""
+        return self.history(PRODUCT_KIND_IMD, order, band, spacing, tone_level, **criteria)
+
+    def oip3_history(self, band=None, spacing=None, **criteria):
+        """ Return the history of the third order intercept point in dBm fitted by IMD sweeps. See history()"""
+        return self.history(PRODUCT_KIND_OIP3, None, band, spacing, None, **criteria)
+
+    def output_power_history(self, band=None, **criteria):
+        """ Return the history of the output power in dBm. See history()"""
+        return self.history(PRODUCT_KIND_OUTPUT_POWER, None, band, **criteria)
+
+
+def open_store(path=None):
+    """ Open the results database, creating its directory if needed
+    Parameters:
+        path(str): (optional) Path of the database. Defaults to config.Results_db_path
+    Returns:
+        A ResultStore
+    """
+    path = pathlib.Path(config.Results_db_path if path is None else path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return ResultStore(str(path))
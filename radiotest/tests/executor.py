@@ -0,0 +1,99 @@
+import queue
+import threading
+import traceback
+import radiotest.error_handling.exceptions as rte
+
+
+class TestExecutor:
+    """ Runs a test function on a worker thread so the Tk main loop stays responsive.
+
+    The worker never touches Tk directly. Progress messages, error popups and the final result are
+    posted to a thread safe queue, and the queue is drained on the main thread with after().
+    """
+
+    def __init__(self, widget, poll_ms=100):
+        """
+        Parameters:
+            widget(obj): Any Tk widget. Used to schedule the queue polling on the main thread
+            poll_ms(int): Queue polling interval in milliseconds
+        """
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.on_progress = None
+        self.on_error = None
+        self.on_done = None
+
+    def is_running(self):
+        """ Return True if a test is currently running on the worker thread"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, test_function, test_setup, on_done, on_progress=None, on_error=None):
+        """ Start a test on the worker thread
+        Parameters:
+            test_function(function): The run method of the test
+            test_setup(dict): The test setup passed to the run method
+            on_done(function): Called on the main thread with (status, processed_data) when the test ends.
+                               status is one of "done", "cancelled" or "failed"
+            on_progress(function): (optional) Called on the main thread with a progress message
+            on_error(function): (optional) Called on the main thread with (title, message) for error popups
+        Returns:
+            Nothing
+        """
+        if self.is_running():
+            raise RuntimeError("A test is already running")
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.cancel_event.clear()
+        # Let the test check for cancellation and report its progress
+        test_setup["cancel_event"] = self.cancel_event
+        test_setup["progress_callback"] = self.post_progress
+        self.thread = threading.Thread(target=self._worker, args=(test_function, test_setup),
+                                       name="radiotest-test-worker", daemon=True)
+        self.thread.start()
+        self.widget.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        """ Request cooperative cancellation. The test stops at its next cancellation check"""
+        self.cancel_event.set()
+
+    def post_progress(self, message):
+        """ Post a progress message. Safe to call from any thread"""
+        self.events.put(("progress", message))
+
+    def post_error(self, title, message):
+        """ Post an error popup request. Safe to call from any thread"""
+        self.events.put(("error", (title, message)))
+
+    def _worker(self, test_function, test_setup):
+        """ Worker thread body"""
+        try:
+            processed_data = test_function(test_setup)
+            self.events.put(("done", ("done", processed_data)))
+        except rte.TestCancelledError:
+            self.events.put(("done", ("cancelled", None)))
+        except Exception as e:
+            traceback.print_exc()
+            self.events.put(("error", ("Test Error", str(e))))
+            self.events.put(("done", ("failed", None)))
+
+    def _poll(self):
+        """ Drain the event queue on the main thread"""
+        finished = False
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress" and self.on_progress is not None:
+                self.on_progress(payload)
+            elif kind == "error" and self.on_error is not None:
+                self.on_error(*payload)
+            elif kind == "done":
+                finished = True
+                self.on_done(*payload)
+        if not finished:
+            self.widget.after(self.poll_ms, self._poll)
@@ -1,119 +1,243 @@
 from datetime import datetime
 import radiotest.config.config as config
 from radiotest.tests.testsupport import TestSupport
+from radiotest.tests.scheduler import MeasurementPlan
 
 
 class TestHarmSpur(TestSupport):
-    def __init__(self):
+    # Time in seconds allowed for the AWG output to settle when it is retuned between bands
+    AWG_SETTLE_TIME = 0.05
+
+    def __init__(self, gui=None):
+        """
+        Parameters:
+            gui(obj): (optional) The tab which runs the test. Defaults to the harmspur tab of the application
+        """
         super().__init__()
-        self.harmspur_gui = config.App_obj.tabs.tab_frames["harmspur"]
+        self.last_plan = None
+        self.bands = list()
+        self.harmspur_gui = config.App_obj.tabs.tab_frames["harmspur"] if gui is None else gui
         self.harmspur_gui.register_test_function(self.run)
 
-
-    def run(self, test_setup):
-        """ Run the test"""
-        self.start_time = datetime.now()
-        # Unpack and format the data passed in
+    def unpack_setup(self, test_setup):
+        """ Unpack and format the test setup passed to run()"""
         self.gui = test_setup["gui_inst"]
         self.sa = test_setup["instruments"]["sa"]["driver_inst"]
         self.project_name = test_setup["parameters"]["project_name"]
         self.test_id = test_setup["parameters"]["test_id"]
         self.ref_offset = test_setup["parameters"]["ref_offset"]
         self.display_line = test_setup["parameters"]["display_line"]
-        self.fundamental = test_setup["parameters"]["fundamental"] * 1E6  # Convert to Hz
+        # Batch runs take a list of fundamentals instead
+        self.fundamental = test_setup["parameters"].get("fundamental", 0) * 1E6  # Convert to Hz
         self.highest_harmonic = test_setup["parameters"]["highest_harmonic"]
         self.use_awg = test_setup["parameters"]["use_awg"]
         self.harm_screen_dump = test_setup["parameters"]["harm_screenshot"]
+        self.single_sweep = test_setup["parameters"].get("single_sweep", False)
         if self.use_awg is True:
             self.awg = test_setup["instruments"]["awg"]["driver_inst"]
             self.tone_level = test_setup["parameters"]["tone_level"]
 
+    def add_band_steps(self, plan, fundamental, tone_level=None, group=None):
+        """ Add the measurements of one band to a measurement plan
+        Parameters:
+            plan(MeasurementPlan): The plan
+            fundamental(float): The fundamental frequency in Hz
+            tone_level(float): (optional) The AWG tone level in dBm for this band
+            group(str): (optional) The plan group of the band. The step keys are prefixed with it
+        Returns:
+            A dict describing the band, passed to analyse_band() once the plan has been executed
+        """
+        prefix = "" if group is None else "{}/".format(group)
 
         # Calculate the span from the fundamental to the highest harmonic plus 1 MHz
-        span_all_hz = (self.fundamental * self.highest_harmonic) + 1E6
+        span_all_hz = (fundamental * self.highest_harmonic) + 1E6
 
         # Calculate the center frequency
         center_freq_hz = span_all_hz/2
 
         # Calculate a table of harmonics
-        harmonic_table = self.build_harmonic_list(self.fundamental, self.highest_harmonic)
+        harmonic_table = self.build_harmonic_list(fundamental, self.highest_harmonic)
 
-        # Set up the AWG if enabled
-        if self.use_awg is True:
-            self.awg.rst()
-            # Convert tone level to volts P-P
-            tone_vpp = self.dbm_to_vpp(self.tone_level)
-            # Set output impedance for channel 1
-            self.awg.output_sourcez(1, 50)
-            # Set the tone frequency
-            # Set the amplitude
-            self.awg.sine(1, freq=self.fundamental, amplitude=tone_vpp, offset=0.0, phase=0.0)
-            self.awg.output_on(1)
+        # *** Test for close-in spurs @+/-250 kHz  which might not have been filtered out by the TRX bandpass filter ***
+        # This measurement also provides the power of the fundamental, so it is required and measured first
 
-        # Create another table which includes the fundamental and the harmonics
-        fund_and_harm_table = [self.fundamental] + harmonic_table
+        plan.add(prefix + "spurs_500k", fundamental, span=5E5, rbw=1000, vbw=1000,
+                 ref_offset=self.ref_offset, display_line=self.display_line, required=True, group=group)
 
-        # *** Test for close-in spurs @+/-250 kHz  which might not have been filtered out by the TRX bandpass filter ***
+        # *** Test for close-in spurs @+/-1MHz  which might not have been filtered out by the TRX bandpass filter ***
 
-        measurement_data = dict()
-        screen_dumps = list()
+        plan.add(prefix + "spurs_2M", fundamental, span=2E6, rbw=1000, vbw=1000,
+                 ref_offset=self.ref_offset, display_line=self.display_line, group=group)
+
+        screen_dump_name = None
+        if self.harm_screen_dump is True:
+            screen_dump_name = "Harmonics Screen Dump"
+            if group is not None:
+                screen_dump_name += " {:g} MHz".format(fundamental / 1E6)
+
+        if self.single_sweep is True:
+            # Find all the harmonics in the trace of one wide sweep. This also provides the screen dump.
+            plan.add(prefix + "wide_sweep", center_freq_hz, span=span_all_hz, rbw=10000, vbw=10000,
+                     ref_offset=self.ref_offset, display_line=self.display_line,
+                     screen_dump_name=screen_dump_name, use_trace=True, group=group)
+        else:
+            # For best accuracy, measure each of the harmonics one by one with a 500 kHz span
+
+            for i, harmonic in enumerate(harmonic_table):
+                plan.add(prefix + "harmonic_{}".format(i + 2), harmonic, span=5E5, rbw=1000, vbw=1000,
+                         ref_offset=self.ref_offset, display_line=self.display_line, group=group)
+
+            # If requested, get a complete screen shot of all the harmonics
+
+            if screen_dump_name is not None:
+                plan.add(prefix + "wide_sweep", center_freq_hz, span=span_all_hz, rbw=10000, vbw=10000,
+                         ref_offset=self.ref_offset, display_line=self.display_line,
+                         screen_dump_name=screen_dump_name, group=group)
+
+        return {"fundamental": fundamental, "tone_level": tone_level, "group": group, "prefix": prefix,
+                "span_all_hz": span_all_hz, "harmonic_table": harmonic_table,
+                "screen_dump": screen_dump_name is not None}
+
+    def analyse_band(self, band, results):
+        """ Find the fundamental, the harmonics and the spurs of one band in the results of the plan
+        Parameters:
+            band(dict): The band, as returned by add_band_steps()
+            results(dict): The results of the plan
+        Returns:
+            A dict {"fund_power", "spurs", "harmonics", "screen_dump"}, or None if the fundamental was not seen.
+            "spurs" is a list of (frequency, amplitude) and "harmonics" a list of (harmonic number, frequency,
+            amplitude), one per harmonic found.
+        """
+        prefix = band["prefix"]
+        fundamental = band["fundamental"]
+        harmonic_table = band["harmonic_table"]
+        span_all_hz = band["span_all_hz"]
+        # Create another table which includes the fundamental and the harmonics
+        fund_and_harm_table = [fundamental] + harmonic_table
 
-        measurement_data["spurs_500k"] = self.sa_make_measurement(self.fundamental, span=5E5, rbw=1000, vbw=1000,
-                                                          ref_offset=self.ref_offset, display_line= self.display_line)
+        if prefix + "spurs_500k" not in results:
+            return None
+        spurs_500k_data = results[prefix + "spurs_500k"]
 
         # Find the power of the fundamental
-        fund_power = self.sa_fund_power(measurement_data["spurs_500k"], fund_and_harm_table[0])
+        fund_power = self.sa_fund_power(spurs_500k_data, fund_and_harm_table[0], self.sa_freq_tolerance(5E5))
         if fund_power is None:
+            return None
+
+        spurs_2M_data = results[prefix + "spurs_2M"]
+        if self.single_sweep is True:
+            # Every harmonic comes from the wide sweep, so all of them are looked up in one call
+            harmonic_peaks = self.sa_get_peaks(results[prefix + "wide_sweep"], harmonic_table,
+                                               self.sa_freq_tolerance(span_all_hz))
+        else:
+            harmonic_peaks = {"found": list(), "amplitudes": list()}
+            for i, harmonic in enumerate(harmonic_table):
+                peak = self.sa_get_peak(results[prefix + "harmonic_{}".format(i + 2)], harmonic,
+                                        self.sa_freq_tolerance(5E5))
+                harmonic_peaks["found"].append(peak is not None)
+                harmonic_peaks["amplitudes"].append(peak["amplitude"] if peak is not None else None)
+
+        screen_dump = None
+        if band["screen_dump"] is True:
+            screen_dump = results[prefix + "wide_sweep"].screen_dump
+
+        # Process the two spur lists. Peaks near the fundamental or a harmonic are not spurs.
+        tol_500k = self.sa_freq_tolerance(5E5)
+        tol_2M = self.sa_freq_tolerance(2E6)
+        spurs_500k = self.sa_peak_table(spurs_500k_data).exclude(fund_and_harm_table, tol_500k)
+        spurs_2M = self.sa_peak_table(spurs_2M_data).exclude(fund_and_harm_table, tol_2M)
+        # A spur seen in both spans is reported once, from the more accurate 500 kHz span
+        spurs_2M = spurs_2M.exclude(spurs_500k.freqs, tol_2M)
+        spurs = list(zip(spurs_500k.freqs.tolist() + spurs_2M.freqs.tolist(),
+                         spurs_500k.amplitudes.tolist() + spurs_2M.amplitudes.tolist()))
+
+        harmonics = list()
+        for i, harmonic in enumerate(harmonic_table):
+            if harmonic_peaks["found"][i]:
+                harmonics.append((i + 2, harmonic, float(harmonic_peaks["amplitudes"][i])))
+
+        return {"fund_power": fund_power, "spurs": spurs, "harmonics": harmonics, "screen_dump": screen_dump}
+
+    def execute_plan(self, plan):
+        """ Execute a measurement plan. The analyzer is set up for the first sweep of each band while the AWG
+        is tuned to the band
+        Parameters:
+            plan(MeasurementPlan): The plan
+        Returns:
+            The results of the plan
+        """
+        bands = {band["group"]: band for band in self.bands}
+        state = {"first": True}
+
+        def on_group(group, first_step):
+            band = bands[group]
+            first = state["first"]
+            state["first"] = False
+
+            def sa_setup():
+                if first is True:
+                    self.sa_prepare()
+                self.sa_configure(first_step["center_freq"], span=first_step["span"], rbw=first_step["rbw"],
+                                  vbw=first_step["vbw"], ref_offset=first_step["ref_offset"],
+                                  display_line=first_step["display_line"], use_trace=first_step["use_trace"])
+
+            jobs = [(self.sa, sa_setup)]
+            if self.use_awg is True:
+                # Convert tone level to volts P-P
+                tone_vpp = self.dbm_to_vpp(band["tone_level"])
+
+                def awg_setup():
+                    if first is True:
+                        self.awg.rst()
+                        # Set output impedance for channel 1
+                        self.awg.output_sourcez(1, 50)
+                    # Set the tone frequency
+                    # Set the amplitude
+                    self.awg.sine(1, freq=band["fundamental"], amplitude=tone_vpp, offset=0.0, phase=0.0)
+                    if first is True:
+                        self.awg.output_on(1)
+                    else:
+                        # Let the output settle at the new frequency before the band is measured
+                        self.awg.wait_settled(self.AWG_SETTLE_TIME)
+
+                jobs.append((self.awg, awg_setup))
+            if group is not None:
+                self.report_progress("Band {:g} MHz".format(band["fundamental"] / 1E6))
+            self.run_concurrently(*jobs)
+
+        try:
+            return plan.execute(self, on_group=on_group)
+        finally:
+            self.instruments_finish([1] if self.use_awg is True else [])
+
+    def run(self, test_setup):
+        """ Run the test"""
+        fundamentals = test_setup["parameters"].get("fundamentals")
+        if fundamentals is not None and len(fundamentals) > 0:
+            return self.run_batch(test_setup)
+        self.start_time = datetime.now()
+        self.bind_run_context(test_setup)
+        # Unpack and format the data passed in
+        self.unpack_setup(test_setup)
+
+        # Build the measurement plan. The plan executes all the sweeps as one batch, ordered so that the
+        # spectrum analyzer settings change as little as possible between sweeps.
+        plan = MeasurementPlan()
+        band = self.add_band_steps(plan, self.fundamental, self.tone_level if self.use_awg is True else None)
+        self.bands = [band]
+        self.last_plan = plan
+        results = self.execute_plan(plan)
+
+        analysis = self.analyse_band(band, results)
+        if analysis is None:
             self.gui.show_error(title="No fundamental Peak",
                                message="Did not see the fundamental frequency in the peak data.\
                                 Check your setup, and your fundamental frequency parameter")
             return None
-
-        # *** Test for close-in spurs @+/-1MHz  which might not have been filtered out by the TRX bandpass filter ***
-
-        measurement_data["spurs_2M"] = self.sa_make_measurement(self.fundamental, span=2E6, rbw=1000, vbw=1000,
-                                                                  ref_offset=self.ref_offset,
-                                                                  display_line=self.display_line)
-
-        # For best accuracy, measure each of the harmonics one by one with a 500 kHz span
-
-        measurement_data["harmonics"] = list()
-        for i, harmonic in enumerate(harmonic_table):
-            measurement_data["harmonics"].append(self.sa_make_measurement(harmonic_table[i], span=5E5, rbw=1000,
-                                                                          vbw=1000, ref_offset=self.ref_offset,
-                                                                          display_line=self.display_line
-                                                                          ))
-
-        # If requested, get a complete screen shot of all the harmonics
-
-        screen_dump_name = "Harmonics Screen Dump" if self.harm_screen_dump is True else None
-        if screen_dump_name is not None:
-            meas_data = self.sa_make_measurement(center_freq_hz,span=span_all_hz, rbw=10000,
-                                     vbw=10000,
-                                     ref_offset=self.ref_offset,
-                                     display_line=self.display_line,
-                                     screen_dump_name=screen_dump_name
-                                     )
-            screen_dumps.append(meas_data['screen_dump'])
-
-        # Uncomment for debug
-        #measurement_data['spurs_500k']['freqs'].append(6.123456)
-        #measurement_data['spurs_500k']['amplitudes'].append(19.1234)
+        fund_power = analysis["fund_power"]
 
         # *** Data processing ***
 
-
-        # Process the two spur lists
-        spur_set_500k = self.sa_get_spur_set(fund_and_harm_table, measurement_data['spurs_500k'])
-        spur_set_2M = self.sa_get_spur_set(fund_and_harm_table, measurement_data['spurs_2M'])
-
-        close_in_spurs = spur_set_500k
-        close_in_spurs.union(spur_set_2M)
-        # Eliminate the fundamental
-        if self.fundamental in close_in_spurs:
-            close_in_spurs.remove(self.fundamental)
-        # Convert spurs to relative power and save in the processed data
-
         # Schema for processed_data
         # processed_data (dict)
         #   |
@@ -142,8 +266,13 @@ class TestHarmSpur(TestSupport):
         #   |            |
         #   |            ...
         #   key screen_dumps (list)
+        #   |   |
+        #   |   screendump(dict) {name, size, data}
+        #   |   |
+        #   |  ...
+        #   key measurements (list)
         #       |
-        #       screendump(dict) {name, size, data}
+        #       Measurement (one per sweep)
         #       |
         #      ...
         #
@@ -151,16 +280,13 @@ class TestHarmSpur(TestSupport):
 
         # Create top level dict
         processed_data = dict()
-        processed_data["screen_dumps"] = screen_dumps
+        processed_data["screen_dumps"] = self.finish_screen_dumps(
+            [analysis["screen_dump"]] if analysis["screen_dump"] is not None else [])
+        processed_data["measurements"] = [results[step["key"]] for step in plan.ordered_steps()]
 
 
         # Test metrics
-        test_metrics = list()
-        now = datetime.now()
-        run_time = str(now - self.start_time)
-        test_metrics.append({"Time stamp": self.get_timestamp(now)})
-        test_metrics.append({"Run time": run_time})
-        processed_data["test_metrics"] = test_metrics
+        processed_data["test_metrics"] = self.plan_metrics(plan)
 
         # Test parameters
         test_parameters = list()
@@ -171,6 +297,8 @@ class TestHarmSpur(TestSupport):
         test_parameters.append({"Reference Offset": self.ref_offset, "Unit": "dB"})
         test_parameters.append({"Measurement Threshold": self.display_line, "Unit": "dB"})
         test_parameters.append({"Highest Harmonic": self.highest_harmonic})
+        single_sweep = "YES" if self.single_sweep is True else "NO"
+        test_parameters.append({"Single Sweep Harmonics": single_sweep})
         use_awg = "YES" if self.use_awg is True else "NO"
         test_parameters.append({"Use AWG": use_awg})
         if self.use_awg is True:
@@ -179,49 +307,26 @@ class TestHarmSpur(TestSupport):
 
         # Test equipment
 
-        test_equipment = list()
-        for key, value in test_setup["instruments"].items():
-            item = {"Name": value["name"], "Make": value["driver_inst"].make,
-                    "Model": value["driver_inst"].model, "Serial": value["driver_inst"].sn,
-                    "Firmware": value["driver_inst"].fw
-                    }
-            test_equipment.append(item)
-
-        processed_data["test_equipment"] = test_equipment
+        processed_data["test_equipment"] = self.get_test_equipment(test_setup)
 
         # Test results
 
         processed_data["results"] = list()
         results_table_spurs = list()
-        i = 1
-        for freq in close_in_spurs:
-            if freq in measurement_data['spurs_500k']['freqs']:
-                index = measurement_data['spurs_500k']['freqs'].index(freq/1E6)
-                results_table_spurs.append(
-                    {"Spur": i, "MHz": freq,
-                    "Power": self.format_float_as_string(-abs(measurement_data['spurs_500k']['amplitudes'][index] - fund_power), 2), "Unit": "dBc"})
-                i += 1
-            elif freq in measurement_data['spurs_2M']['freqs']:
-                index = measurement_data['spurs_2M']['freqs'].index(freq/1E6)
-                results_table_spurs.append(
-                    {"Spur": i, "MHz": freq,
-                    "Power": self.format_float_as_string(-abs(measurement_data['spurs_500k']['amplitudes'][index] - fund_power), 2), "Unit": "dBc"})
-                i += 1
+        for i, (freq, amplitude) in enumerate(analysis["spurs"]):
+            results_table_spurs.append(
+                {"Spur": i + 1, "MHz": freq/1E6,
+                 "Power": self.format_float_as_string(-abs(amplitude - fund_power), 2), "Unit": "dBc"})
         # Append legend and results table
 
         processed_data["results"].append({"Spurious Emissions": results_table_spurs})
 
         # Convert harmonics to relative power and save the processed data
         results_table_harmonics = list()
-        for peaks in measurement_data["harmonics"]:
-            if peaks is not None:
-                for freq in peaks["freqs"]:
-                    if freq in harmonic_table:
-                        index = peaks["freqs"].index(freq)
-                        amplitude = peaks["amplitudes"][index]
-                        info = {"Harmonic": harmonic_table.index(freq)+2, "Freq(MHz)": freq/1E6,
-                                "Power": self.format_float_as_string(-abs(amplitude - fund_power), 2), "Unit": "dBc"}
-                        results_table_harmonics.append(info)
+        for number, harmonic, amplitude in analysis["harmonics"]:
+            info = {"Harmonic": number, "Freq(MHz)": harmonic/1E6,
+                    "Power": self.format_float_as_string(-abs(amplitude - fund_power), 2), "Unit": "dBc"}
+            results_table_harmonics.append(info)
         # Append legend and results table
         processed_data["results"].append({"Harmonics": results_table_harmonics})
 
@@ -234,4 +339,120 @@ class TestHarmSpur(TestSupport):
 
         return processed_data
 
+    def plan_metrics(self, plan):
+        """ Return the test metrics of a run of a measurement plan"""
+        test_metrics = list()
+        now = datetime.now()
+        run_time = str(now - self.start_time)
+        test_metrics.append({"Time stamp": self.get_timestamp(now)})
+        test_metrics.append({"Run time": run_time})
+        test_metrics.append({"Sweeps": len(plan.timings)})
+        test_metrics.append({"Sweep time": self.format_float_as_string(plan.total_time(), 2), "Unit": "s"})
+        return test_metrics
+
+    def run_batch(self, test_setup):
+        """ Measure several bands in one run, e.g. a multi-band compliance run.
+        The fundamentals are passed in the "fundamentals" parameter (MHz), and optionally the AWG tone level of
+        each band in "tone_levels" (dBm). All the sweeps go into one measurement plan with a group per band. The
+        bands are measured one after another because the AWG has to be retuned between them, and within each band
+        the sweeps are ordered to minimise analyzer setting changes. A band whose fundamental is not seen is
+        reported and skipped, the other bands are still measured.
+        """
+        self.start_time = datetime.now()
+        self.bind_run_context(test_setup)
+        parameters = test_setup["parameters"]
+        fundamentals = [fundamental * 1E6 for fundamental in parameters["fundamentals"]]  # Convert to Hz
+        self.unpack_setup(test_setup)
+        tone_levels = [None] * len(fundamentals)
+        if self.use_awg is True:
+            tone_levels = parameters.get("tone_levels") or [self.tone_level] * len(fundamentals)
+            if len(tone_levels) != len(fundamentals):
+                self.gui.show_error(title="Parameter Error",
+                                    message="Specify one tone level per band, or none to use the same for all")
+                return None
+
+        plan = MeasurementPlan()
+        self.bands = list()
+        for fundamental, tone_level in zip(fundamentals, tone_levels):
+            group = "{:g}MHz".format(fundamental / 1E6)
+            self.bands.append(self.add_band_steps(plan, fundamental, tone_level, group=group))
+        self.last_plan = plan
+        results = self.execute_plan(plan)
+
+        # Schema for processed_data: as for a single band, with a band column in each results table
+        processed_data = dict()
+        processed_data["screen_dumps"] = list()
+        processed_data["measurements"] = [results[step["key"]] for step in plan.ordered_steps()
+                                          if step["key"] in results]
+        results_table_bands = list()
+        results_table_spurs = list()
+        results_table_harmonics = list()
+        results_table_output_power = list()
+        for band in self.bands:
+            band_mhz = band["fundamental"] / 1E6
+            analysis = self.analyse_band(band, results)
+            tone_level = "-" if band["tone_level"] is None else band["tone_level"]
+            if analysis is None:
+                results_table_bands.append({"Band(MHz)": band_mhz, "Tone Level(dBm)": tone_level,
+                                            "Status": "Fundamental not seen"})
+                continue
+            results_table_bands.append({"Band(MHz)": band_mhz, "Tone Level(dBm)": tone_level, "Status": "OK"})
+            fund_power = analysis["fund_power"]
+            if analysis["screen_dump"] is not None:
+                processed_data["screen_dumps"].append(analysis["screen_dump"])
+            for i, (freq, amplitude) in enumerate(analysis["spurs"]):
+                results_table_spurs.append(
+                    {"Band(MHz)": band_mhz, "Spur": i + 1, "MHz": freq/1E6,
+                     "Power": self.format_float_as_string(-abs(amplitude - fund_power), 2), "Unit": "dBc"})
+            for number, harmonic, amplitude in analysis["harmonics"]:
+                results_table_harmonics.append(
+                    {"Band(MHz)": band_mhz, "Harmonic": number, "Freq(MHz)": harmonic/1E6,
+                     "Power": self.format_float_as_string(-abs(amplitude - fund_power), 2), "Unit": "dBc"})
+            results_table_output_power.append(
+                {"Band(MHz)": band_mhz, "Output Power (dBm)": self.format_float_as_string(fund_power, 2),
+                 "Output Power (W)": self.format_float_as_string(self.dbm_to_watts(fund_power), 2)})
+
+        if len(results_table_output_power) == 0:
+            self.gui.show_error(title="No fundamental Peak",
+                                message="Did not see the fundamental frequency of any band in the peak data. "
+                                        "Check your setup, and your fundamental frequency parameters")
+            return None
+        self.finish_screen_dumps(processed_data["screen_dumps"])
+
+        # Test metrics
+        test_metrics = self.plan_metrics(plan)
+        test_metrics.append({"Bands": len(self.bands)})
+        test_metrics.append({"Analyzer setting changes": plan.setting_changes()})
+        processed_data["test_metrics"] = test_metrics
+
+        # Test parameters
+        test_parameters = list()
+        test_parameters.append({"Test Name": parameters["test_name"]})
+        test_parameters.append({"Fundamental Frequencies": ", ".join("{:g}".format(fundamental / 1E6)
+                                                                     for fundamental in fundamentals),
+                                "Unit": "MHz"})
+        test_parameters.append({"Project Name": self.project_name})
+        test_parameters.append({"Test ID": self.test_id})
+        test_parameters.append({"Reference Offset": self.ref_offset, "Unit": "dB"})
+        test_parameters.append({"Measurement Threshold": self.display_line, "Unit": "dB"})
+        test_parameters.append({"Highest Harmonic": self.highest_harmonic})
+        single_sweep = "YES" if self.single_sweep is True else "NO"
+        test_parameters.append({"Single Sweep Harmonics": single_sweep})
+        use_awg = "YES" if self.use_awg is True else "NO"
+        test_parameters.append({"Use AWG": use_awg})
+        if self.use_awg is True:
+            test_parameters.append({"AWG Tone Levels": ", ".join("{:g}".format(level) for level in tone_levels),
+                                    "Unit": "dBm"})
+        processed_data["test_parameters"] = test_parameters
 
+        # Test equipment
+        processed_data["test_equipment"] = self.get_test_equipment(test_setup)
+
+        # Test results
+        processed_data["results"] = list()
+        processed_data["results"].append({"Bands": results_table_bands})
+        processed_data["results"].append({"Spurious Emissions": results_table_spurs})
+        processed_data["results"].append({"Harmonics": results_table_harmonics})
+        processed_data["results"].append({"Output power": results_table_output_power})
+
+        return processed_data
@@ -0,0 +1,135 @@
+import threading
+import importlib
+import radiotest.config.configdata as configdata
+import radiotest.error_handling.exceptions as rte
+
+#
+# Stand in for a test tab, so the tests can be run without Tk, e.g. against the simulated instruments
+#
+
+
+class HeadlessGui:
+    """ Implements the parts of a test tab which the tests use. Errors and progress messages are recorded
+    instead of being shown"""
+
+    def __init__(self):
+        self.test_function = None
+        self.errors = list()
+        self.progress = list()
+        self.cancel_event = threading.Event()
+
+    def register_test_function(self, test_function):
+        """ Register test function: Called by the test constructor"""
+        self.test_function = test_function
+
+    def show_error(self, title, message):
+        """ Record an error the test would have shown in a popup"""
+        self.errors.append({"title": title, "message": message})
+
+    def run_test(self, parameters, instruments):
+        """ Run the registered test on the calling thread
+        Parameters:
+            parameters(dict): The test parameters, as the tab would pass them
+            instruments(dict): The instruments, as the tab would pass them. See instrument_entry()
+        Returns:
+            The processed data returned by the test
+        """
+        if self.test_function is None:
+            raise RuntimeError("No test registered")
+        self.cancel_event.clear()
+        test_setup = {"instruments": instruments, "parameters": parameters, "gui_inst": self,
+                      "cancel_event": self.cancel_event, "progress_callback": self.progress.append}
+        return self.test_function(test_setup)
+
+
+def instrument_entry(loader, name, title):
+    """ Load an instrument and return its entry for the instruments dict of a test setup
+    Parameters:
+        loader(Loader): The driver loader
+        name(str): Name of the instrument in the configuration
+        title(str): Description shown in the test equipment table, e.g. "Spectrum Analyzer"
+    Returns:
+        A dict {"driver_inst", "name"}
+    """
+    info = loader.load(name)
+    return {"driver_inst": loader.get_driver_instance(info), "name": title}
+
+
+# The tests which can be run without the GUI
+TESTS = {
+    "harmspur": {"module": "radiotest.tests.harmspur", "class_name": "TestHarmSpur",
+                 "test_name": "Harmonics and Spurs"},
+    "imd": {"module": "radiotest.tests.imd", "class_name": "TestImd", "test_name": "Intermodulation Distortion"},
+    "trxlo": {"module": "radiotest.tests.trxlo", "class_name": "TestTRXLO", "test_name": "TRX LO"},
+}
+
+# Instrument roles: (configuration filter, description shown in the test equipment table)
+ROLES = {
+    "sa": (configdata.CD_FILT_SA, "Spectrum Analyzer"),
+    "awg": (configdata.CD_FILT_AWG, "Arbitrary Waveform Generator"),
+    "av": (configdata.CD_FILT_AV, "Totalphase Aardvark"),
+}
+
+
+def make_test(test, gui):
+    """ Create a test object which registers with gui
+    Parameters:
+        test(str): One of the keys of TESTS
+        gui(HeadlessGui): The stand in for the test tab
+    Returns:
+        The test object
+    """
+    test_info = TESTS[test]
+    test_class = getattr(importlib.import_module(test_info["module"]), test_info["class_name"])
+    return test_class(gui)
+
+
+def required_roles(test, parameters):
+    """ Return the instrument roles a test needs with the parameters given"""
+    if test == "harmspur":
+        return ["sa", "awg"] if parameters.get("use_awg", True) is True else ["sa"]
+    if test == "imd":
+        return ["sa", "awg"]
+    return ["awg", "av"] if parameters.get("aardvark", False) is True else ["awg"]
+
+
+def load_test_instruments(loader, config_data, test, parameters, instruments=None, bench=None):
+    """ Load the instruments a test needs
+    Parameters:
+        loader(Loader): The driver loader
+        config_data(ConfigData): The configuration
+        test(str): One of the keys of TESTS
+        parameters(dict): The test parameters
+        instruments(dict): (optional) Name of the instrument to use for each role, e.g. {"sa": "SA1"}.
+                           Roles not given use the first instrument of the right type
+        bench(str): (optional) Only use the instruments on this bench. They are known to the loader by their
+                    default bench names
+    Returns:
+        The instruments dict of a test setup
+    Raises:
+        ValueError if there's no instrument for a role, LoaderError if an instrument can't be loaded
+    """
+    if instruments is None:
+        instruments = dict()
+    test_instruments = dict()
+    for role in required_roles(test, parameters):
+        cd_filter, title = ROLES[role]
+        name = instruments.get(role)
+        if name is None:
+            if bench is None:
+                candidates = config_data.get_instrument_names_of_type(cd_filter)
+            else:
+                candidates = [instrument["base_name"] for instrument in config_data.get_bench_instruments(bench)
+                              if instrument["cd_filter"] == cd_filter]
+            if len(candidates) == 0:
+                raise ValueError("No {} configured".format(title))
+            name = candidates[0]
+        try:
+            if role == "av":
+                # The tests use the loader's info dict of the Aardvark
+                test_instruments[role] = loader.load(name)
+            else:
+                test_instruments[role] = instrument_entry(loader, name, title)
+        except rte.LoaderError as e:
+            raise rte.LoaderError("{}: {}".format(name, e.value))
+    return test_instruments
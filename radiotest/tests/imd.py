@@ -1,21 +1,28 @@
-import time
 from datetime import datetime
+import numpy as np
 import radiotest.config.config as config
 from radiotest.tests.testsupport import TestSupport
 
 
 class TestImd(TestSupport):
-    def __init__(self):
+    # Time in seconds allowed for the AWG outputs to settle once the generator has applied the settings.
+    # The analyzer is set up during this time.
+    AWG_SETTLE_TIME = 0.05
+
+    def __init__(self, gui=None):
+        """
+        Parameters:
+            gui(obj): (optional) The tab which runs the test. Defaults to the imd tab of the application
+        """
         super().__init__()
-        self.imd_gui = config.App_obj.tabs.tab_frames["imd"]
+        self.imd_gui = config.App_obj.tabs.tab_frames["imd"] if gui is None else gui
         self.imd_gui.register_test_function(self.run)
 
 
 
 
-    def run(self, test_setup):
-        self.start_time = datetime.now()
-        # Unpack and format the data passed in
+    def unpack_setup(self, test_setup):
+        """ Unpack and format the test setup passed to run()"""
         self.gui = test_setup["gui_inst"]
         self.sa = test_setup["instruments"]["sa"]["driver_inst"]
         self.awg = test_setup["instruments"]["awg"]["driver_inst"]
@@ -28,48 +35,104 @@ class TestImd(TestSupport):
         self.f2 = test_setup["parameters"]["f2"] * 1E6  # Convert to Hz
         self.max_order = test_setup["parameters"]["max_order"]
         self.imd_screen_dump = test_setup["parameters"]["imd_screenshot"]
-        self.two_tone_products = self.build_two_tone_products_list(self.f1, self.f2, self.max_order)
-
-        # Calculate span and center frequency
-        tone_delta = abs(self.f1 - self.f2)
-        min_max_delta = max(self.two_tone_products["all"]) - min(self.two_tone_products["all"])
+        self.trace_peaks = test_setup["parameters"].get("trace_peaks", False)
+
+    def imd_span(self, f1, f2, two_tone_products):
+        """ Return the center frequency and span which cover the tones and all the products
+        Parameters:
+            f1(float): First tone in Hz
+            f2(float): Second tone in Hz
+            two_tone_products(dict): The products, as returned by build_two_tone_products_list()
+        Returns:
+            A tuple (center frequency, span) in Hz
+        """
+        tone_delta = abs(f1 - f2)
+        min_max_delta = max(two_tone_products["all"]) - min(two_tone_products["all"])
         span = tone_delta / 2 + min_max_delta
-        center_freq = self.f1 + tone_delta / 2
-        #
-        # Set up the Arbitrary Waveform Generator
-        #
-
-        # Convert tone level to volts P-P
-        tone_vpp = self.dbm_to_vpp(self.tone_level)
+        center_freq = f1 + tone_delta / 2
+        return center_freq, span
+
+    def awg_setup(self, f1, f2, tone_vpp):
+        """ Reset the AWG and output the two tones combined onto channel 1
+        Parameters:
+            f1(float): First tone in Hz
+            f2(float): Second tone in Hz
+            tone_vpp(float): Level of each tone in volts P-P
+        Returns:
+            Nothing
+        """
         # Reset the awg
         self.awg.rst()
         # Set output impedances for channels 1 and 2
         self.awg.output_sourcez(1, 50)
         self.awg.output_sourcez(2, 50)
         # Set the frequencies
-        self.awg.sine(1, freq=self.f1, amplitude=tone_vpp, offset=0.0, phase=0.0)
-        self.awg.sine(2, freq=self.f2, amplitude=tone_vpp, offset=0.0, phase=0.0)
+        self.awg_set_tones(f1, f2, tone_vpp, settle=False)
         # Enable the outputs
         self.awg.output_on(1)
         self.awg.output_on(2)
         # Combine both outputs onto channel 1
         self.awg.channel_combine(True, 1)
+        # Wait for the generator to apply the settings, instead of sleeping for a fixed time
+        self.awg.wait_settled(self.AWG_SETTLE_TIME)
+
+    def awg_set_tones(self, f1, f2, tone_vpp, settle=True):
+        """ Change the frequency and level of the two tones
+        Parameters:
+            f1(float): First tone in Hz
+            f2(float): Second tone in Hz
+            tone_vpp(float): Level of each tone in volts P-P
+            settle(bool): If True, wait for the outputs to settle
+        Returns:
+            Nothing
+        """
+        self.awg.sine(1, freq=f1, amplitude=tone_vpp, offset=0.0, phase=0.0)
+        self.awg.sine(2, freq=f2, amplitude=tone_vpp, offset=0.0, phase=0.0)
+        if settle is True:
+            self.awg.wait_settled(self.AWG_SETTLE_TIME)
+
+    def run(self, test_setup):
+        if test_setup["parameters"].get("sweep", False) is True:
+            return self.run_sweep(test_setup)
+        self.start_time = datetime.now()
+        self.bind_run_context(test_setup)
+        self.unpack_setup(test_setup)
+        self.two_tone_products = self.build_two_tone_products_list(self.f1, self.f2, self.max_order)
 
-        time.sleep(1)
+        # Calculate span and center frequency
+        center_freq, span = self.imd_span(self.f1, self.f2, self.two_tone_products)
         #
-        # Use the spectrum analyzer to make the measurement
+        # Set up the Arbitrary Waveform Generator and the spectrum analyzer at the same time
         #
-        screen_dump_name = "IMD Screen Dump" if self.imd_screen_dump is True else None
-        result = self.sa_make_measurement(center_freq,
-                                          ref_offset=self.ref_offset,
-                                          span=span,
-                                          rbw=100,
-                                          vbw=100,
-                                          display_line=self.display_line,
-                                          screen_dump_name=screen_dump_name
-                                          )
-        # The measurement should have returned a dict with one table of frequencies "freqs"
-        # and one table of amplitudes
+
+        # Convert tone level to volts P-P
+        tone_vpp = self.dbm_to_vpp(self.tone_level)
+
+        def sa_setup():
+            self.sa_prepare()
+            self.sa_configure(center_freq, ref_offset=self.ref_offset, span=span, rbw=100, vbw=100,
+                              display_line=self.display_line, use_trace=self.trace_peaks)
+
+        try:
+            self.run_concurrently((self.awg, lambda: self.awg_setup(self.f1, self.f2, tone_vpp)),
+                                  (self.sa, sa_setup))
+
+            #
+            # Use the spectrum analyzer to make the measurement. It is already set up, so this only sweeps
+            #
+            screen_dump_name = "IMD Screen Dump" if self.imd_screen_dump is True else None
+            result = self.sa_make_measurement(center_freq,
+                                              ref_offset=self.ref_offset,
+                                              span=span,
+                                              rbw=100,
+                                              vbw=100,
+                                              display_line=self.display_line,
+                                              screen_dump_name=screen_dump_name,
+                                              use_trace=self.trace_peaks
+                                              )
+        finally:
+            self.instruments_finish([1, 2])
+        # The measurement holds the frequencies and amplitudes of the peaks
 
         # Schema for processed_data
         # processed_data (dict)
@@ -99,8 +162,13 @@ class TestImd(TestSupport):
         #   |            |
         #   |           ...
         #   key screen_dumps (list)
+        #   |   |
+        #   |   screendump(dict) {name, size, data}
+        #   |   |
+        #   |  ...
+        #   key measurements (list)
         #       |
-        #       screendump(dict) {name, size, data}
+        #       Measurement (one per sweep)
         #       |
         #      ...
         #
@@ -131,19 +199,13 @@ class TestImd(TestSupport):
         test_parameters.append({"Measurement Threshold":self.display_line, "Unit": "dB"})
         test_parameters.append({"Tone Level": self.tone_level, "Unit": "dBm"})
         test_parameters.append({"Order": self.max_order})
+        trace_peaks = "YES" if self.trace_peaks is True else "NO"
+        test_parameters.append({"Trace Peak Detection": trace_peaks})
         processed_data["test_parameters"] = test_parameters
 
 
         # Test equipment
-        test_equipment = list()
-        for key, value in test_setup["instruments"].items():
-            item = {"Name": value["name"], "Make": value["driver_inst"].make,
-                    "Model": value["driver_inst"].model, "Serial": value["driver_inst"].sn,
-                    "Firmware": value["driver_inst"].fw
-                    }
-            test_equipment.append(item)
-
-        processed_data["test_equipment"] = test_equipment
+        processed_data["test_equipment"] = self.get_test_equipment(test_setup)
 
 
         # Find F1 and F2, and get their amplitudes
@@ -166,19 +228,17 @@ class TestImd(TestSupport):
         # Test results
         processed_data["results"] = list()
         results_table_products = list()
-        for order, freqs in self.two_tone_products["by_product"].items():
+        # Look up all the products in one call. Each order has a left and a right product.
+        orders = list(self.two_tone_products["by_product"].keys())
+        product_freqs = list()
+        for order in orders:
+            product_freqs += self.two_tone_products["by_product"][order]
+        products = self.sa_get_peaks(result, product_freqs, 100)
 
-            left = self.sa_get_peak(result, freqs[0], 100)
-
-            if left is not None:
-                results_table_products.append({"Order": order, 'Freq(MHz)': freqs[0]/1E6,
-                                               "Power": self.format_float_as_string(-abs(carrier_power-left["amplitude"]),2), "Unit": "dBc"})
-
-            right = self.sa_get_peak(result, freqs[1], 100)
-
-            if right is not None:
-                results_table_products.append({"Order": order, 'Freq(MHz)': freqs[1]/1E6,
-                                               "Power": self.format_float_as_string(-abs(carrier_power - right["amplitude"]),2), "Unit": "dBc"})
+        for i, freq in enumerate(product_freqs):
+            if products["found"][i]:
+                results_table_products.append({"Order": orders[i // 2], 'Freq(MHz)': freq/1E6,
+                                               "Power": self.format_float_as_string(-abs(carrier_power - products["amplitudes"][i]), 2), "Unit": "dBc"})
 
 
         if len(results_table_products) == 0:
@@ -202,9 +262,201 @@ class TestImd(TestSupport):
         # if a screen dump was specified, insert it here
         processed_data["screen_dumps"] = list()
         if self.imd_screen_dump is True:
-            processed_data["screen_dumps"].append(result["screen_dump"])
+            processed_data["screen_dumps"].append(result.screen_dump)
+        self.finish_screen_dumps(processed_data["screen_dumps"])
+        processed_data["measurements"] = [result]
 
 
 
         return processed_data
 
+    def imd_analyse(self, measurement, f1, f2, two_tone_products, freq_tol):
+        """ Find the tones and the worst product of each order in a measurement
+        Parameters:
+            measurement(Measurement): The measurement to analyse
+            f1(float): First tone in Hz
+            f2(float): Second tone in Hz
+            two_tone_products(dict): The products, as returned by build_two_tone_products_list()
+            freq_tol(float): The acceptable tolerance to use when searching the peaks
+        Returns:
+            A dict {"carrier_power", "products"}. "products" maps each order to the level in dBc of the higher of
+            its two products, or None if neither was seen. None is returned if a tone is missing.
+        """
+        tones = self.sa_get_peaks(measurement, [f1, f2], freq_tol)
+        if not all(tones["found"]):
+            return None
+        carrier_power = float(min(tones["amplitudes"]))
+        products = dict()
+        for order, freqs in two_tone_products["by_product"].items():
+            peaks = self.sa_get_peaks(measurement, freqs, freq_tol)
+            if any(peaks["found"]):
+                products[order] = float(np.nanmax(peaks["amplitudes"])) - carrier_power
+            else:
+                products[order] = None
+        return {"carrier_power": carrier_power, "products": products}
+
+    def fit_intercept(self, carrier_powers, imd3_dbc):
+        """ Estimate the third order intercept from IMD3 measured at several levels
+        The IMD3 products (in dBm) are fitted with a straight line against the tone power. The intercept is where
+        the line crosses the tone power line.
+        Parameters:
+            carrier_powers(list): Tone powers in dBm
+            imd3_dbc(list): IMD3 levels in dBc. None where no product was seen
+        Returns:
+            A tuple (slope, intercept in dBm), or (None, None) if there are not enough points
+        """
+        points = [(p, p + dbc) for p, dbc in zip(carrier_powers, imd3_dbc) if dbc is not None]
+        if len(set(point[0] for point in points)) < 2:
+            return None, None
+        x = np.array([point[0] for point in points])
+        y = np.array([point[1] for point in points])
+        slope, offset = np.polyfit(x, y, 1)
+        if abs(slope - 1) < 1E-6:
+            return float(slope), None
+        return float(slope), float(offset / (1 - slope))
+
+    def run_sweep(self, test_setup):
+        """ Measure the IMD over a grid of tone spacings and tone levels in one run.
+        F1 stays where it is and F2 is placed above it at each spacing. The analyzer settings only depend on the
+        spacing, so for each spacing the analyzer is set up once and the levels are stepped through on the AWG.
+        """
+        self.start_time = datetime.now()
+        self.bind_run_context(test_setup)
+        self.unpack_setup(test_setup)
+        parameters = test_setup["parameters"]
+        levels = sorted(parameters.get("sweep_levels") or [self.tone_level])
+        spacings = parameters.get("sweep_spacings") or [abs(self.f2 - self.f1) / 1E3]
+        spacings = sorted(spacing * 1E3 for spacing in spacings)  # Convert to Hz
+        orders = [str(order) for order in range(3, self.max_order + 1, 2)]
+        point_count = len(spacings) * len(levels)
+
+        results_table_points = list()
+        results_table_intercepts = list()
+        curves = list()
+        measurements = list()
+        screen_dumps = list()
+        first = True
+        try:
+            for spacing in spacings:
+                f2 = self.f1 + spacing
+                two_tone_products = self.build_two_tone_products_list(self.f1, f2, self.max_order)
+                center_freq, span = self.imd_span(self.f1, f2, two_tone_products)
+                freq_tol = max(100, self.sa_freq_tolerance(span))
+                curve = {"spacing": spacing, "levels": list(), "carrier_powers": list(),
+                         "products": {order: list() for order in orders}}
+                for level in levels:
+                    self.report_progress("Spacing {:.3f} kHz, tone level {} dBm ({}/{})".format(
+                        spacing / 1E3, level, len(measurements) + 1, point_count))
+                    tone_vpp = self.dbm_to_vpp(level)
+
+                    # The AWG and the analyzer are set up at the same time. Only the settings which change are sent
+                    # to the analyzer, so it is only set up again when the spacing changes.
+                    def sa_setup(first=first, center_freq=center_freq, span=span):
+                        if first is True:
+                            self.sa_prepare()
+                        self.sa_configure(center_freq, ref_offset=self.ref_offset, span=span, rbw=100, vbw=100,
+                                          display_line=self.display_line, use_trace=self.trace_peaks)
+
+                    if first is True:
+                        awg_job = (self.awg, lambda f2=f2, tone_vpp=tone_vpp: self.awg_setup(self.f1, f2, tone_vpp))
+                    else:
+                        awg_job = (self.awg, lambda f2=f2, tone_vpp=tone_vpp: self.awg_set_tones(self.f1, f2, tone_vpp))
+                    self.run_concurrently(awg_job, (self.sa, sa_setup))
+                    first = False
+
+                    screen_dump_name = None
+                    if self.imd_screen_dump is True:
+                        screen_dump_name = "IMD Screen Dump {:.3f} kHz {} dBm".format(spacing / 1E3, level)
+                    result = self.sa_make_measurement(center_freq, ref_offset=self.ref_offset, span=span, rbw=100,
+                                                      vbw=100, display_line=self.display_line,
+                                                      screen_dump_name=screen_dump_name, use_trace=self.trace_peaks)
+                    measurements.append(result)
+                    if result.screen_dump is not None:
+                        screen_dumps.append(result.screen_dump)
+
+                    analysis = self.imd_analyse(result, self.f1, f2, two_tone_products, freq_tol)
+                    row = {"Spacing(kHz)": spacing / 1E3, "Tone Level(dBm)": level}
+                    if analysis is None:
+                        # The tones were not seen. The point is reported, but left out of the curves.
+                        row["Carrier(dBm)"] = "-"
+                        for order in orders:
+                            row["IMD{}(dBc)".format(order)] = "-"
+                        row["OIP3(dBm)"] = "-"
+                        results_table_points.append(row)
+                        continue
+                    carrier_power = analysis["carrier_power"]
+                    row["Carrier(dBm)"] = self.format_float_as_string(carrier_power, 2)
+                    for order in orders:
+                        dbc = analysis["products"][order]
+                        row["IMD{}(dBc)".format(order)] = "-" if dbc is None else self.format_float_as_string(dbc, 2)
+                        curve["products"][order].append(dbc)
+                    imd3 = analysis["products"]["3"]
+                    # Each dB of tone power raises the IMD3 products by 3 dB, so they meet the tones at
+                    # carrier + |IMD3 dBc| / 2
+                    row["OIP3(dBm)"] = "-" if imd3 is None else self.format_float_as_string(carrier_power - imd3 / 2, 2)
+                    results_table_points.append(row)
+                    curve["levels"].append(level)
+                    curve["carrier_powers"].append(carrier_power)
+
+                slope, intercept = self.fit_intercept(curve["carrier_powers"], curve["products"]["3"])
+                curve["imd3_slope"] = slope
+                curve["oip3"] = intercept
+                curves.append(curve)
+                results_table_intercepts.append({"Spacing(kHz)": spacing / 1E3, "Points": len(curve["levels"]),
+                                                 "IMD3 Slope": "-" if slope is None else
+                                                 self.format_float_as_string(slope, 2),
+                                                 "OIP3(dBm)": "-" if intercept is None else
+                                                 self.format_float_as_string(intercept, 2)})
+        finally:
+            self.instruments_finish([1, 2])
+
+        if all(len(curve["levels"]) == 0 for curve in curves):
+            self.gui.show_error(title="Measurement Setup Error",
+                                message="Did not see F1 and F2 at any point of the sweep. Check your setup for "
+                                        "cabling errors")
+            return None
+
+        # Schema for processed_data: as for a single measurement, with one measurement per point, plus
+        #   key imd_curves (list)
+        #       |
+        #       curve(dict) {spacing, levels, carrier_powers, products {order: list of dBc}, imd3_slope, oip3}
+        #       |
+        #      ...
+        processed_data = dict()
+
+        # Test metrics
+        test_metrics = list()
+        now = datetime.now()
+        test_metrics.append({"Time stamp": self.get_timestamp(now)})
+        test_metrics.append({"Run time": str(now - self.start_time)})
+        test_metrics.append({"Points": len(measurements)})
+        processed_data["test_metrics"] = test_metrics
+
+        # Test parameters
+        test_parameters = list()
+        test_parameters.append({"Test Name": parameters["test_name"]})
+        test_parameters.append({"F1": self.f1/1E6, "Unit": "MHz"})
+        test_parameters.append({"Tone Spacings": ", ".join("{:g}".format(spacing / 1E3) for spacing in spacings),
+                                "Unit": "kHz"})
+        test_parameters.append({"Tone Levels": ", ".join("{:g}".format(level) for level in levels), "Unit": "dBm"})
+        test_parameters.append({"Project Name": self.project_name})
+        test_parameters.append({"Test ID": self.test_id})
+        test_parameters.append({"Reference Offset": self.ref_offset, "Unit": "dB"})
+        test_parameters.append({"Measurement Threshold": self.display_line, "Unit": "dB"})
+        test_parameters.append({"Order": self.max_order})
+        trace_peaks = "YES" if self.trace_peaks is True else "NO"
+        test_parameters.append({"Trace Peak Detection": trace_peaks})
+        processed_data["test_parameters"] = test_parameters
+
+        # Test equipment
+        processed_data["test_equipment"] = self.get_test_equipment(test_setup)
+
+        # Test results
+        processed_data["results"] = list()
+        processed_data["results"].append({"IMD Sweep": results_table_points})
+        processed_data["results"].append({"Third Order Intercept": results_table_intercepts})
+        processed_data["screen_dumps"] = self.finish_screen_dumps(screen_dumps)
+        processed_data["measurements"] = measurements
+        processed_data["imd_curves"] = curves
+
+        return processed_data
@@ -0,0 +1,142 @@
+from datetime import datetime
+import numpy as np
+
+
+class PeakTable:
+    """ Peak frequencies and amplitudes held in NumPy arrays sorted by frequency
+
+    Frequency queries are answered with searchsorted, so matching m query frequencies
+    against n peaks costs O((n + m) log n) and is done in one call.
+    """
+
+    __slots__ = ("freqs", "amplitudes")
+
+    def __init__(self, freqs, amplitudes):
+        """
+        Parameters:
+            freqs(list): Peak frequencies in Hz, in any order
+            amplitudes(list): Peak amplitudes, in the same order as freqs
+        """
+        freqs = np.asarray(freqs, dtype=np.float64)
+        amplitudes = np.asarray(amplitudes, dtype=np.float64)
+        if len(freqs) != len(amplitudes):
+            raise ValueError("Frequency and amplitude arrays differ in length")
+        order = np.argsort(freqs, kind="stable")
+        self.freqs = freqs[order]
+        self.amplitudes = amplitudes[order]
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def match(self, query_freqs, freq_tol):
+        """ Find the nearest peak to each query frequency
+        Parameters:
+            query_freqs(list): Frequencies to look up in Hz
+            freq_tol(float): Maximum distance in Hz between a query frequency and its peak
+        Returns:
+            A numpy integer array with the index of the matching peak for each query, or -1 if there is none
+        """
+        query_freqs = np.atleast_1d(np.asarray(query_freqs, dtype=np.float64))
+        count = len(self.freqs)
+        if count == 0:
+            return np.full(len(query_freqs), -1, dtype=np.intp)
+        # Index of the first peak at or above each query, and the peak just below it
+        above = np.clip(np.searchsorted(self.freqs, query_freqs), 0, count - 1)
+        below = np.clip(above - 1, 0, count - 1)
+        delta_above = np.abs(self.freqs[above] - query_freqs)
+        delta_below = np.abs(self.freqs[below] - query_freqs)
+        nearest = np.where(delta_above < delta_below, above, below)
+        delta = np.minimum(delta_above, delta_below)
+        return np.where(delta <= freq_tol, nearest, -1)
+
+    def lookup(self, query_freqs, freq_tol):
+        """ Look up the peaks nearest to many query frequencies in one call
+        Parameters:
+            query_freqs(list): Frequencies to look up in Hz
+            freq_tol(float): Maximum distance in Hz between a query frequency and its peak
+        Returns:
+            A dict with "found" (bool array), and "freqs" and "amplitudes" arrays of the matching peaks.
+            Entries for queries without a match are NaN.
+        """
+        index = self.match(query_freqs, freq_tol)
+        found = index >= 0
+        freqs = np.full(len(index), np.nan)
+        amplitudes = np.full(len(index), np.nan)
+        freqs[found] = self.freqs[index[found]]
+        amplitudes[found] = self.amplitudes[index[found]]
+        return {"found": found, "freqs": freqs, "amplitudes": amplitudes}
+
+    def exclude(self, reference_freqs, freq_tol):
+        """ Select the peaks which are not within the tolerance of any reference frequency
+        Parameters:
+            reference_freqs(list): Frequencies to exclude in Hz
+            freq_tol(float): Peaks closer than this to a reference frequency are excluded
+        Returns:
+            A new PeakTable with the remaining peaks
+        """
+        if len(reference_freqs) == 0:
+            return PeakTable(self.freqs, self.amplitudes)
+        keep = PeakTable(reference_freqs, np.zeros(len(reference_freqs))).match(self.freqs, freq_tol) < 0
+        return PeakTable(self.freqs[keep], self.amplitudes[keep])
+
+
+class Measurement(PeakTable):
+    """ The result of one spectrum analyzer sweep: the peaks found, the analyzer settings used and an
+    optional screen dump. __slots__ keeps the per-object overhead down when many sweeps are held in memory.
+    """
+
+    __slots__ = ("center_freq", "span", "rbw", "vbw", "ref_offset", "display_line", "source", "timestamp",
+                 "screen_dump", "trace_freqs", "trace_amplitudes")
+
+    def __init__(self, freqs, amplitudes, center_freq=0.0, span=0.0, rbw=0, vbw=0, ref_offset=0, display_line=0,
+                 source="peak_table", timestamp=None, screen_dump=None, trace_freqs=None, trace_amplitudes=None):
+        """
+        Parameters:
+            freqs(list): Peak frequencies in Hz, in any order
+            amplitudes(list): Peak amplitudes, in the same order as freqs
+            center_freq(float): Center frequency of the sweep in Hz
+            span(float): Span of the sweep in Hz
+            rbw(int): Resolution bandwidth in Hz
+            vbw(int): Video bandwidth in Hz
+            ref_offset(int): Reference offset in dB
+            display_line(int): Threshold in dB above which peaks were recorded
+            source(str): Where the peaks came from: "peak_table" or "trace"
+            timestamp(datetime): (optional) Time of the sweep. Defaults to now
+            screen_dump(dict): (optional) Screen dump {name, size, data} taken after the sweep
+            trace_freqs(ndarray): (optional) Frequency of each trace point in Hz, if the peaks came from the trace
+            trace_amplitudes(ndarray): (optional) Amplitude of each trace point
+        """
+        PeakTable.__init__(self, freqs, amplitudes)
+        self.center_freq = center_freq
+        self.span = span
+        self.rbw = rbw
+        self.vbw = vbw
+        self.ref_offset = ref_offset
+        self.display_line = display_line
+        self.source = source
+        self.timestamp = datetime.now() if timestamp is None else timestamp
+        self.screen_dump = screen_dump
+        self.trace_freqs = trace_freqs
+        self.trace_amplitudes = trace_amplitudes
+
+    def summary(self):
+        """ Return a results table row describing the sweep"""
+        return {"Center(MHz)": self.center_freq / 1E6, "Span(MHz)": self.span / 1E6, "RBW(Hz)": self.rbw,
+                "VBW(Hz)": self.vbw, "Peaks": len(self), "Source": self.source,
+                "Time": self.timestamp.strftime("%H:%M:%S")}
+
+    def to_dict(self):
+        """ Return the measurement as a dict of plain Python types, e.g. for JSON serialization.
+        The screen dump is not included."""
+        return {"freqs": self.freqs.tolist(), "amplitudes": self.amplitudes.tolist(),
+                "center_freq": self.center_freq, "span": self.span, "rbw": self.rbw, "vbw": self.vbw,
+                "ref_offset": self.ref_offset, "display_line": self.display_line, "source": self.source,
+                "timestamp": self.timestamp.isoformat()}
+
+    @classmethod
+    def from_dict(cls, info):
+        """ Create a measurement from a dict returned by to_dict()"""
+        return cls(info["freqs"], info["amplitudes"], center_freq=info["center_freq"], span=info["span"],
+                   rbw=info["rbw"], vbw=info["vbw"], ref_offset=info["ref_offset"],
+                   display_line=info["display_line"], source=info["source"],
+                   timestamp=datetime.fromisoformat(info["timestamp"]))
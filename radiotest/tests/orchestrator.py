@@ -0,0 +1,99 @@
+import time
+import importlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import radiotest.config.configdata as configdata
+import radiotest.drivers.loader as loader
+import radiotest.error_handling.exceptions as rte
+from radiotest.tests.headless import HeadlessGui, make_test, load_test_instruments
+
+#
+# Runs a test on several benches at the same time
+#
+# A bench is a set of instruments, see ConfigData.add_bench(). Each bench gets its own loader, drivers, test object
+# and stand in GUI, so nothing is shared between the benches and they run in parallel. Almost all the time of a test
+# is spent waiting for the instruments, so the benches are run on a thread pool by default. A process pool can be
+# used instead if the analysis becomes CPU bound.
+#
+
+
+def bench_loader(config_data, bench):
+    """ Return a loader holding the instruments of one bench, known by their default bench names, e.g. "SA1"
+    Parameters:
+        config_data(ConfigData): The configuration
+        bench(str): Name of the bench
+    Returns:
+        A Loader
+    """
+    the_loader = loader.Loader()
+    for instrument in config_data.get_bench_instruments(bench):
+        # The loader keeps the driver instance in the info dict, so each bench has its own copy
+        info = dict(instrument["instrument"])
+        if info.get("simulated", False) is True and "hostname" in info and bench != configdata.DEFAULT_BENCH:
+            # The simulated instruments of the other benches are put on their own simulated bench
+            sim_bench = importlib.import_module("radiotest.drivers.instruments.sim.bench")
+            info["hostname"] = "{}/{}".format(bench, info["hostname"])
+            sim_bench.assign_host(info["hostname"], bench)
+        the_loader.add_instrument(instrument["base_name"], info)
+    return the_loader
+
+
+def run_on_bench(config_data, bench, test, parameters, instruments=None):
+    """ Run a test on one bench
+    Parameters:
+        config_data(ConfigData): The configuration
+        bench(str): Name of the bench
+        test(str): One of the keys of headless.TESTS
+        parameters(dict): The test parameters
+        instruments(dict): (optional) Instrument to use for each role by its default bench name, e.g. {"sa": "SA1"}
+    Returns:
+        A dict {"bench", "processed_data", "errors", "wall_time"}. errors is a list of {"title", "message"} dicts
+        and is empty if the test passed. An unexpected exception is recorded with its type as the title.
+    """
+    start = time.perf_counter()
+    result = {"bench": bench, "processed_data": None, "errors": list(), "wall_time": 0.0}
+    the_loader = bench_loader(config_data, bench)
+    gui = HeadlessGui()
+    make_test(test, gui)
+    try:
+        test_instruments = load_test_instruments(the_loader, config_data, test, parameters, instruments, bench)
+        result["processed_data"] = gui.run_test(parameters, test_instruments)
+    except ValueError as e:
+        result["errors"].append({"title": "Instruments", "message": str(e)})
+    except rte.LoaderError as e:
+        result["errors"].append({"title": "Instruments", "message": str(e.value)})
+    except rte.TestCancelledError:
+        result["errors"].append({"title": "Test", "message": "Test cancelled"})
+    except Exception as e:
+        # Anything else, e.g. an instrument timing out or a dropped link, only fails this bench
+        result["errors"].append({"title": type(e).__name__, "message": str(e)})
+    finally:
+        the_loader.close_all()
+    result["errors"] = result["errors"] + gui.errors
+    result["wall_time"] = time.perf_counter() - start
+    return result
+
+
+def run_on_benches(config_data, test, parameters, benches=None, instruments=None, processes=False):
+    """ Run a test on several benches at the same time
+    Parameters:
+        config_data(ConfigData): The configuration
+        test(str): One of the keys of headless.TESTS
+        parameters(dict): The test parameters, the same for every bench
+        benches(list): (optional) Names of the benches. Defaults to all of them
+        instruments(dict): (optional) See run_on_bench()
+        processes(bool): Run each bench in its own process rather than on its own thread
+    Returns:
+        A list of the run_on_bench() results, in the order of the benches
+    """
+    if benches is None:
+        benches = config_data.get_bench_names()
+    unknown = [bench for bench in benches if bench not in config_data.get_bench_names()]
+    if len(unknown) > 0:
+        raise ValueError("Unknown bench: {}".format(", ".join(unknown)))
+    if len(benches) == 0:
+        return list()
+    pool_class = ProcessPoolExecutor if processes is True else ThreadPoolExecutor
+    with pool_class(max_workers=len(benches)) as pool:
+        futures = [pool.submit(run_on_bench, config_data, bench, test, dict(parameters), instruments)
+                   for bench in benches]
+        return [future.result() for future in futures]
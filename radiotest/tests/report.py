@@ -0,0 +1,101 @@
+import csv
+import json
+
+#
+# Writing test results to files. Used by the results window and by the command line runner.
+#
+
+
+def write_results_csv(the_file, processed_data):
+    """ Save the test results to a .csv file
+    Parameters:
+        the_file(str): The path and file to save the results to
+        processed_data(dict): The test results
+    Returns:
+        Nothing
+    """
+    def write_row(csv_writer, section, info):
+        """ Write one row of name, value pairs"""
+        fields = list()
+        for key, value in info.items():
+            fields.append(key)
+            fields.append(str(value))
+        row = [section] + fields
+        csv_writer.writerow(row)
+
+    def write_row_results(csv_writer, section, results):
+        """ Write multiple rows for each test result"""
+        description = list(results.keys())[0]
+
+        results_info = results[description]
+        for res in results_info:
+            fields = list()
+            fields.append(section)
+            fields.append(description)
+            for key, value in res.items():
+                fields.append(key)
+                fields.append(str(value))
+            csv_writer.writerow(fields)
+
+    # Create the file
+    with open(the_file, "w", newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=",")
+
+        # Write test metrics
+        for metric in processed_data["test_metrics"]:
+            write_row(writer, "Test Metrics", metric)
+        # Write the test equipment
+        for instrument in processed_data["test_equipment"]:
+            write_row(writer, "Test Equipment", instrument)
+        # Test parameters
+        for parameter in processed_data["test_parameters"]:
+            write_row(writer, "Test Parameters", parameter)
+        # Test results
+        for result in processed_data["results"]:
+            write_row_results(writer, "Test Results", result)
+
+
+def results_to_dict(processed_data, screen_dump_files=None):
+    """ Convert the test results to plain Python types, e.g. for JSON serialization
+    Parameters:
+        processed_data(dict): The test results
+        screen_dump_files(list): (optional) The file each screen dump was saved to, in the same order.
+                                 The screen dump data itself is not included.
+    Returns:
+        A dict
+    """
+    info = dict()
+    for key, value in processed_data.items():
+        if key == "measurements":
+            info[key] = [measurement.to_dict() for measurement in value]
+        elif key == "screen_dumps":
+            dumps = list()
+            for i, dump in enumerate(value):
+                item = {"name": dump["name"], "size": dump["size"], "format": dump.get("format", "bmp")}
+                if screen_dump_files is not None:
+                    item["file"] = screen_dump_files[i]
+                dumps.append(item)
+            info[key] = dumps
+        else:
+            info[key] = value
+    return info
+
+
+def json_default(value):
+    """ Convert the numpy types found in results"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError("Can't serialize {}".format(type(value).__name__))
+
+
+def write_results_json(the_file, processed_data, screen_dump_files=None):
+    """ Save the test results to a .json file
+    Parameters:
+        the_file(str): The path and file to save the results to
+        processed_data(dict): The test results
+        screen_dump_files(list): (optional) See results_to_dict()
+    Returns:
+        Nothing
+    """
+    with open(the_file, "w") as json_file:
+        json.dump(results_to_dict(processed_data, screen_dump_files), json_file, indent=2, default=json_default)
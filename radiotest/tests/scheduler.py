@@ -0,0 +1,123 @@
+import time
+
+
+class MeasurementPlan:
+    """ A batch of spectrum analyzer measurements which is executed in an order that minimises setting changes
+
+    Steps sharing the same RBW, VBW, reference offset and display line are grouped together, and within a group
+    they are ordered by span and center frequency. Because the analyzer driver only sends the settings which
+    change, the cost of a run then scales with the number of sweeps rather than with the setup overhead.
+
+    Steps can be put into groups, e.g. one per band of a multi-band run when the signal source has to be retuned
+    between bands. Groups are executed one after another in the order they were added, and the steps of each
+    group are ordered as above.
+    """
+
+    # Settings compared between consecutive steps, most expensive to change first
+    SETTINGS = ["rbw", "vbw", "ref_offset", "display_line", "span", "center_freq"]
+
+    def __init__(self):
+        self.steps = list()
+        self.timings = dict()
+
+    def add(self, key, center_freq, span=100E6, rbw=1000, vbw=1000, ref_offset=40, display_line=10,
+            screen_dump_name=None, required=False, use_trace=False, group=None):
+        """ Add a measurement to the plan
+        Parameters:
+            key(str): A unique name used to retrieve the result of the measurement
+            center_freq(float): Center frequency of the measurement in Hz
+            span(float): Spectrum analyzer span to use in Hz
+            rbw(int): Spectrum analyzer resolution bandwidth in Hz
+            vbw(int): Spectrum analyzer video bandwidth in Hz
+            ref_offset(int): The offset used to account for any attenuators between the DUT and the spectrum analyzer
+            display_line(int): Threshold in dB above which peaks will be recorded
+            screen_dump_name(str): (optional) A name for the screen dump from the spectrum analyzer
+            required(bool): If True, the step is measured first in its group, and the rest of the group is
+                            skipped if it finds no peaks
+            use_trace(bool): If True, peaks are found in the trace data instead of the analyzer's peak table
+            group(str): (optional) The group the step belongs to
+        Returns:
+            Nothing
+        """
+        for step in self.steps:
+            if step["key"] == key:
+                raise ValueError("Duplicate measurement key: {}".format(key))
+        self.steps.append({"key": key, "center_freq": center_freq, "span": span, "rbw": rbw, "vbw": vbw,
+                           "ref_offset": ref_offset, "display_line": display_line,
+                           "screen_dump_name": screen_dump_name, "required": required,
+                           "use_trace": use_trace, "group": group})
+
+    def groups(self):
+        """ Return the groups in execution order"""
+        groups = list()
+        for step in self.steps:
+            if step["group"] not in groups:
+                groups.append(step["group"])
+        return groups
+
+    def ordered_steps(self):
+        """ Return the steps in execution order
+        Returns:
+            A list of step dicts. Within each group, required steps come first, then the remaining steps grouped by
+            settings
+        """
+        groups = self.groups()
+
+        def sort_key(step):
+            return [groups.index(step["group"]), not step["required"]] + [step[setting] for setting in self.SETTINGS]
+        return sorted(self.steps, key=sort_key)
+
+    def setting_changes(self, steps=None):
+        """ Count the settings which have to be sent to the analyzer to execute a list of steps
+        Parameters:
+            steps(list): (optional) The steps to evaluate. Defaults to the execution order
+        Returns:
+            The number of setting changes
+        """
+        steps = self.ordered_steps() if steps is None else steps
+        changes = 0
+        previous = None
+        for step in steps:
+            for setting in self.SETTINGS:
+                if previous is None or previous[setting] != step[setting]:
+                    changes += 1
+            previous = step
+        return changes
+
+    def execute(self, test_support, on_group=None):
+        """ Execute the plan as one batch
+        Parameters:
+            test_support(TestSupport): The test which owns the spectrum analyzer
+            on_group(function): (optional) Called with (group, first step) before the first step of each group,
+                                e.g. to retune the signal source
+        Returns:
+            A dict mapping each step key to the measurement result. If a required step found no peaks,
+            the rest of its group is skipped and the keys of the skipped steps are missing from the dict.
+        """
+        results = dict()
+        self.timings = dict()
+        steps = self.ordered_steps()
+        current_group = None
+        skipped_groups = list()
+        for i, step in enumerate(steps):
+            if step["group"] in skipped_groups:
+                continue
+            if i == 0 or step["group"] != current_group:
+                current_group = step["group"]
+                if on_group is not None:
+                    on_group(current_group, step)
+            start = time.monotonic()
+            results[step["key"]] = test_support.sa_make_measurement(step["center_freq"], span=step["span"],
+                                                                    rbw=step["rbw"], vbw=step["vbw"],
+                                                                    ref_offset=step["ref_offset"],
+                                                                    display_line=step["display_line"],
+                                                                    screen_dump_name=step["screen_dump_name"],
+                                                                    use_trace=step["use_trace"])
+            self.timings[step["key"]] = time.monotonic() - start
+            if step["required"] and len(results[step["key"]]) == 0:
+                skipped_groups.append(step["group"])
+        return results
+
+    def total_time(self):
+        """ Return the total time in seconds spent executing the steps of the last run"""
+        return sum(self.timings.values())
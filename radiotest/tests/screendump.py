@@ -0,0 +1,152 @@
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+#
+# Screen dump pipeline
+#
+# The analyzers send their screen as an uncompressed BMP, around 1 MB on the DSA815. Each screen dump is converted
+# to PNG on a background thread while the test carries on measuring, and the BMP is dropped once the PNG is ready.
+# Screen images are mostly flat color, so the PNG is typically 10 to 50 times smaller.
+#
+# A screen dump is a dict {"name", "size", "data", "format"}, where format is "bmp" or "png" and size is the size of
+# data in bytes. While the conversion runs the dict also holds the pending future, see finish_screen_dumps().
+#
+
+FORMAT_BMP = "bmp"
+FORMAT_PNG = "png"
+
+# zlib level used for the PNG data. Level 6 is within a few percent of level 9 on screen images, at half the time
+PNG_COMPRESSION_LEVEL = 6
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """ Return the conversion thread pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="radiotest-screendump")
+        return _executor
+
+
+def bmp_to_rgb(data):
+    """ Decode an uncompressed BMP image
+    Parameters:
+        data(bytes-like): The BMP file. It is read in place, without being copied
+    Returns:
+        A numpy uint8 array of shape (height, width, 3) holding the RGB pixels, top row first
+    """
+    view = memoryview(data)
+    if bytes(view[0:2]) != b"BM":
+        raise ValueError("Not a BMP image")
+    if len(view) < 54:
+        raise ValueError("BMP image is truncated")
+    pixel_offset, dib_size, width, height, planes, bpp, compression = struct.unpack_from("<I I i i H H I", view, 10)
+    if compression not in (0, 3):
+        raise ValueError("Compressed BMP images are not supported")
+    rows = abs(height)
+    stride = ((width * bpp + 31) // 32) * 4
+    pixels = np.frombuffer(view, dtype=np.uint8, count=stride * rows, offset=pixel_offset).reshape(rows, stride)
+    if bpp == 24:
+        rgb = pixels[:, :width * 3].reshape(rows, width, 3)[:, :, ::-1]
+    elif bpp == 32:
+        rgb = pixels[:, :width * 4].reshape(rows, width, 4)[:, :, 2::-1]
+    elif bpp == 8:
+        colors = struct.unpack_from("<I", view, 46)[0] if dib_size >= 40 else 0
+        colors = 256 if colors == 0 else colors
+        palette = np.frombuffer(view, dtype=np.uint8, count=colors * 4, offset=14 + dib_size).reshape(colors, 4)
+        rgb = palette[:, 2::-1][pixels[:, :width]]
+    elif bpp == 16:
+        values = np.ascontiguousarray(pixels[:, :width * 2]).view("<u2")
+        if compression == 3:
+            masks = struct.unpack_from("<III", view, 14 + 40)
+        else:
+            masks = (0x7C00, 0x03E0, 0x001F)
+        channels = list()
+        for mask in masks:
+            shift = (mask & -mask).bit_length() - 1
+            top = mask >> shift
+            channels.append((((values & mask) >> shift).astype(np.uint32) * 255 // top).astype(np.uint8))
+        rgb = np.stack(channels, axis=-1)
+    else:
+        raise ValueError("{} bit BMP images are not supported".format(bpp))
+    # BMP rows are stored bottom up unless the height is negative
+    if height > 0:
+        rgb = rgb[::-1]
+    return rgb
+
+
+def _png_chunk(chunk_type, data):
+    """ Return a PNG chunk: length, type, data and CRC"""
+    return struct.pack(">I", len(data)) + chunk_type + data + \
+        struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF)
+
+
+def rgb_to_png(rgb, level=PNG_COMPRESSION_LEVEL):
+    """ Encode an image as PNG
+    Parameters:
+        rgb(ndarray): uint8 array of shape (height, width, 3)
+        level(int): zlib compression level
+    Returns:
+        The PNG file as bytes
+    """
+    height, width = rgb.shape[0:2]
+    flat = rgb.reshape(height, width * 3)
+    # Every row uses the Sub filter: each byte is stored as the difference from the same color of the pixel
+    # to its left, which turns runs of one color into runs of zeros
+    filtered = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    filtered[:, 0] = 1
+    filtered[:, 1:4] = flat[:, 0:3]
+    np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return PNG_SIGNATURE + _png_chunk(b"IHDR", header) + _png_chunk(b"IDAT", zlib.compress(filtered, level)) + \
+        _png_chunk(b"IEND", b"")
+
+
+def bmp_to_png(data):
+    """ Convert a BMP image to PNG. Returns the PNG file as bytes"""
+    return rgb_to_png(bmp_to_rgb(data))
+
+
+def make_screen_dump(name, data, convert=True):
+    """ Create a screen dump, and start converting it to PNG in the background
+    Parameters:
+        name(str): Name of the screen dump
+        data(bytes-like): The BMP image read from the instrument
+        convert(bool): Convert the image to PNG
+    Returns:
+        A screen dump dict
+    """
+    screen_dump = {"name": name, "size": len(data), "data": data, "format": FORMAT_BMP}
+    if convert is True:
+        screen_dump["pending"] = _get_executor().submit(bmp_to_png, data)
+    return screen_dump
+
+
+def finish_screen_dumps(screen_dumps):
+    """ Wait for the conversions of screen dumps to finish, and replace the BMP images by the PNG images.
+    An image which can't be converted is kept as a BMP.
+    Parameters:
+        screen_dumps(list): Screen dump dicts
+    Returns:
+        The list, for convenience
+    """
+    for screen_dump in screen_dumps:
+        pending = screen_dump.pop("pending", None)
+        if pending is None:
+            continue
+        try:
+            png = pending.result()
+        except (ValueError, struct.error):
+            continue
+        screen_dump["data"] = png
+        screen_dump["size"] = len(png)
+        screen_dump["format"] = FORMAT_PNG
+    return screen_dumps
@@ -1,5 +1,10 @@
 import math
 from datetime import datetime
+import numpy as np
+import radiotest.error_handling.exceptions as rte
+from radiotest.drivers.instruments.vxi.asyncinstrument import run_concurrently
+from radiotest.tests.measurement import PeakTable, Measurement
+import radiotest.tests.screendump as screendump
 
 class TestSupport:
     def __init__(self):
@@ -28,30 +33,80 @@ class TestSupport:
         self.use_awg = False
         self.harm_screen_dump = False
         self.imd_screen_dump = False
+        self.single_sweep = False
+        self.trace_peaks = False
         self.av_dict = None
         self.av_inst = None
         self.av_device = None
         self.tune = None
+        self.cancel_event = None
+        self.progress_callback = None
 
-    def sa_make_measurement(self, center_freq, span=100E6, rbw=1000, vbw=1000,
-                            ref_offset=40, display_line=10, screen_dump_name=None):
-        """ Set up and make a measurement
+    def bind_run_context(self, test_setup):
+        """ Pick up the cancellation event and progress callback supplied by the test executor
         Parameters:
-            center_freq(float): Center frequency of the measurement in Hz
-            span(float): Spectrum anamyzer span to use in Hz
-            rbw(int): Spectrum analyzer resolution bandwidth in Hz
-            vbw(int): Spectrum analyzer video bandwidth in Hz
-            ref_offset(int): The offset used to account for any attenuators between the DUT and the spectrum amalyzer
-            display_line(int): Threshold in dB above which peaks will be recorded
-            screen_dump_name(str): (optional) A name for the screen dump from the spectrum analyzer
+            test_setup(dict): The test setup passed to the run method
+        Returns:
+            Nothing
+        """
+        self.cancel_event = test_setup.get("cancel_event")
+        self.progress_callback = test_setup.get("progress_callback")
+
+    def check_cancel(self):
+        """ Raise TestCancelledError if the operator asked for the running test to be cancelled"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise rte.TestCancelledError("Test cancelled by the operator")
 
+    def report_progress(self, message):
+        """ Send a progress message to the GUI if a progress callback was supplied
+        Parameters:
+            message(str): The progress message
         Returns:
-            If peaks were detected, this method returns a dictionary containing 2 tables.
-            If no peaks are detected, this method will return None.
-            The dictionary keys are "freqs" and "amplitudes". Each contains a list of frequencies or amplitudes.
-            """
-        res = dict()
+            Nothing
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(message)
+
+    def sa_prepare(self):
+        """ Put the spectrum analyzer in a known state before the first measurement of a test"""
+        self.sa.rst()
+
+    def sa_finish(self):
+        """ Return the spectrum analyzer to its power on state after the last measurement of a test"""
         self.sa.rst()
+
+    def instruments_finish(self, awg_channels=()):
+        """ Leave the instruments safe at the end of a test, whether it completed, was cancelled or failed.
+        The AWG outputs are turned off first so the device under test is no longer driven, then the spectrum
+        analyzer is returned to its power on state
+        Parameters:
+            awg_channels: The AWG channels the test turned on
+        """
+        try:
+            for channel in awg_channels:
+                self.awg.output_off(channel)
+        finally:
+            self.sa_finish()
+
+    def run_concurrently(self, *jobs):
+        """ Run instrument setup functions at the same time, each on its own instrument
+        Parameters:
+            jobs: (driver, function) tuples. function takes no arguments and only uses its driver
+        Returns:
+            A list of the values returned by the functions
+        """
+        self.check_cancel()
+        return run_concurrently(list(jobs))
+
+    def sa_configure(self, center_freq, span=100E6, rbw=1000, vbw=1000, ref_offset=40, display_line=10,
+                     use_trace=False):
+        """ Apply the settings of a measurement to the spectrum analyzer without sweeping.
+        Parameters:
+            See sa_make_measurement()
+        Returns:
+            Nothing
+        """
+        # The analyzer remembers the settings last applied, so only the ones which change are sent
         self.sa.set_single_sweep()
         self.sa.set_center_freq(center_freq)
         self.sa.set_span(span)
@@ -61,59 +116,137 @@ class TestSupport:
         self.sa.set_vbw(int(vbw))
         self.sa.set_display_line(display_line)
         self.sa.set_sweep_accuracy("NORM")
-        self.sa.set_peak_table_sort("FREQ")
-        self.sa.set_peak_table_threshold("DLM")
-        self.sa.set_peak_table_state(True)
-        self.sa.trigger_single_sweep()
+        if use_trace is False:
+            self.sa.set_peak_table_sort("FREQ")
+            self.sa.set_peak_table_threshold("DLM")
+            self.sa.set_peak_table_state(True)
+
+    def sa_make_measurement(self, center_freq, span=100E6, rbw=1000, vbw=1000,
+                            ref_offset=40, display_line=10, screen_dump_name=None, use_trace=False):
+        """ Set up and make a measurement
+        Parameters:
+            center_freq(float): Center frequency of the measurement in Hz
+            span(float): Spectrum anamyzer span to use in Hz
+            rbw(int): Spectrum analyzer resolution bandwidth in Hz
+            vbw(int): Spectrum analyzer video bandwidth in Hz
+            ref_offset(int): The offset used to account for any attenuators between the DUT and the spectrum amalyzer
+            display_line(int): Threshold in dB above which peaks will be recorded
+            screen_dump_name(str): (optional) A name for the screen dump from the spectrum analyzer
+            use_trace(bool): If True, the peaks are found in the trace data instead of the analyzer's peak table
+
+        Returns:
+            A Measurement holding the peaks detected, the analyzer settings and the screen dump if one was requested.
+            If no peaks are detected, the Measurement is empty (len() is 0).
+            """
+        # Cancellation point: the operator may abort between measurements
+        self.check_cancel()
+        self.report_progress("Measuring {:.6f} MHz, span {:.3f} MHz".format(center_freq / 1E6, span / 1E6))
+        self.sa_configure(center_freq, span=span, rbw=rbw, vbw=vbw, ref_offset=ref_offset,
+                          display_line=display_line, use_trace=use_trace)
 
         # Get the data
         self.sa.trigger_single_sweep()
-        points_str = None
-        points = int(self.sa.get_peak_points())
-        # Only attempt to retrieve the data if there are one or more peaks present.
-        # Not doing this will cause the get_peak_data() method to hang and the Rigol DSA-815 spectrum
-        # analyzer will need to be power cycled.
-        if points > 0:
-            points_str = self.sa.get_peak_data()
+        timestamp = datetime.now()
+        freqs = []
+        amplitudes = []
+        trace_freqs = None
+        trace_amplitudes = None
+        if use_trace is True:
+            # One block transfer of the whole trace. Peaks are found locally, so there is
+            # no peak table query which can hang the analyzer.
+            trace_freqs, trace_amplitudes = self.sa.get_trace()
+            peaks = self.sa_find_peaks(trace_freqs, trace_amplitudes, display_line, min_separation=2 * rbw)
+            freqs = peaks["freqs"]
+            amplitudes = peaks["amplitudes"]
+        else:
+            points = int(self.sa.get_peak_points())
+            # Only attempt to retrieve the data if there are one or more peaks present.
+            # Not doing this will cause the get_peak_data() method to hang and the Rigol DSA-815 spectrum
+            # analyzer will need to be power cycled.
+            if points > 0:
+                freqs, amplitudes = self.sa.get_peak_table()
         # If a screen dump file has been specified, then get that data now.
+        screen_dump = None
         if screen_dump_name is not None:
             size, data = self.sa.get_screendump()
-            res["screen_dump"] = {"name": screen_dump_name, "size": size, "data": data}
-        # Reset the spectrum analyzer
-        self.sa.rst()
+            # Converted to PNG in the background while the test carries on
+            screen_dump = screendump.make_screen_dump(screen_dump_name, data)
 
-        # If there are no data points, return to the caller
-        if points_str is None:
-            return None
+        return Measurement(freqs, amplitudes, center_freq=center_freq, span=span, rbw=int(rbw), vbw=int(vbw),
+                           ref_offset=ref_offset, display_line=display_line,
+                           source="trace" if use_trace is True else "peak_table",
+                           timestamp=timestamp, screen_dump=screen_dump, trace_freqs=trace_freqs,
+                           trace_amplitudes=trace_amplitudes)
 
-        # Process the received data
-        raw_points = points_str.split(",")
-        raw_points = [float(x) for x in raw_points]  # Convert everything to floats
-        # Retrieve the frequencies of the peaks
-        freqs = raw_points[0::][::2] # Even values
-        # Retrieve the amplitudes of the peaks
-        amplitudes = raw_points[1::][::2] # Odd values
+    def finish_screen_dumps(self, screen_dumps):
+        """ Wait for the screen dumps to be converted to PNG
+        Parameters:
+            screen_dumps(list): The screen dumps of the measurements
+        Returns:
+            The list, with the PNG images in place of the BMP images
+        """
+        return screendump.finish_screen_dumps(screen_dumps)
 
-        res["freqs"] = freqs
-        res["amplitudes"] = amplitudes
-        return res
+    def sa_freq_tolerance(self, span, points=601):
+        """ Return the frequency tolerance to use when matching peaks from a measurement
+        Parameters:
+            span(float): Span of the measurement in Hz
+            points(int): Number of points in a sweep (601 on the DSA815)
+        Returns:
+            The width of 2 sweep points in Hz
+        """
+        return 2 * span / (points - 1)
 
-    def sa_fund_power(self, measurement_data, fund_freq):
+    def sa_peak_table(self, measurement):
+        """ Return the peak table of a measurement
+        Parameters:
+            measurement(Measurement): The data returned from a prior measurement
+        Returns:
+            A PeakTable. It is empty if measurement is None
+        """
+        if measurement is None:
+            return PeakTable([], [])
+        return measurement
+
+    def sa_find_peaks(self, freqs, amplitudes, threshold, min_separation=0.0):
+        """ Find the peaks in a trace
+        A point is a peak if it is above the threshold, is the highest point within min_separation
+        on either side, and is higher than the point before it (so a flat top is reported once).
+        Parameters:
+            freqs(ndarray): Frequency of each trace point in Hz, evenly spaced
+            amplitudes(ndarray): Amplitude of each trace point
+            threshold(float): Only points above this amplitude can be peaks
+            min_separation(float): Minimum distance in Hz between two reported peaks
+        Returns:
+            A dict with "freqs" and "amplitudes" numpy arrays, ordered by frequency
+        """
+        freqs = np.asarray(freqs, dtype=np.float64)
+        amplitudes = np.asarray(amplitudes, dtype=np.float64)
+        if len(amplitudes) < 3:
+            return {"freqs": freqs[0:0], "amplitudes": amplitudes[0:0]}
+        bin_width = (freqs[-1] - freqs[0]) / (len(freqs) - 1)
+        half_window = max(1, int(math.ceil(min_separation / bin_width))) if bin_width > 0 else 1
+        # Maximum of the window centered on each point
+        padded = np.pad(amplitudes, half_window, mode="constant", constant_values=-np.inf)
+        window_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * half_window + 1).max(axis=1)
+        # Amplitude of the previous point, used to report a flat top only once
+        previous = np.concatenate(([-np.inf], amplitudes[:-1]))
+        is_peak = (amplitudes == window_max) & (amplitudes > previous) & (amplitudes > threshold)
+        return {"freqs": freqs[is_peak], "amplitudes": amplitudes[is_peak]}
+
+    def sa_fund_power(self, measurement_data, fund_freq, freq_tol=0.0):
         """Retrieve the power of the fundamental
         Parameters:
-            measurement_data(dict): data from a prior messurement
+            measurement_data(Measurement): data from a prior messurement
             fund_freq(float): The fundamental frequency from the the test parameters
+            freq_tol(float): The acceptable tolerance to use when searching the table
         Returns:
             A float if there was a peak at the fundamental, else None
             """
-        fund_power = None
-        if measurement_data is not None:
-            for result in measurement_data["freqs"]:
-                i = measurement_data["freqs"].index(result)
-                if result == fund_freq:
-                    fund_power = measurement_data["amplitudes"][i]
-                    break
-        return fund_power
+        peak = self.sa_get_peak(measurement_data, fund_freq, freq_tol)
+        if peak is None:
+            return None
+        return peak["amplitude"]
 
     def build_harmonic_list(self, fundamental, highest_harmonic):
         """ Build a list of harmonics
@@ -160,7 +293,7 @@ class TestSupport:
         """
         Find a peak at a specific frequency in the measurement table supplied
         Parameters:
-            measurement(dict): The data returned from a prior measurement
+            measurement(Measurement): The data returned from a prior measurement
             freq(float): The frequency of the requested peak
             freq_tol(float): The acceptable tolerance to use when searching the table
 
@@ -169,33 +302,52 @@ class TestSupport:
             otherwise None
 
         """
-        for i, f in enumerate(measurement['freqs']):
-            delta = abs(f-freq)
-            if delta <= freq_tol:
-                return {"freq": f, "amplitude": measurement['amplitudes'][i]}
-        return None
-
-
+        peaks = self.sa_get_peaks(measurement, [freq], freq_tol)
+        if not peaks["found"][0]:
+            return None
+        return {"freq": float(peaks["freqs"][0]), "amplitude": float(peaks["amplitudes"][0])}
 
+    def sa_get_peaks(self, measurement, freqs, freq_tol):
+        """
+        Find the peaks nearest to many frequencies in one call
+        Parameters:
+            measurement(Measurement): The data returned from a prior measurement
+            freqs(list): The frequencies of the requested peaks
+            freq_tol(float): The acceptable tolerance to use when searching the table
 
+        Returns:
+            a dict with a "found" bool array, and "freqs" and "amplitudes" arrays of the matching peaks.
+            Entries for frequencies without a peak are NaN.
+        """
+        return self.sa_peak_table(measurement).lookup(freqs, freq_tol)
 
-    def sa_get_spur_set(self, fund_and_harm_table, peak_data):
+    def sa_get_spur_set(self, fund_and_harm_table, peak_data, freq_tol=0.0):
         """ Return spur set from peak table
         Parameters:
             fund_and_harm_table(list): A list of the floating point numbers for the fundamantal and all harmonics
-            peak_data(dict): Results from a prior measurement
+            peak_data(Measurement): Results from a prior measurement
+            freq_tol(float): Peaks within this tolerance of the fundamental or a harmonic are not spurs
         Returns:
               A set of spurious frequencies which are not the fundamental or a harmonic
         """
+        spurs = self.sa_peak_table(peak_data).exclude(fund_and_harm_table, freq_tol)
+        return set(spurs.freqs.tolist())
 
-        spurs = set()
-        freqs = peak_data['freqs']
-        for freq in freqs:
-            # Exact match
-            if freq in fund_and_harm_table:
-                continue
-            spurs.add(freq)
-        return spurs
+    def get_test_equipment(self, test_setup):
+        """ Return the test equipment table of the processed data
+        Parameters:
+            test_setup(dict): The test setup passed to the run method
+        Returns:
+            A list of dicts {Name, Make, Model, Serial, Firmware}, one per instrument
+        """
+        test_equipment = list()
+        for key, value in test_setup["instruments"].items():
+            item = {"Name": value["name"], "Make": value["driver_inst"].make,
+                    "Model": value["driver_inst"].model, "Serial": value["driver_inst"].sn,
+                    "Firmware": value["driver_inst"].fw
+                    }
+            test_equipment.append(item)
+        return test_equipment
 
     def get_timestamp(self, now):
         return now.strftime("%a, %B %d, %Y, %H:%M:%S")
@@ -3,14 +3,19 @@ from radiotest.tests.testsupport import TestSupport
 
 
 class TestTRXLO(TestSupport):
-    def __init__(self):
+    def __init__(self, gui=None):
+        """
+        Parameters:
+            gui(obj): (optional) The tab which runs the test. Defaults to the trxlo tab of the application
+        """
         super().__init__()
-        self.trxlo_gui = config.App_obj.tabs.tab_frames["trxlo"]
+        self.trxlo_gui = config.App_obj.tabs.tab_frames["trxlo"] if gui is None else gui
         self.trxlo_gui.register_test_function(self.run)
 
 
     def run(self, test_setup):
         """ Run the test"""
+        self.bind_run_context(test_setup)
         # Unpack and format the data passed in
         self.gui = test_setup["gui_inst"]
         self.awg = test_setup["instruments"]["awg"]["driver_inst"]
@@ -0,0 +1,520 @@
+import os
+import sys
+import json
+import importlib
+import pytest
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+cdpkg = importlib.import_module("radiotest.config.configdata")
+lpkg = importlib.import_module("radiotest.drivers.loader")
+benchpkg = importlib.import_module("radiotest.drivers.instruments.sim.bench")
+headless = importlib.import_module("radiotest.tests.headless")
+harmspur_test = importlib.import_module("radiotest.tests.harmspur")
+imd_test = importlib.import_module("radiotest.tests.imd")
+trxlo_test = importlib.import_module("radiotest.tests.trxlo")
+instrpkg = importlib.import_module("radiotest.drivers.instruments.vxi.instrument")
+rte = importlib.import_module("radiotest.error_handling.exceptions")
+cli = importlib.import_module("radiotest.cli")
+storepkg = importlib.import_module("radiotest.results.store")
+columnar = importlib.import_module("radiotest.results.columnar")
+
+#
+# Full test flows run against the simulated instruments
+#
+
+
+def make_loader():
+    """ Return a loader with every instrument simulated, and a freshly reset bench"""
+    benchpkg.get_bench().reset()
+    config_data = cdpkg.ConfigData("test")
+    config_data.set_simulated(True)
+    loader = lpkg.Loader()
+    for instrument in config_data.get_instrument_list():
+        loader.add_instrument(instrument["name"], instrument["instrument"])
+    return loader
+
+
+def harmspur_parameters(**kwargs):
+    parameters = {"test_name": "Harmonics and Spurs", "project_name": "sim", "test_id": "1", "ref_offset": 0,
+                  "display_line": -90, "fundamental": 7.2, "highest_harmonic": 5, "use_awg": True,
+                  "tone_level": -10, "harm_screenshot": True, "single_sweep": False}
+    parameters.update(kwargs)
+    return parameters
+
+
+def result_table(processed_data, name):
+    for result in processed_data["results"]:
+        if name in result:
+            return result[name]
+    return None
+
+
+def test_harmspur_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = harmspur_test.TestHarmSpur(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    processed_data = gui.run_test(harmspur_parameters(), instruments)
+    assert gui.errors == []
+    harmonics = result_table(processed_data, "Harmonics")
+    bench = benchpkg.get_bench()
+    assert [row["Harmonic"] for row in harmonics] == [2, 3, 4, 5]
+    for row in harmonics:
+        assert abs(float(row["Power"]) - bench.harmonics_dbc[row["Harmonic"] - 2]) < 0.01
+    # The spurs either side of the fundamental are reported once, even though both spans see them
+    spurs = result_table(processed_data, "Spurious Emissions")
+    assert len(spurs) == 2
+    assert abs(float(result_table(processed_data, "Output power")[0]["Output Power (dBm)"]) + 10) < 0.01
+    assert len(processed_data["screen_dumps"]) == 1
+    # The screen dump is converted from BMP to PNG
+    assert processed_data["screen_dumps"][0]["format"] == "png"
+    assert processed_data["screen_dumps"][0]["data"][0:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_harmspur_single_sweep_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = harmspur_test.TestHarmSpur(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    processed_data = gui.run_test(harmspur_parameters(single_sweep=True), instruments)
+    harmonics = result_table(processed_data, "Harmonics")
+    bench = benchpkg.get_bench()
+    assert len(harmonics) == 4
+    for row in harmonics:
+        assert abs(float(row["Power"]) - bench.harmonics_dbc[row["Harmonic"] - 2]) < 0.5
+
+
+def test_harmspur_batch_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = harmspur_test.TestHarmSpur(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = harmspur_parameters(fundamentals=[3.5, 7.2, 14.1], tone_levels=[-10, -12, -14],
+                                     highest_harmonic=3)
+    processed_data = gui.run_test(parameters, instruments)
+    assert gui.errors == []
+    assert [row["Status"] for row in result_table(processed_data, "Bands")] == ["OK", "OK", "OK"]
+    power = result_table(processed_data, "Output power")
+    assert [row["Band(MHz)"] for row in power] == [3.5, 7.2, 14.1]
+    assert [round(float(row["Output Power (dBm)"])) for row in power] == [-10, -12, -14]
+    assert len(result_table(processed_data, "Harmonics")) == 6
+    # One wide sweep per band for the screen dumps
+    assert len(processed_data["screen_dumps"]) == 3
+    # The bands are measured one after another
+    groups = [step["group"] for step in test.last_plan.ordered_steps()]
+    assert groups == sorted(groups, key=["3.5MHz", "7.2MHz", "14.1MHz"].index)
+
+
+def test_imd_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = imd_test.TestImd(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False}
+    processed_data = gui.run_test(parameters, instruments)
+    assert gui.errors == []
+    products = result_table(processed_data, "IMD Products List")
+    bench = benchpkg.get_bench()
+    # Third order products of two equal tones are 2 * (P - IIP3) below the tones
+    expected = 2 * (-10 - bench.iip3)
+    third_order = [row for row in products if row["Order"] == "3"]
+    assert len(third_order) == 2
+    for row in third_order:
+        assert abs(float(row["Power"]) - expected) < 0.01
+
+
+def test_imd_sweep_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = imd_test.TestImd(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -100, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False, "sweep": True,
+                  "sweep_levels": [-4, -16, -10], "sweep_spacings": [5, 1.1]}
+    processed_data = gui.run_test(parameters, instruments)
+    assert gui.errors == []
+    assert len(processed_data["measurements"]) == 6
+    assert len(result_table(processed_data, "IMD Sweep")) == 6
+    bench = benchpkg.get_bench()
+    for curve in processed_data["imd_curves"]:
+        assert curve["levels"] == [-16, -10, -4]
+        # The IMD3 products rise 3 dB for every dB of tone power, and meet the tones at the intercept point
+        assert abs(curve["imd3_slope"] - 3) < 0.01
+        assert abs(curve["oip3"] - bench.iip3) < 0.1
+
+
+def test_imd_sweep_cancel():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = imd_test.TestImd(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -100, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False, "sweep": True,
+                  "sweep_levels": [-16, -10], "sweep_spacings": [1.1]}
+
+    class CancelOnSecondPoint(list):
+        def append(self, message):
+            list.append(self, message)
+            if len(self) == 2:
+                gui.cancel_event.set()
+
+    gui.progress = CancelOnSecondPoint()
+    with pytest.raises(rte.TestCancelledError):
+        gui.run_test(parameters, instruments)
+    # The tones were on when the test was cancelled, and are turned off again
+    channels = benchpkg.get_bench().awg_channels
+    assert sorted(channels.keys()) == [1, 2]
+    assert all(channel["output"] == "OFF" for channel in channels.values())
+
+
+def test_trxlo_flow():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    test = trxlo_test.TestTRXLO(gui)
+    instruments = {"awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator"),
+                   "av": loader.load("AV")}
+    parameters = {"if_carr_freq": 12.288, "lo_level": 10, "operating_freq": 7.2, "usb": True, "lo_swap": False,
+                  "ptt": True, "tune": True}
+    gui.run_test(parameters, instruments)
+    bench = benchpkg.get_bench()
+    assert bench.awg_channels[1]["freq"] == (7.2 + 12.288) * 1E6
+    assert bench.awg_channels[2]["freq"] == 12.288E6
+    assert bench.awg_channels[1]["output"] == "ON" and bench.awg_channels[2]["output"] == "ON"
+    assert bench.gpio == {"SCLK": True, "MISO": True, "MOSI": True}
+
+
+def test_loader_pool_reconnects():
+    loader = make_loader()
+    info = loader.load("SA1")
+    instance = info["instance"]
+    instance.s.close()
+    # The liveness probe fails, so the pooled instrument is reconnected rather than reloaded
+    assert loader.load("SA1")["instance"] is instance
+    assert instance.is_alive()
+    loader.close_all()
+    assert loader.info_cache == {}
+
+
+def test_loader_offline_host():
+    loader = lpkg.Loader()
+    loader.add_instrument("SA1", {"i_type": "Spectrum Analyzer", "driver": "dsa815", "class_name": "Dsa815",
+                                  "interface": "vxi", "hostname": "127.0.0.1", "simulated": False})
+    # Nothing listens for VXI-11 here, so the load fails before the driver tries to connect
+    with pytest.raises(rte.LoaderError):
+        loader.load("SA1")
+    assert loader.info_cache == {}
+
+
+def test_discovery():
+    loader = make_loader()
+    results = loader.discover(timeout=5.0)
+    assert all(result["status"] == lpkg.AVAIL_ONLINE for result in results.values())
+    assert sorted(loader.info_cache.keys()) == ["AV", "AWG1", "SA1"]
+
+
+
+def test_discovery_closed_while_probing():
+    threading = importlib.import_module("threading")
+    time = importlib.import_module("time")
+    loader = make_loader()
+    bench = benchpkg.get_bench()
+    latency = bench.latency
+    bench.latency = 0.1
+    try:
+        results = loader.discover(names=["SA1", "AWG1"], timeout=0.01)
+        assert all(result["status"] == lpkg.AVAIL_TIMEOUT for result in results.values())
+        probes = [thread for thread in threading.enumerate() if thread.name.startswith("radiotest-discover")]
+        assert len(probes) > 0 and all(thread.daemon for thread in probes)
+        # The probes finish after the pool is closed, and their connections are not added back to it
+        loader.close_all()
+        deadline = time.monotonic() + 10
+        while any(thread.is_alive() for thread in probes) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert loader.info_cache == {}
+    finally:
+        bench.latency = latency
+
+
+def test_instrumentation_recorder(tmp_path):
+    loader = make_loader()
+    sa = loader.get_driver_instance(loader.load("SA1"))
+    recorder = instrpkg.Recorder()
+    recorder.start()
+    try:
+        sa.set_center_freq(7.2E6)
+        sa.identify()
+        sa.get_screendump()
+    finally:
+        recorder.stop()
+    sa.identify()  # Not recorded
+    stats = recorder.get_stats()["Dsa815@{}".format(sa.resourcehost)]
+    assert stats["*IDN?"]["count"] == 1
+    assert stats[":PRIV:SNAP?"]["bytes_in"] > 0
+    assert sum(stats[":PRIV:SNAP?"]["histogram"]) == 1
+    assert recorder.summary(top=1)[0]["count"] >= 1
+    recorder.export_csv(str(tmp_path / "trace.csv"))
+    recorder.export_json(str(tmp_path / "trace.json"))
+    assert len((tmp_path / "trace.csv").read_text().splitlines()) == len(recorder.trace) + 1
+
+
+def test_cli_run(tmp_path):
+    benchpkg.get_bench().reset()
+    params = tmp_path / "imd.toml"
+    params.write_text('project_name = "sim"\ntest_id = "cli1"\n\n[parameters]\nref_offset = 0\ntone_level = -10\n'
+                      'display_line = -90\n\n[instruments]\nsa = "SA1"\n')
+    rc = cli.main(["run", "imd", "--simulate", "--quiet", "--params", str(params), "--set", "max_order=5",
+                   "--output-dir", str(tmp_path), "--db", str(tmp_path / "results.db"), "--columnar", "npz"])
+    assert rc == cli.EXIT_OK
+    results = json.loads((tmp_path / "cli1.json").read_text())
+    assert [parameter for parameter in results["test_parameters"] if "Order" in parameter] == [{"Order": 5}]
+    assert len(results["measurements"]) == 1
+    assert (tmp_path / "cli1.csv").exists()
+    tables = columnar.read_npz(str(tmp_path / "cli1.npz"))
+    assert tables["results/IMD Products List"]["Power"].dtype == np.float64
+    assert len(tables["peaks"]["freq"]) == len(results["measurements"][0]["freqs"])
+    with storepkg.ResultStore(str(tmp_path / "results.db")) as store:
+        assert [run["test_id"] for run in store.find_runs(project="sim")] == ["cli1"]
+    # An instrument which isn't configured
+    assert cli.main(["run", "imd", "--simulate", "--host", "SA9=somewhere"]) == cli.EXIT_USAGE
+
+
+def test_cli_run_instrument_error(monkeypatch, capsys):
+    def failing_run(self, test_setup):
+        raise instrpkg.InstrumentError("AWG did not report operation complete")
+
+    monkeypatch.setattr(imd_test.TestImd, "run", failing_run)
+    assert cli.main(["run", "imd", "--simulate", "--quiet", "--no-db"]) == cli.EXIT_INSTRUMENT
+    assert "Error: AWG did not report operation complete" in capsys.readouterr().err
+
+
+def test_run_on_benches():
+    benchpkg.get_bench().reset()
+    orchestrator = importlib.import_module("radiotest.tests.orchestrator")
+    config_data = cdpkg.ConfigData("test")
+    config_data.set_simulated(True)
+    # Every networked instrument needs its own host name, and the Aardvark stays on the default bench
+    with pytest.raises(ValueError):
+        config_data.add_bench("bench2", {"SA1": "DSA-815-2"})
+    config_data.add_bench("bench2", {"AWG1": "SDG-1032X-2", "SA1": "DSA-815-2"})
+    assert config_data.get_bench_names() == ["bench1", "bench2"]
+    assert [instrument["name"] for instrument in config_data.get_bench_instruments("bench2")] == \
+        ["bench2/AWG1", "bench2/SA1"]
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False}
+    results = orchestrator.run_on_benches(config_data, "imd", parameters)
+    assert [result["bench"] for result in results] == ["bench1", "bench2"]
+    for result in results:
+        assert result["errors"] == []
+        assert len(result["processed_data"]["measurements"]) == 1
+    # Each bench drives its own simulated instruments
+    assert benchpkg.Benches["bench2"] is not benchpkg.get_bench()
+    assert len(benchpkg.Benches["bench2"].awg_channels) > 0
+    with pytest.raises(ValueError):
+        orchestrator.run_on_benches(config_data, "imd", parameters, benches=["bench3"])
+
+
+def test_run_on_benches_bench_failure(monkeypatch):
+    benchpkg.get_bench().reset()
+    orchestrator = importlib.import_module("radiotest.tests.orchestrator")
+    config_data = cdpkg.ConfigData("test")
+    config_data.set_simulated(True)
+    config_data.add_bench("bench2", {"AWG1": "SDG-1032X-2", "SA1": "DSA-815-2"})
+    run = imd_test.TestImd.run
+
+    def failing_run(self, test_setup):
+        if test_setup["instruments"]["sa"]["driver_inst"].resourcehost.startswith("bench2/"):
+            raise OSError("Link lost")
+        return run(self, test_setup)
+
+    monkeypatch.setattr(imd_test.TestImd, "run", failing_run)
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False}
+    # The broken bench is reported without losing the results of the other
+    results = orchestrator.run_on_benches(config_data, "imd", parameters)
+    assert results[0]["errors"] == [] and results[0]["processed_data"] is not None
+    assert results[1]["errors"] == [{"title": "OSError", "message": "Link lost"}]
+
+
+def test_result_store():
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    harmspur_test.TestHarmSpur(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    store = storepkg.ResultStore(":memory:")
+    single = store.add_run(gui.run_test(harmspur_parameters(), instruments))
+    batch = store.add_run(gui.run_test(harmspur_parameters(fundamentals=[3.6, 7.1]), instruments), bench="bench1")
+    assert [run["id"] for run in store.find_runs(project="sim", serial="DSA8SIM0001")] == [single, batch]
+    assert [run["id"] for run in store.find_runs(bench="bench1")] == [batch]
+    history = store.harmonic_history(2)
+    assert list(history["run_id"]) == [single, batch, batch]
+    assert list(history["band"]) == [7.2, 3.6, 7.1]
+    assert np.allclose(history["level"], benchpkg.get_bench().harmonics_dbc[0], atol=1.0)
+    assert list(store.harmonic_history(2, band=7.1)["run_id"]) == [batch]
+    assert len(store.spur_history()["level"]) > 0
+    assert len(store.imd_history(3)["level"]) == 0
+    assert store.get_run(single)["test_equipment"][0]["Serial"] == "DSA8SIM0001"
+    store.delete_run(single)
+    assert list(store.harmonic_history(2)["run_id"]) == [batch, batch]
+    store.close()
+
+
+def test_result_store_imd_sweep(tmp_path):
+    sqlite3 = importlib.import_module("sqlite3")
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    imd_test.TestImd(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -100, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False, "trace_peaks": False, "sweep": True,
+                  "sweep_levels": [-16, -10], "sweep_spacings": [5, 1.1]}
+    # A database written before the products had a spacing and tone level
+    path = str(tmp_path / "results.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE products (run_id INTEGER, kind TEXT, band REAL, item INTEGER, freq REAL, "
+                       "level REAL, unit TEXT)")
+    connection.close()
+    store = storepkg.ResultStore(path)
+    run_id = store.add_run(gui.run_test(parameters, instruments))
+    history = store.imd_history(3)
+    assert list(history["run_id"]) == [run_id] * 4
+    assert list(history["spacing"]) == [1.1, 1.1, 5.0, 5.0]
+    assert list(history["tone_level"]) == [-16, -10, -16, -10]
+    assert len(store.imd_history(5, spacing=5, tone_level=-10)["level"]) == 1
+    oip3 = store.oip3_history(spacing=1.1)
+    assert list(oip3["run_id"]) == [run_id]
+    assert abs(oip3["level"][0] - benchpkg.get_bench().iip3) < 0.1
+    store.close()
+
+
+def test_columnar_export(tmp_path):
+    loader = make_loader()
+    gui = headless.HeadlessGui()
+    imd_test.TestImd(gui)
+    instruments = {"sa": headless.instrument_entry(loader, "SA1", "Spectrum Analyzer"),
+                   "awg": headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")}
+    parameters = {"test_name": "Intermodulation Distortion", "project_name": "sim", "test_id": "1",
+                  "ref_offset": 0, "tone_level": -10, "display_line": -90, "f1": 7.2, "f2": 7.2011,
+                  "max_order": 5, "imd_screenshot": False}
+    paths = list()
+    for test_id, trace_peaks in [("1", True), ("2", False)]:
+        parameters.update({"test_id": test_id, "trace_peaks": trace_peaks})
+        processed_data = gui.run_test(dict(parameters), instruments)
+        paths.append(str(tmp_path / "{}.npz".format(test_id)))
+        columnar.write_npz(paths[-1], processed_data)
+    first = columnar.read_npz(paths[0])
+    measurement = processed_data["measurements"][0]
+    assert first["measurements"]["source"].tolist() == ["trace"]
+    assert len(first["traces"]["freq"]) == 601
+    tables = columnar.load_npz(paths)
+    assert tables["measurements"]["test_id"].tolist() == ["1", "2"]
+    assert tables["peaks"]["measurement"].max() == 1
+    assert np.array_equal(tables["peaks"]["freq"][tables["peaks"]["measurement"] == 1], measurement.freqs)
+    assert np.allclose(tables["results/IMD Products List"]["Power"], -50.0, atol=1.0)
+    assert tables["results/IMD Products List"]["Order"].tolist() == [3.0, 3.0, 3.0, 3.0]
+
+
+def screen_bmp(width=800, height=480):
+    """ Return a 24 bit BMP looking like an analyzer screen: a dark background, a grid and a trace"""
+    rgb = np.zeros((height, width, 3), dtype=np.uint8)
+    rgb[:, :] = (0, 0, 40)
+    rgb[::48, :] = (90, 90, 90)
+    rgb[:, ::80] = (90, 90, 90)
+    trace = (height / 2 + height / 4 * np.sin(np.arange(width) / 37.0)).astype(int)
+    rgb[trace, np.arange(width)] = (255, 255, 0)
+    stride = (width * 3 + 3) // 4 * 4
+    pixels = np.zeros((height, stride), dtype=np.uint8)
+    pixels[:, :width * 3] = rgb[::-1, :, ::-1].reshape(height, width * 3)
+    header = b"BM" + (54 + pixels.size).to_bytes(4, "little") + bytes(4) + (54).to_bytes(4, "little") + \
+        (40).to_bytes(4, "little") + width.to_bytes(4, "little") + height.to_bytes(4, "little") + \
+        (1).to_bytes(2, "little") + (24).to_bytes(2, "little") + bytes(4) + pixels.size.to_bytes(4, "little") + \
+        bytes(16)
+    return header + pixels.tobytes(), rgb
+
+
+def test_screendump_pipeline():
+    zlib = importlib.import_module("zlib")
+    screendump = importlib.import_module("radiotest.tests.screendump")
+    data, rgb = screen_bmp()
+    assert np.array_equal(screendump.bmp_to_rgb(data), rgb)
+    png = screendump.bmp_to_png(data)
+    assert len(png) * 10 < len(data)
+    # Undo the PNG encoding: inflate the image data and reverse the Sub filter of each row
+    idat_length = int.from_bytes(png[33:37], "big")
+    assert png[37:41] == b"IDAT"
+    rows = np.frombuffer(zlib.decompress(png[41:41 + idat_length]), dtype=np.uint8).reshape(480, 800 * 3 + 1)
+    assert (rows[:, 0] == 1).all()
+    decoded = np.cumsum(rows[:, 1:].reshape(480, 800, 3), axis=1, dtype=np.uint64) % 256
+    assert np.array_equal(decoded.astype(np.uint8), rgb)
+
+    dump = screendump.make_screen_dump("screen", bytearray(data))
+    assert screendump.finish_screen_dumps([dump]) == [dump]
+    assert dump["format"] == "png" and dump["size"] == len(png) and "pending" not in dump
+    # Images which can't be converted, e.g. truncated ones, are kept as they are
+    for data in [b"BM" + bytes(20), data[:60], data[:54] + bytes(4)]:
+        dump = screendump.make_screen_dump("short", data)
+        screendump.finish_screen_dumps([dump])
+        assert dump["format"] == "bmp" and dump["data"] is data
+
+    # Block responses are read in pieces straight into the block's buffer
+    loader = make_loader()
+    sa = headless.instrument_entry(loader, "SA1", "Spectrum Analyzer")["driver_inst"]
+    size, bmp = sa.get_screendump()
+    assert isinstance(bmp, bytearray) and size == len(bmp)
+    assert sa._ask_read_block(":PRIV:SNAP?", chunk_size=16) == bmp
+    # A first piece ending exactly at the end of the block leaves the terminator, which is read too
+    assert sa._ask_read_block(":PRIV:SNAP?", chunk_size=len(b"#9000000000") + len(bmp)) == bmp
+    assert sa.s.response == b""
+
+
+def test_wave_set_buffers():
+    array = importlib.import_module("array")
+    loader = make_loader()
+    awg = headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")["driver_inst"]
+    wave = np.round(16000 * (np.sin(np.arange(4096) / 50.0) + np.sin(np.arange(4096) / 7.0))).astype(np.int16)
+    expected = wave.astype("<i2").tobytes()
+    for name, wavedata in [("list", wave.tolist()), ("int16", wave), ("int64", wave.astype(np.int64)),
+                           ("array", array.array("h", wave.tolist())), ("bytes", expected)]:
+        awg.wave_set({"NAME": name, "WAVEDATA": wavedata})
+        assert bytes(awg.s.waves[name]["data"]) == expected
+        assert awg.s.waves[name]["values"]["LENGTH"] == "{}B".format(len(expected))
+    with pytest.raises(instrpkg.InstrumentError):
+        awg.wave_set({"NAME": "range", "WAVEDATA": [0, 40000]})
+    with pytest.raises(instrpkg.InstrumentError):
+        awg.wave_set({"NAME": "float", "WAVEDATA": wave.astype(np.float64)})
+    with pytest.raises(instrpkg.InstrumentError):
+        awg.wave_set({"NAME": "odd", "WAVEDATA": expected[:-1]})
+    loader.close_all()
+
+
+def test_wave_get_view():
+    loader = make_loader()
+    awg = headless.instrument_entry(loader, "AWG1", "Arbitrary Waveform Generator")["driver_inst"]
+    wave = np.round(32767 * np.sin(np.arange(16384) * 2 * np.pi / 16384)).astype(np.int16)
+    awg.wave_set({"NAME": "wave1", "WAVEDATA": wave, "FREQ": 10000})
+    setup = awg.wave_get("USER,wave1")
+    assert setup["NAME"] == "wave1" and setup["TYPE"] == 5 and setup["LENGTH"] == 16384
+    assert setup["WAVEDATA"].dtype == np.int16 and np.array_equal(setup["WAVEDATA"], wave)
+    # The samples are viewed in place in the response
+    assert setup["WAVEDATA"].base is not None and not setup["WAVEDATA"].flags.writeable
+    # Round trip: the waveform read back uploads unchanged
+    awg.wave_set(dict(setup, NAME="wave2"))
+    assert awg.s.waves["wave2"]["data"] == awg.s.waves["wave1"]["data"]
+    assert awg.wave_get("USER,missing") == {}
+    loader.close_all()